@@ -63,15 +63,26 @@ Support: Create an issue on the app page.
         'security/ir.model.access.csv',
         'data/account_data.xml',
         'data/account_chart_fr.xml',
+        'data/account_cron.xml',
+        'data/account_report_data.xml',
+        'wizard/account_move_reversal_views.xml',
+        'wizard/account_currency_revaluation_views.xml',
+        'wizard/account_budget_version_compare_views.xml',
+        'wizard/account_financial_report_views.xml',
         'views/account_account_views.xml',
         'views/account_journal_views.xml',
         'views/account_move_views.xml',
+        'views/account_move_recurring_views.xml',
+        'views/account_asset_views.xml',
         'views/account_tax_views.xml',
         'views/account_payment_views.xml',
+        'views/account_batch_payment_views.xml',
         'views/account_analytic_views.xml',
         'views/account_budget_views.xml',
+        'views/purchase_order_views.xml',
         'views/account_fiscal_year_views.xml',
         'views/account_reconcile_views.xml',
+        'report/account_report_views.xml',
         'views/account_menu.xml',
     ],
     'images': [
@@ -3,10 +3,18 @@
 from . import account_account
 from . import account_journal
 from . import account_move
+from . import account_move_line_archive
+from . import account_move_recurring
+from . import account_asset
 from . import account_tax
 from . import account_payment
+from . import account_batch_payment
+from . import account_sepa_mandate
 from . import account_analytic
+from . import purchase_order
 from . import account_budget
 from . import account_reconcile
 from . import account_fiscal_year
 from . import res_partner
+from . import ir_sequence
+from . import res_currency
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
-from odoo import api, fields, models, _
+from odoo import api, fields, models, tools, _
 from odoo.exceptions import UserError, ValidationError
 
+# Champs dont la modification change les comptes client/fournisseur par defaut
+PARTNER_ACCOUNT_CACHE_FIELDS = {'account_type', 'company_id', 'code', 'active', 'deprecated'}
+PARTNER_ACCOUNT_TYPES = ('asset_receivable', 'liability_payable')
+
 
 class AccountAccount(models.Model):
     """
@@ -160,6 +164,31 @@ class AccountAccount(models.Model):
          'Le code du compte doit etre unique par societe!'),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        accounts = super().create(vals_list)
+        if any(account.account_type in PARTNER_ACCOUNT_TYPES for account in accounts):
+            self._invalidate_partner_accounts_cache()
+        return accounts
+
+    def write(self, vals):
+        if PARTNER_ACCOUNT_CACHE_FIELDS.intersection(vals) and (
+            vals.get('account_type') in PARTNER_ACCOUNT_TYPES
+            or any(account.account_type in PARTNER_ACCOUNT_TYPES for account in self)
+        ):
+            self._invalidate_partner_accounts_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        if any(account.account_type in PARTNER_ACCOUNT_TYPES for account in self):
+            self._invalidate_partner_accounts_cache()
+        return super().unlink()
+
+    @api.model
+    def _invalidate_partner_accounts_cache(self):
+        """Invalider le cache des comptes client/fournisseur par defaut"""
+        self.env.registry.clear_cache()
+
     @api.depends('code')
     def _compute_account_class(self):
         for account in self:
@@ -194,13 +223,16 @@ class AccountAccount(models.Model):
             account.internal_group = type_to_group.get(account.account_type, 'asset')
 
     def _compute_balance(self):
+        totals = {
+            account.id: (debit, credit)
+            for account, debit, credit in self.env['account.move.line.custom']._read_group(
+                [('account_id', 'in', self.ids), ('parent_state', '=', 'posted')],
+                groupby=['account_id'],
+                aggregates=['debit:sum', 'credit:sum'],
+            )
+        }
         for account in self:
-            lines = self.env['account.move.line.custom'].search([
-                ('account_id', '=', account.id),
-                ('move_id.state', '=', 'posted'),
-            ])
-            account.debit = sum(lines.mapped('debit'))
-            account.credit = sum(lines.mapped('credit'))
+            account.debit, account.credit = totals.get(account.id, (0.0, 0.0))
             account.balance = account.debit - account.credit
 
     def _compute_move_line_count(self):
@@ -227,6 +259,19 @@ class AccountAccount(models.Model):
             'context': {'default_account_id': self.id},
         }
 
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_partner_default_account_ids(self, company_id):
+        """
+        Comptes client et fournisseur par defaut de la societe, en cache
+        jusqu'a la prochaine modification d'un compte client ou fournisseur.
+        Retourne (receivable_id, payable_id)
+        """
+        base_domain = [('company_id', '=', company_id), ('deprecated', '=', False)]
+        receivable = self.sudo().search(base_domain + [('account_type', '=', 'asset_receivable')], limit=1)
+        payable = self.sudo().search(base_domain + [('account_type', '=', 'liability_payable')], limit=1)
+        return receivable.id, payable.id
+
     @api.model
     def _get_opening_balance_account(self):
         """Retourne le compte de bilan d'ouverture"""
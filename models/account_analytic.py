@@ -1,6 +1,17 @@
 # -*- coding: utf-8 -*-
 
 from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+# Soldes analytiques : champ -> expression agregee sur account_analytic_line_custom
+BALANCE_AGGREGATES = {
+    'debit': "COALESCE(SUM(l.amount) FILTER (WHERE l.amount > 0), 0)",
+    'credit': "COALESCE(-SUM(l.amount) FILTER (WHERE l.amount < 0), 0)",
+    'balance': "COALESCE(SUM(l.amount), 0)",
+}
+# Champs des lignes analytiques qui determinent leur cellule du cube
+CUBE_LINE_FIELDS = ('account_id', 'general_account_id', 'partner_id', 'category', 'date', 'company_id', 'amount')
 
 
 class AccountAnalyticAccount(models.Model):
@@ -38,16 +49,19 @@ class AccountAnalyticAccount(models.Model):
     balance = fields.Monetary(
         string='Solde',
         compute='_compute_balance',
+        search='_search_balance',
         currency_field='currency_id',
     )
     debit = fields.Monetary(
         string='Debit',
         compute='_compute_balance',
+        search='_search_debit',
         currency_field='currency_id',
     )
     credit = fields.Monetary(
         string='Credit',
         compute='_compute_balance',
+        search='_search_credit',
         currency_field='currency_id',
     )
     currency_id = fields.Many2one(
@@ -61,12 +75,97 @@ class AccountAnalyticAccount(models.Model):
         string='Lignes analytiques',
     )
 
+    def _get_balance_line_condition(self, alias):
+        """
+        Filtre des lignes analytiques selon le contexte :
+        from_date / to_date (periode) et analytic_plan_ids (plans retenus)
+        """
+        conditions = [SQL("TRUE")]
+        context = self.env.context
+        if context.get('from_date'):
+            conditions.append(SQL("%s >= %s", SQL.identifier(alias, 'date'), context['from_date']))
+        if context.get('to_date'):
+            conditions.append(SQL("%s <= %s", SQL.identifier(alias, 'date'), context['to_date']))
+        if context.get('analytic_plan_ids'):
+            conditions.append(SQL(
+                "%s IN (SELECT id FROM account_analytic_account_custom WHERE plan_id = ANY(%s))",
+                SQL.identifier(alias, 'account_id'), list(context['analytic_plan_ids']),
+            ))
+        return SQL(" AND ").join(conditions)
+
+    @api.depends_context('from_date', 'to_date', 'analytic_plan_ids')
     def _compute_balance(self):
+        """Debit, credit et solde de tous les comptes en une requete groupee"""
+        totals = {}
+        if self.ids:
+            self.env['account.analytic.line.custom'].flush_model(['account_id', 'amount', 'date'])
+            self.env.cr.execute(SQL(
+                """
+                SELECT l.account_id, %(debit)s, %(credit)s
+                  FROM account_analytic_line_custom l
+                 WHERE l.account_id = ANY(%(ids)s)
+                   AND %(condition)s
+              GROUP BY l.account_id
+                """,
+                debit=SQL(BALANCE_AGGREGATES['debit']),
+                credit=SQL(BALANCE_AGGREGATES['credit']),
+                ids=self.ids,
+                condition=self._get_balance_line_condition('l'),
+            ))
+            totals = {account_id: (debit, credit) for account_id, debit, credit in self.env.cr.fetchall()}
         for account in self:
-            account.debit = sum(account.line_ids.filtered(lambda l: l.amount > 0).mapped('amount'))
-            account.credit = abs(sum(account.line_ids.filtered(lambda l: l.amount < 0).mapped('amount')))
+            account.debit, account.credit = totals.get(account.id, (0.0, 0.0))
             account.balance = account.debit - account.credit
 
+    def _search_balance_field(self, field_name, operator, value):
+        """Comptes dont le solde agrege verifie la condition (HAVING)"""
+        if operator not in ('=', '!=', '<', '<=', '>', '>=') or not isinstance(value, (int, float)):
+            raise UserError(_("Operation non supportee sur %s: %s %s") % (field_name, operator, value))
+        self.env['account.analytic.line.custom'].flush_model(['account_id', 'amount', 'date'])
+        self.env.cr.execute(SQL(
+            """
+            SELECT a.id
+              FROM account_analytic_account_custom a
+         LEFT JOIN account_analytic_line_custom l
+                ON l.account_id = a.id AND %(condition)s
+          GROUP BY a.id
+            HAVING %(aggregate)s %(operator)s %(value)s
+            """,
+            condition=self._get_balance_line_condition('l'),
+            aggregate=SQL(BALANCE_AGGREGATES[field_name]),
+            operator=SQL(operator.replace('!=', '<>')),
+            value=value,
+        ))
+        return [('id', 'in', [account_id for account_id, in self.env.cr.fetchall()])]
+
+    def _search_balance(self, operator, value):
+        return self._search_balance_field('balance', operator, value)
+
+    def _search_debit(self, operator, value):
+        return self._search_balance_field('debit', operator, value)
+
+    def _search_credit(self, operator, value):
+        return self._search_balance_field('credit', operator, value)
+
+    def _order_field_to_sql(self, alias, field_name, direction, nulls, query):
+        # Tri sur les soldes : sous-requete correlee par compte
+        if field_name in BALANCE_AGGREGATES:
+            return SQL(
+                "(SELECT %s FROM account_analytic_line_custom l WHERE l.account_id = %s AND %s) %s",
+                SQL(BALANCE_AGGREGATES[field_name]),
+                SQL.identifier(alias, 'id'),
+                self._get_balance_line_condition('l'),
+                direction,
+            )
+        return super()._order_field_to_sql(alias, field_name, direction, nulls, query)
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'plan_id' in vals:
+            # Plan denormalise dans le cube
+            self.env['account.analytic.cube.custom']._update_account_plans(self)
+        return res
+
     def action_view_lines(self):
         """Voir les lignes analytiques"""
         self.ensure_one()
@@ -115,6 +214,67 @@ class AccountAnalyticPlan(models.Model):
         for plan in self:
             plan.account_count = len(plan.account_ids)
 
+    def _get_distribution_pivot(self, domain=None):
+        """
+        Croiser les montants comptabilises selon les plans de self, en une requete :
+        chaque repartition est depliee (jsonb_each) une fois, puis les parts de
+        chaque plan sont jointes par hachage sur la ligne comptable, le montant
+        etant multiplie par les pourcentages de chaque plan. La part non repartie
+        d'un plan est rattachee a un compte vide.
+        domain filtre les lignes comptables.
+        Retourne des tuples (id de compte par plan dans l'ordre de self, montant).
+        """
+        Line = self.env['account.move.line.custom']
+        Line.flush_model(['analytic_distribution', 'balance', 'parent_state'])
+        self.env['account.analytic.account.custom'].flush_model(['plan_id'])
+        line_query = Line._search(domain or [])
+
+        distributions = SQL("""
+            SELECT l.id AS line_id, d.key::integer AS account_id,
+                   d.value::numeric AS percentage, a.plan_id
+              FROM account_move_line_custom l
+             CROSS JOIN LATERAL jsonb_each_text(l.analytic_distribution) d
+              JOIN account_analytic_account_custom a ON a.id = d.key::integer
+             WHERE l.analytic_distribution IS NOT NULL
+               AND l.id IN %s
+        """, line_query.subselect())
+
+        # Une jointure par plan sur la ligne comptable : les parts du plan et,
+        # regroupee par ligne, la part non repartie qui complete le plan a 100
+        selects, joins, factors, group_by = [], [], [], []
+        for index, plan in enumerate(self):
+            alias = SQL.identifier('p%s' % index)
+            joins.append(SQL("""
+                JOIN (
+                    SELECT d.line_id, d.account_id, d.percentage FROM distribution d
+                     WHERE d.plan_id = %(plan_id)s
+                     UNION ALL
+                    SELECT d.line_id, NULL, 100 - COALESCE(SUM(d.percentage) FILTER (WHERE d.plan_id = %(plan_id)s), 0)
+                      FROM distribution d
+                  GROUP BY d.line_id
+                    HAVING COALESCE(SUM(d.percentage) FILTER (WHERE d.plan_id = %(plan_id)s), 0) < 100
+                ) %(alias)s ON %(alias)s.line_id = l.id
+            """, plan_id=plan.id, alias=alias))
+            selects.append(SQL("%s.account_id", alias))
+            factors.append(SQL("%s.percentage / 100", alias))
+            group_by.append(SQL("%s.account_id", alias))
+
+        self.env.cr.execute(SQL("""
+            WITH distribution AS MATERIALIZED (%(distributions)s)
+            SELECT %(selects)s, SUM(l.balance * %(factors)s)
+              FROM account_move_line_custom l
+                   %(joins)s
+             WHERE l.parent_state = 'posted'
+          GROUP BY %(group_by)s
+        """,
+            distributions=distributions,
+            selects=SQL(', ').join(selects),
+            factors=SQL(' * ').join(factors),
+            joins=SQL(' ').join(joins),
+            group_by=SQL(', ').join(group_by),
+        ))
+        return [(tuple(row[:-1]), row[-1]) for row in self.env.cr.fetchall()]
+
 
 class AccountAnalyticLine(models.Model):
     """
@@ -153,6 +313,7 @@ class AccountAnalyticLine(models.Model):
     move_line_id = fields.Many2one(
         'account.move.line.custom',
         string='Ligne comptable',
+        index='btree_not_null',
     )
     general_account_id = fields.Many2one(
         'account.account.custom',
@@ -173,6 +334,188 @@ class AccountAnalyticLine(models.Model):
         ('other', 'Autre'),
     ], string='Categorie', default='other')
 
+    def init(self):
+        super().init()
+        # Soldes par compte et periode lus sur l'index seul
+        self.env.cr.execute(SQL("""
+            CREATE INDEX IF NOT EXISTS account_analytic_line_custom_account_date_idx
+                ON account_analytic_line_custom (account_id, date)
+                INCLUDE (amount)
+        """))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['account.analytic.cube.custom']._add_lines(lines)
+        return lines
+
+    def write(self, vals):
+        cube_changed = any(field in vals for field in CUBE_LINE_FIELDS)
+        if cube_changed:
+            self.env['account.analytic.cube.custom']._add_lines(self, sign=-1)
+        res = super().write(vals)
+        if cube_changed:
+            self.env['account.analytic.cube.custom']._add_lines(self)
+        return res
+
+    def unlink(self):
+        self.env['account.analytic.cube.custom']._add_lines(self, sign=-1)
+        return super().unlink()
+
+
+class AccountAnalyticCube(models.Model):
+    """
+    Cube Analytique
+    Agregats precalcules par compte analytique, compte general, partenaire,
+    categorie et mois, maintenus a chaque creation/modification/suppression
+    de lignes analytiques. Les tableaux croises lisent ces cellules au lieu
+    des lignes.
+    """
+    _name = 'account.analytic.cube.custom'
+    _description = 'Cube analytique'
+    _auto = False
+    _order = 'month desc, account_id'
+
+    account_id = fields.Many2one('account.analytic.account.custom', string='Compte analytique', readonly=True)
+    plan_id = fields.Many2one('account.analytic.plan.custom', string='Plan analytique', readonly=True)
+    general_account_id = fields.Many2one('account.account.custom', string='Compte general', readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Partenaire', readonly=True)
+    category = fields.Selection([
+        ('project', 'Projet'),
+        ('department', 'Departement'),
+        ('product', 'Produit'),
+        ('other', 'Autre'),
+    ], string='Categorie', readonly=True)
+    month = fields.Date(string='Mois', readonly=True)
+    company_id = fields.Many2one('res.company', string='Societe', readonly=True)
+    currency_id = fields.Many2one(related='company_id.currency_id')
+
+    amount = fields.Monetary(string='Montant', readonly=True, currency_field='currency_id')
+    debit = fields.Monetary(string='Debit', readonly=True, currency_field='currency_id')
+    credit = fields.Monetary(string='Credit', readonly=True, currency_field='currency_id')
+    line_count = fields.Integer(string='Nombre de lignes', readonly=True)
+
+    def init(self):
+        cr = self.env.cr
+        cr.execute(SQL("""
+            CREATE TABLE IF NOT EXISTS account_analytic_cube_custom (
+                id serial PRIMARY KEY,
+                account_id integer NOT NULL,
+                plan_id integer,
+                general_account_id integer,
+                partner_id integer,
+                category varchar,
+                month date NOT NULL,
+                company_id integer,
+                amount numeric NOT NULL DEFAULT 0,
+                debit numeric NOT NULL DEFAULT 0,
+                credit numeric NOT NULL DEFAULT 0,
+                line_count integer NOT NULL DEFAULT 0
+            )
+        """))
+        # Cle de cellule (les valeurs nulles sont des cellules a part entiere)
+        cr.execute(SQL("""
+            CREATE UNIQUE INDEX IF NOT EXISTS account_analytic_cube_custom_cell_idx
+                ON account_analytic_cube_custom (
+                    account_id, month, COALESCE(general_account_id, 0), COALESCE(partner_id, 0),
+                    COALESCE(category, ''), COALESCE(company_id, 0)
+                )
+        """))
+        cr.execute(SQL("""
+            CREATE INDEX IF NOT EXISTS account_analytic_cube_custom_plan_month_idx
+                ON account_analytic_cube_custom (plan_id, month)
+        """))
+        cr.execute(SQL("SELECT 1 FROM account_analytic_cube_custom LIMIT 1"))
+        if not cr.fetchone():
+            self._rebuild()
+
+    def _get_cell_select(self, where, sign=1):
+        """Agregat des lignes analytiques par cellule du cube"""
+        return SQL("""
+            SELECT l.account_id, a.plan_id, l.general_account_id, l.partner_id, l.category,
+                   date_trunc('month', l.date)::date, l.company_id,
+                   %(sign)s * SUM(l.amount),
+                   %(sign)s * COALESCE(SUM(l.amount) FILTER (WHERE l.amount > 0), 0),
+                   %(sign)s * COALESCE(-SUM(l.amount) FILTER (WHERE l.amount < 0), 0),
+                   %(sign)s * COUNT(*)
+              FROM account_analytic_line_custom l
+              JOIN account_analytic_account_custom a ON a.id = l.account_id
+             WHERE %(where)s
+          GROUP BY l.account_id, a.plan_id, l.general_account_id, l.partner_id, l.category,
+                   date_trunc('month', l.date), l.company_id
+        """, sign=sign, where=where)
+
+    @api.model
+    def _rebuild(self):
+        """Recalculer entierement le cube depuis les lignes analytiques"""
+        self.env['account.analytic.line.custom'].flush_model()
+        self.env.cr.execute(SQL("TRUNCATE account_analytic_cube_custom"))
+        self.env.cr.execute(SQL("""
+            INSERT INTO account_analytic_cube_custom (
+                account_id, plan_id, general_account_id, partner_id, category, month, company_id,
+                amount, debit, credit, line_count
+            )
+            %s
+        """, self._get_cell_select(SQL("TRUE"))))
+        self.invalidate_model()
+
+    @api.model
+    def _add_lines(self, lines, sign=1):
+        """
+        Ajouter (sign=1) ou retirer (sign=-1) des lignes analytiques du cube,
+        en une requete INSERT ... ON CONFLICT pour tout le lot. Les cellules
+        videes sont supprimees.
+        """
+        if not lines:
+            return
+        lines.flush_recordset(list(CUBE_LINE_FIELDS))
+        self.env.cr.execute(SQL("""
+            INSERT INTO account_analytic_cube_custom AS cube (
+                account_id, plan_id, general_account_id, partner_id, category, month, company_id,
+                amount, debit, credit, line_count
+            )
+            %(cells)s
+            ON CONFLICT (
+                account_id, month, COALESCE(general_account_id, 0), COALESCE(partner_id, 0),
+                COALESCE(category, ''), COALESCE(company_id, 0)
+            ) DO UPDATE SET
+                amount = cube.amount + EXCLUDED.amount,
+                debit = cube.debit + EXCLUDED.debit,
+                credit = cube.credit + EXCLUDED.credit,
+                line_count = cube.line_count + EXCLUDED.line_count
+        """, cells=self._get_cell_select(SQL("l.id = ANY(%s)", lines.ids), sign)))
+        if sign < 0:
+            self.env.cr.execute(SQL("DELETE FROM account_analytic_cube_custom WHERE line_count <= 0"))
+        self.invalidate_model()
+
+    @api.model
+    def _update_account_plans(self, accounts):
+        """Reporter le plan des comptes analytiques sur leurs cellules"""
+        accounts.flush_recordset(['plan_id'])
+        self.env.cr.execute(SQL("""
+            UPDATE account_analytic_cube_custom cube
+               SET plan_id = a.plan_id
+              FROM account_analytic_account_custom a
+             WHERE a.id = cube.account_id
+               AND a.id = ANY(%s)
+        """, accounts.ids))
+        self.invalidate_model(['plan_id'])
+
+    @api.model
+    def get_cube_data(self, groupby, domain=None):
+        """
+        Agregats du cube selon les regroupements demandes
+        (ex: ['plan_id', 'account_id', 'month:month']).
+        Retourne une liste de dictionnaires {regroupement: valeur, ..., montants}.
+        """
+        aggregates = ['amount:sum', 'debit:sum', 'credit:sum', 'line_count:sum']
+        result = []
+        for row in self._read_group(domain or [], groupby=groupby, aggregates=aggregates):
+            values = dict(zip(groupby, row[:len(groupby)]))
+            values.update(zip(('amount', 'debit', 'credit', 'line_count'), row[len(groupby):]))
+            result.append(values)
+        return result
+
 
 class AccountAnalyticTag(models.Model):
     """
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+
+
+def days_360(date_from, date_to):
+    """Nombre de jours inclusifs entre deux dates, en base 30/360 (mois de 30 jours)"""
+    return (
+        (date_to.year - date_from.year) * 360
+        + (date_to.month - date_from.month) * 30
+        + min(date_to.day, 30) - min(date_from.day, 30)
+        + 1
+    )
+
+
+def degressive_coefficient(method_number):
+    """Coefficient fiscal du degressif selon la duree d'utilisation (en annees)"""
+    if method_number > 6:
+        return 2.25
+    if method_number > 4:
+        return 1.75
+    return 1.25
+
+
+class AccountAsset(models.Model):
+    """
+    Immobilisation
+    Plan d'amortissement lineaire ou degressif avec prorata temporis
+    """
+    _name = 'account.asset.custom'
+    _description = 'Immobilisation'
+    _inherit = ['mail.thread']
+    _order = 'acquisition_date desc, id desc'
+
+    name = fields.Char(string='Designation', required=True, tracking=True)
+    code = fields.Char(string='Reference')
+    company_id = fields.Many2one(
+        'res.company',
+        string='Societe',
+        required=True,
+        default=lambda self: self.env.company,
+    )
+    currency_id = fields.Many2one(related='company_id.currency_id')
+    partner_id = fields.Many2one('res.partner', string='Fournisseur')
+
+    # Comptes et journal
+    asset_account_id = fields.Many2one(
+        'account.account.custom',
+        string='Compte d immobilisation',
+        required=True,
+        domain="[('account_type', 'in', ['asset_fixed', 'asset_non_current']), ('company_id', '=', company_id)]",
+    )
+    depreciation_account_id = fields.Many2one(
+        'account.account.custom',
+        string='Compte d amortissement',
+        required=True,
+        domain="[('code', '=like', '28%'), ('company_id', '=', company_id)]",
+    )
+    expense_account_id = fields.Many2one(
+        'account.account.custom',
+        string='Compte de dotation',
+        required=True,
+        domain="[('code', '=like', '68%'), ('company_id', '=', company_id)]",
+    )
+    journal_id = fields.Many2one(
+        'account.journal.custom',
+        string='Journal',
+        required=True,
+        domain="[('type', '=', 'general'), ('company_id', '=', company_id)]",
+    )
+    analytic_account_id = fields.Many2one(
+        'account.analytic.account.custom',
+        string='Compte analytique',
+    )
+
+    # Valeurs
+    acquisition_date = fields.Date(
+        string='Date d acquisition',
+        required=True,
+        default=fields.Date.context_today,
+    )
+    first_depreciation_date = fields.Date(
+        string='Date de mise en service',
+        help="Point de depart du prorata temporis (date d'acquisition si vide)",
+    )
+    original_value = fields.Monetary(string='Valeur d origine', required=True, tracking=True)
+    salvage_value = fields.Monetary(string='Valeur residuelle')
+    value_residual = fields.Monetary(
+        string='Valeur nette comptable',
+        compute='_compute_value_residual',
+        store=True,
+    )
+
+    # Methode
+    method = fields.Selection([
+        ('linear', 'Lineaire'),
+        ('degressive', 'Degressif'),
+    ], string='Methode', required=True, default='linear', tracking=True)
+    method_number = fields.Integer(
+        string='Duree (annees)',
+        required=True,
+        default=5,
+    )
+    method_period = fields.Selection([
+        ('12', 'Annuelle'),
+        ('1', 'Mensuelle'),
+    ], string='Periodicite', required=True, default='1')
+
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('open', 'En cours'),
+        ('close', 'Amortie'),
+    ], string='Etat', default='draft', tracking=True)
+
+    depreciation_line_ids = fields.One2many(
+        'account.asset.depreciation.line.custom',
+        'asset_id',
+        string='Tableau d amortissement',
+    )
+
+    @api.constrains('method', 'method_number')
+    def _check_method_number(self):
+        for asset in self:
+            if asset.method_number < 1:
+                raise ValidationError(_("La duree d'amortissement doit etre d'au moins un an."))
+            if asset.method == 'degressive' and asset.method_number < 3:
+                raise ValidationError(_("Le degressif n'est possible que pour une duree d'au moins 3 ans."))
+
+    @api.depends('original_value', 'salvage_value', 'depreciation_line_ids.amount', 'depreciation_line_ids.move_id')
+    def _compute_value_residual(self):
+        posted = {
+            asset.id: amount
+            for asset, amount in self.env['account.asset.depreciation.line.custom']._read_group(
+                [('asset_id', 'in', self.ids), ('move_id', '!=', False)],
+                groupby=['asset_id'],
+                aggregates=['amount:sum'],
+            )
+        }
+        for asset in self:
+            asset.value_residual = asset.original_value - asset.salvage_value - posted.get(asset.id, 0.0)
+
+    def action_compute_board(self):
+        """Calculer les tableaux d'amortissement"""
+        self._compute_depreciation_boards()
+        return True
+
+    def action_validate(self):
+        """Mettre en service"""
+        self.filtered(lambda a: not a.depreciation_line_ids)._compute_depreciation_boards()
+        self.write({'state': 'open'})
+        return True
+
+    def action_draft(self):
+        if self.depreciation_line_ids.filtered('move_id'):
+            raise UserError(_("Des dotations ont deja ete comptabilisees pour ces immobilisations."))
+        self.write({'state': 'draft'})
+        return True
+
+    # -------------------------------------------------------------------------
+    # Tableaux d'amortissement
+    # -------------------------------------------------------------------------
+
+    def _get_profile_signature(self):
+        """Cle du profil d'amortissement : tous les actifs d'une meme cle ont les memes taux"""
+        self.ensure_one()
+        return (
+            self.method,
+            self.method_number,
+            self.method_period,
+            self.first_depreciation_date or self.acquisition_date,
+        )
+
+    def _compute_depreciation_boards(self):
+        """
+        Recalculer les tableaux de toutes les immobilisations en une passe :
+        le profil (dates, fraction de la base par echeance) est calcule une
+        fois par signature, puis applique a la base de chaque actif. Les
+        dotations deja comptabilisees sont conservees et la base restante est
+        repartie sur les echeances suivantes.
+        """
+        DepreciationLine = self.env['account.asset.depreciation.line.custom']
+        profiles = {}
+        to_unlink_ids = []
+        line_vals_list = []
+
+        for asset in self:
+            signature = asset._get_profile_signature()
+            if signature not in profiles:
+                profiles[signature] = self._get_depreciation_profile(*signature)
+            profile = profiles[signature]
+
+            posted_lines = asset.depreciation_line_ids.filtered('move_id')
+            to_unlink_ids += (asset.depreciation_line_ids - posted_lines).ids
+            last_posted_date = max(posted_lines.mapped('depreciation_date'), default=None)
+
+            base = asset.original_value - asset.salvage_value
+            currency = asset.currency_id
+            # Base restant a amortir, repartie sur les echeances restantes
+            # selon leur part du profil
+            posted = sum(posted_lines.mapped('amount'))
+            posted_fraction = max((
+                cumulative_fraction for depreciation_date, fraction, cumulative_fraction in profile
+                if last_posted_date and depreciation_date <= last_posted_date
+            ), default=0.0)
+            remaining_fraction = 1.0 - posted_fraction
+            depreciated = posted
+            for sequence, (depreciation_date, fraction, cumulative_fraction) in enumerate(profile, start=1):
+                if last_posted_date and depreciation_date <= last_posted_date:
+                    continue
+                # Montant arrondi sur le cumul : la derniere echeance solde la base
+                cumulative = posted + currency.round(
+                    (base - posted) * (cumulative_fraction - posted_fraction) / remaining_fraction
+                )
+                amount = cumulative - depreciated
+                depreciated = cumulative
+                line_vals_list.append({
+                    'asset_id': asset.id,
+                    'sequence': sequence,
+                    'depreciation_date': depreciation_date,
+                    'amount': amount,
+                    'depreciated_value': depreciated,
+                    'remaining_value': base - depreciated,
+                })
+
+        DepreciationLine.browse(to_unlink_ids).unlink()
+        return DepreciationLine.create(line_vals_list)
+
+    @api.model
+    def _get_depreciation_profile(self, method, method_number, method_period, start_date):
+        """
+        Profil d'amortissement d'une base de 1 : liste de
+        (date d'echeance, fraction, fraction cumulee). Exercice civil.
+        """
+        if method == 'degressive':
+            annuities = self._get_degressive_annuities(method_number, start_date)
+        else:
+            annuities = self._get_linear_annuities(method_number, start_date)
+
+        if method_period == '12':
+            periods = [(year_end, fraction) for year_end, fraction, dummy in annuities]
+        elif method == 'degressive':
+            # Degressif mensuel : annuite repartie sur les mois de l'exercice
+            periods = []
+            for year_end, fraction, months in annuities:
+                first_month = year_end - relativedelta(months=months - 1, day=31)
+                periods += [
+                    (first_month + relativedelta(months=index, day=31), fraction / months)
+                    for index in range(months)
+                ]
+        else:
+            periods = self._get_linear_monthly_periods(method_number, start_date)
+
+        profile = []
+        cumulative = 0.0
+        for index, (period_date, fraction) in enumerate(periods):
+            cumulative = 1.0 if index == len(periods) - 1 else cumulative + fraction
+            profile.append((period_date, fraction, cumulative))
+        return profile
+
+    @api.model
+    def _get_linear_annuities(self, method_number, start_date):
+        """Annuites lineaires, prorata en jours (30/360) la premiere annee"""
+        rate = 1.0 / method_number
+        year_end = start_date.replace(month=12, day=31)
+        first = rate * min(days_360(start_date, year_end), 360) / 360.0
+        annuities = [(year_end, first, 12 - start_date.month + 1)]
+        remaining = 1.0 - first
+        while remaining > 1e-9:
+            year_end += relativedelta(years=1)
+            fraction = min(rate, remaining)
+            annuities.append((year_end, fraction, 12))
+            remaining -= fraction
+        return annuities
+
+    @api.model
+    def _get_linear_monthly_periods(self, method_number, start_date):
+        """Dotations lineaires mensuelles, prorata en jours (30/360) le premier mois"""
+        rate = 1.0 / (method_number * 12)
+        month_end = start_date + relativedelta(day=31)
+        first = rate * (30 - min(start_date.day, 30) + 1) / 30.0
+        periods = [(month_end, first)]
+        remaining = 1.0 - first
+        while remaining > 1e-9:
+            month_end += relativedelta(months=1, day=31)
+            fraction = min(rate, remaining)
+            periods.append((month_end, fraction))
+            remaining -= fraction
+        return periods
+
+    @api.model
+    def _get_degressive_annuities(self, method_number, start_date):
+        """
+        Annuites degressives : taux lineaire x coefficient, prorata en mois
+        entiers la premiere annee (depuis le 1er du mois d'acquisition),
+        bascule en lineaire sur le nombre d'exercices restants des qu'il
+        devient superieur; le plan se termine sur le n-ieme exercice.
+        """
+        degressive_rate = degressive_coefficient(method_number) / method_number
+        year_end = start_date.replace(month=12, day=31)
+        months = 12 - start_date.month + 1
+        years_left = method_number
+        remaining = 1.0
+        annuities = []
+        while remaining > 1e-9:
+            rate = max(degressive_rate, 1.0 / years_left) if years_left > 1 else 1.0
+            fraction = min(remaining * rate * months / 12.0, remaining)
+            annuities.append((year_end, fraction, months))
+            remaining -= fraction
+            years_left -= 1
+            year_end += relativedelta(years=1)
+            months = 12
+        return annuities
+
+    # -------------------------------------------------------------------------
+    # Ecritures de dotation
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _cron_generate_depreciation_moves(self):
+        """Planificateur : comptabiliser les dotations echues"""
+        self.search([('state', '=', 'open')])._generate_depreciation_moves(fields.Date.context_today(self))
+
+    def action_generate_depreciation_moves(self):
+        self._generate_depreciation_moves(fields.Date.context_today(self))
+        return True
+
+    def _generate_depreciation_moves(self, date_to):
+        """
+        Comptabiliser les dotations echues jusqu'a date_to : une ecriture par
+        journal et par periode, avec une ligne par compte (et analytique) au
+        lieu d'une ecriture par immobilisation.
+        """
+        Move = self.env['account.move.custom']
+        lines = self.env['account.asset.depreciation.line.custom'].search([
+            ('asset_id', 'in', self.filtered(lambda a: a.state == 'open').ids),
+            ('move_id', '=', False),
+            ('depreciation_date', '<=', date_to),
+        ], order='depreciation_date, id')
+        if not lines:
+            return Move
+
+        groups = list(lines.grouped(
+            lambda l: (l.asset_id.journal_id, l.depreciation_date)
+        ).items())
+        moves = Move.create([
+            self._prepare_depreciation_move_vals(journal, depreciation_date, group)
+            for (journal, depreciation_date), group in groups
+        ])
+        moves.action_post()
+        for ((journal, depreciation_date), group), move in zip(groups, moves):
+            group.write({'move_id': move.id})
+
+        fully_depreciated = self.filtered(
+            lambda a: a.state == 'open' and all(line.move_id for line in a.depreciation_line_ids)
+        )
+        fully_depreciated.write({'state': 'close'})
+        return moves
+
+    @api.model
+    def _prepare_depreciation_move_vals(self, journal, depreciation_date, depreciation_lines):
+        """Ecriture agregee des dotations d'un journal pour une periode"""
+        debit_by_key = {}
+        credit_by_account = {}
+        for line in depreciation_lines:
+            asset = line.asset_id
+            key = (asset.expense_account_id, asset.analytic_account_id)
+            debit_by_key[key] = debit_by_key.get(key, 0.0) + line.amount
+            credit_by_account[asset.depreciation_account_id] = (
+                credit_by_account.get(asset.depreciation_account_id, 0.0) + line.amount
+            )
+
+        label = _('Dotations aux amortissements %s') % depreciation_date.strftime('%m/%Y')
+        line_vals = [(0, 0, {
+            'name': label,
+            'account_id': account.id,
+            'analytic_account_id': analytic_account.id,
+            'debit': amount,
+            'credit': 0.0,
+        }) for (account, analytic_account), amount in debit_by_key.items()]
+        line_vals += [(0, 0, {
+            'name': label,
+            'account_id': account.id,
+            'debit': 0.0,
+            'credit': amount,
+        }) for account, amount in credit_by_account.items()]
+
+        return {
+            'move_type': 'entry',
+            'journal_id': journal.id,
+            'company_id': journal.company_id.id,
+            'date': depreciation_date,
+            'ref': label,
+            'line_ids': line_vals,
+        }
+
+
+class AccountAssetDepreciationLine(models.Model):
+    """
+    Ligne du Tableau d'Amortissement
+    """
+    _name = 'account.asset.depreciation.line.custom'
+    _description = 'Ligne de tableau d amortissement'
+    _order = 'asset_id, depreciation_date, id'
+
+    asset_id = fields.Many2one(
+        'account.asset.custom',
+        string='Immobilisation',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    sequence = fields.Integer(string='Echeance')
+    depreciation_date = fields.Date(string='Date', required=True, index=True)
+    currency_id = fields.Many2one(related='asset_id.currency_id')
+    amount = fields.Monetary(string='Dotation')
+    depreciated_value = fields.Monetary(string='Cumul amortissements')
+    remaining_value = fields.Monetary(string='Valeur nette')
+    move_id = fields.Many2one(
+        'account.move.custom',
+        string='Ecriture',
+        readonly=True,
+        index='btree_not_null',
+    )
@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import os
+import re
+import tempfile
+import unicodedata
+
+from lxml import etree
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL, float_repr
+
+SEPA_PAIN_001_NS = 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03'
+SEPA_PAIN_008_NS = 'urn:iso:std:iso:20022:tech:xsd:pain.008.001.02'
+
+# Caracteres autorises dans les champs texte SEPA
+SEPA_FORBIDDEN_CHARS = re.compile(r"[^A-Za-z0-9/\-?:().,'+ ]")
+
+
+def sepa_text(value, max_length=140):
+    """Nettoyer un texte pour un fichier SEPA (jeu de caracteres latin restreint)"""
+    value = unicodedata.normalize('NFKD', value or '').encode('ascii', 'ignore').decode('ascii')
+    return SEPA_FORBIDDEN_CHARS.sub(' ', value).strip()[:max_length]
+
+
+def sepa_amount(amount):
+    """Formater un montant SEPA (2 decimales, point decimal)"""
+    return float_repr(amount, 2)
+
+
+def sepa_element(namespace, tag, text=None, children=(), **attrs):
+    """Construire un element XML dans l'espace de noms SEPA"""
+    element = etree.Element('{%s}%s' % (namespace, tag), nsmap={None: namespace}, **attrs)
+    if text is not None:
+        element.text = text
+    element.extend(children)
+    return element
+
+
+class AccountBatchPayment(models.Model):
+    """
+    Lot de Paiements
+    Regroupe des paiements pour une validation et une remise bancaire uniques
+    """
+    _name = 'account.batch.payment.custom'
+    _description = 'Lot de paiements'
+    _inherit = ['mail.thread']
+    _order = 'date desc, id desc'
+
+    name = fields.Char(
+        string='Reference',
+        readonly=True,
+        copy=False,
+        default='/',
+    )
+    date = fields.Date(
+        string='Date d execution',
+        required=True,
+        default=fields.Date.context_today,
+        tracking=True,
+    )
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('posted', 'Valide'),
+        ('sent', 'Fichier genere'),
+        ('cancel', 'Annule'),
+    ], string='Etat', default='draft', tracking=True)
+
+    payment_type = fields.Selection([
+        ('outbound', 'Virements fournisseurs'),
+        ('inbound', 'Encaissements'),
+    ], string='Type', required=True, default='outbound')
+
+    journal_id = fields.Many2one(
+        'account.journal.custom',
+        string='Journal',
+        required=True,
+        domain="[('type', '=', 'bank')]",
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Societe',
+        required=True,
+        default=lambda self: self.env.company,
+    )
+    currency_id = fields.Many2one(
+        related='company_id.currency_id',
+    )
+
+    payment_ids = fields.One2many(
+        'account.payment.custom',
+        'batch_payment_id',
+        string='Paiements',
+    )
+    payment_count = fields.Integer(
+        string='Nombre de paiements',
+        compute='_compute_amount_total',
+    )
+    amount_total = fields.Monetary(
+        string='Montant total',
+        compute='_compute_amount_total',
+        currency_field='currency_id',
+    )
+
+    # Comptabilisation
+    group_bank_line = fields.Boolean(
+        string='Ligne bancaire unique',
+        default=True,
+        help="Generer une seule ecriture avec une seule ligne de banque pour tout le lot",
+    )
+    move_id = fields.Many2one(
+        'account.move.custom',
+        string='Ecriture groupee',
+        readonly=True,
+        copy=False,
+    )
+
+    # Fichier SEPA
+    sepa_file = fields.Binary(
+        string='Fichier SEPA',
+        attachment=True,
+        readonly=True,
+        copy=False,
+    )
+    sepa_filename = fields.Char(
+        string='Nom du fichier',
+        readonly=True,
+        copy=False,
+    )
+
+    @api.depends('payment_ids.amount')
+    def _compute_amount_total(self):
+        for batch in self:
+            batch.payment_count = len(batch.payment_ids)
+            batch.amount_total = sum(batch.payment_ids.mapped('amount'))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get('name', '/') == '/':
+                vals['name'] = self.env['ir.sequence'].next_by_code('account.batch.payment.custom') or '/'
+        return super().create(vals_list)
+
+    def action_post(self):
+        """Valider tous les paiements du lot"""
+        for batch in self:
+            if batch.state != 'draft':
+                raise UserError(_("Seuls les lots en brouillon peuvent etre valides."))
+            payments = batch.payment_ids.filtered(lambda p: p.state == 'draft')
+            if not payments:
+                raise UserError(_("Le lot %s ne contient aucun paiement a valider.") % batch.name)
+            if payments.filtered(lambda p: p.payment_type != batch.payment_type or p.journal_id != batch.journal_id):
+                raise UserError(_("Tous les paiements du lot doivent avoir le type et le journal du lot."))
+
+            if batch.group_bank_line:
+                batch.move_id = payments._post_grouped(date=batch.date, ref=batch.name)
+            else:
+                payments.action_post()
+            batch.state = 'posted'
+        return True
+
+    def action_collect_due_invoices(self):
+        """
+        Prelevements SEPA : creer un paiement par mandat actif pour toutes
+        les factures clients echues a la date du lot.
+        """
+        Payment = self.env['account.payment.custom']
+        for batch in self:
+            if batch.state != 'draft' or batch.payment_type != 'inbound':
+                raise UserError(_("Seuls les lots d'encaissement en brouillon peuvent collecter des prelevements."))
+
+            invoices_by_mandate = batch._get_due_invoices_by_mandate()
+            if not invoices_by_mandate:
+                continue
+
+            mandates = self.env['account.sepa.mandate.custom'].browse(invoices_by_mandate)
+            Payment.create([{
+                'payment_type': 'inbound',
+                'partner_type': 'customer',
+                'partner_id': mandate.partner_id.id,
+                'partner_bank_id': mandate.partner_bank_id.id,
+                'sepa_mandate_id': mandate.id,
+                'amount': sum(amount for dummy, amount in invoices_by_mandate[mandate.id]),
+                'currency_id': batch.currency_id.id,
+                'date': batch.date,
+                'journal_id': batch.journal_id.id,
+                'company_id': batch.company_id.id,
+                'payment_method': 'transfer',
+                'communication': mandate.name,
+                'move_ids': [(6, 0, [invoice_id for invoice_id, dummy in invoices_by_mandate[mandate.id]])],
+                'batch_payment_id': batch.id,
+            } for mandate in mandates])
+        return True
+
+    def _get_due_invoices_by_mandate(self):
+        """
+        Factures clients echues prelevables, en une seule requete.
+        Retourne {mandate_id: [(invoice_id, reste a payer), ...]}
+        """
+        self.ensure_one()
+        for model in ('account.move.custom', 'account.sepa.mandate.custom', 'account.payment.custom'):
+            self.env[model].flush_model()
+        self.env.cr.execute(SQL("""
+            SELECT DISTINCT ON (m.id) md.id, m.id, m.amount_residual
+              FROM account_move_custom m
+              JOIN account_sepa_mandate_custom md
+                ON md.partner_id = m.partner_id
+               AND md.company_id = m.company_id
+               AND md.state = 'active'
+             WHERE m.company_id = %s
+               AND m.currency_id = %s
+               AND m.move_type = 'out_invoice'
+               AND m.state = 'posted'
+               AND m.amount_residual > 0
+               AND m.invoice_date_due <= %s
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM account_move_payment_custom_rel rel
+                      JOIN account_payment_custom p ON p.id = rel.payment_id
+                     WHERE rel.move_id = m.id
+                       AND p.state = 'draft'
+               )
+             ORDER BY m.id, md.signature_date DESC, md.id DESC
+        """, self.company_id.id, self.currency_id.id, self.date))
+        invoices_by_mandate = {}
+        for mandate_id, invoice_id, residual in self.env.cr.fetchall():
+            invoices_by_mandate.setdefault(mandate_id, []).append((invoice_id, residual))
+        return invoices_by_mandate
+
+    def action_cancel(self):
+        """Annuler le lot et ses paiements"""
+        for batch in self:
+            batch.payment_ids.filtered(lambda p: p.state == 'posted').action_cancel()
+            batch.state = 'cancel'
+        return True
+
+    def action_draft(self):
+        """Remettre le lot en brouillon"""
+        for batch in self:
+            if batch.state != 'cancel':
+                raise UserError(_("Seuls les lots annules peuvent etre remis en brouillon."))
+            batch.payment_ids.action_draft()
+            batch.move_id = False
+            batch.state = 'draft'
+        return True
+
+    def action_generate_sepa_file(self):
+        """Generer le fichier SEPA du lot"""
+        for batch in self:
+            if batch.state not in ('posted', 'sent'):
+                raise UserError(_("Le lot doit etre valide avant de generer le fichier SEPA."))
+            batch._check_sepa_payments()
+            if batch.payment_type == 'inbound':
+                batch._assign_sepa_sequence_types()
+
+            fd, path = tempfile.mkstemp(prefix='sepa-', suffix='.xml')
+            os.close(fd)
+            try:
+                batch._write_sepa_file(path)
+                with open(path, 'rb') as sepa_file:
+                    content = sepa_file.read()
+            finally:
+                os.unlink(path)
+
+            batch.write({
+                'sepa_file': base64.b64encode(content),
+                'sepa_filename': '%s.xml' % sepa_text(batch.name, 35).replace(' ', '_'),
+                'state': 'sent',
+            })
+            if batch.payment_type == 'inbound':
+                batch.payment_ids.sepa_mandate_id.filtered(
+                    lambda m: not m.last_collection_date or m.last_collection_date < batch.date
+                ).write({'last_collection_date': batch.date})
+        return True
+
+    def _check_sepa_payments(self):
+        """Verifier que le lot peut faire l'objet d'une remise SEPA"""
+        self.ensure_one()
+        if not self.journal_id.bank_account_id:
+            raise UserError(_("Veuillez configurer le compte bancaire du journal %s.") % self.journal_id.name)
+        payments = self.payment_ids.filtered(lambda p: p.state == 'posted')
+        if not payments:
+            raise UserError(_("Le lot %s ne contient aucun paiement valide.") % self.name)
+        if payments.currency_id.filtered(lambda c: c.name != 'EUR'):
+            raise UserError(_("Les remises SEPA ne sont possibles qu'en euros."))
+        missing_bank = payments.filtered(lambda p: not p.partner_bank_id)
+        if missing_bank:
+            raise UserError(_(
+                "Compte bancaire manquant pour les paiements suivants: %s"
+            ) % ', '.join(missing_bank.mapped('name')))
+        if self.payment_type == 'inbound':
+            if not self.journal_id.sepa_creditor_identifier:
+                raise UserError(_(
+                    "Veuillez renseigner l'identifiant creancier SEPA du journal %s."
+                ) % self.journal_id.name)
+            missing_mandate = payments.filtered(lambda p: p.sepa_mandate_id.state != 'active')
+            if missing_mandate:
+                raise UserError(_(
+                    "Mandat actif manquant pour les paiements suivants: %s"
+                ) % ', '.join(missing_mandate.mapped('name')))
+
+    def _assign_sepa_sequence_types(self):
+        """
+        Figer le type de sequence des prelevements a la premiere generation du
+        fichier : seul le premier prelevement remis sur un mandat est FRST.
+        """
+        self.ensure_one()
+        payments = self.payment_ids.filtered(lambda p: p.state == 'posted' and not p.sepa_sequence_type)
+        first_mandates = self.env['account.sepa.mandate.custom']
+        payments_by_type = {'FRST': self.env['account.payment.custom'], 'RCUR': self.env['account.payment.custom']}
+        for payment in payments:
+            mandate = payment.sepa_mandate_id
+            sequence_type = 'RCUR' if mandate in first_mandates else mandate._get_sequence_type()
+            if sequence_type == 'FRST':
+                first_mandates |= mandate
+            payments_by_type[sequence_type] |= payment
+        for sequence_type, typed_payments in payments_by_type.items():
+            if typed_payments:
+                typed_payments.write({'sepa_sequence_type': sequence_type})
+
+    def _write_sepa_file(self, path):
+        """Ecrire le fichier SEPA sur disque, paiement par paiement"""
+        self.ensure_one()
+        if self.payment_type == 'outbound':
+            self._write_sepa_credit_transfer(path)
+        else:
+            self._write_sepa_direct_debit(path)
+
+    def _write_sepa_credit_transfer(self, path):
+        """Virements SEPA (pain.001.001.03)"""
+        ns = SEPA_PAIN_001_NS
+        payments = self.payment_ids.filtered(lambda p: p.state == 'posted')
+        company = self.company_id
+        bank_account = self.journal_id.bank_account_id
+        nb_txs = str(len(payments))
+        ctrl_sum = sepa_amount(sum(payments.mapped('amount')))
+
+        with etree.xmlfile(path, encoding='UTF-8') as xf:
+            xf.write_declaration()
+            with xf.element('{%s}Document' % ns, nsmap={None: ns}):
+                with xf.element('{%s}CstmrCdtTrfInitn' % ns):
+                    xf.write(sepa_element(ns, 'GrpHdr', children=[
+                        sepa_element(ns, 'MsgId', sepa_text(self.name, 35)),
+                        sepa_element(ns, 'CreDtTm', fields.Datetime.now().strftime('%Y-%m-%dT%H:%M:%S')),
+                        sepa_element(ns, 'NbOfTxs', nb_txs),
+                        sepa_element(ns, 'CtrlSum', ctrl_sum),
+                        sepa_element(ns, 'InitgPty', children=[
+                            sepa_element(ns, 'Nm', sepa_text(company.name, 70)),
+                        ]),
+                    ]))
+                    with xf.element('{%s}PmtInf' % ns):
+                        for element in [
+                            sepa_element(ns, 'PmtInfId', sepa_text(self.name, 35)),
+                            sepa_element(ns, 'PmtMtd', 'TRF'),
+                            sepa_element(ns, 'BtchBookg', 'true' if self.group_bank_line else 'false'),
+                            sepa_element(ns, 'NbOfTxs', nb_txs),
+                            sepa_element(ns, 'CtrlSum', ctrl_sum),
+                            sepa_element(ns, 'PmtTpInf', children=[
+                                sepa_element(ns, 'SvcLvl', children=[sepa_element(ns, 'Cd', 'SEPA')]),
+                            ]),
+                            sepa_element(ns, 'ReqdExctnDt', fields.Date.to_string(self.date)),
+                            sepa_element(ns, 'Dbtr', children=[
+                                sepa_element(ns, 'Nm', sepa_text(company.name, 70)),
+                            ]),
+                            self._sepa_account_element(ns, 'DbtrAcct', bank_account),
+                            self._sepa_agent_element(ns, 'DbtrAgt', bank_account),
+                            sepa_element(ns, 'ChrgBr', 'SLEV'),
+                        ]:
+                            xf.write(element)
+                        for payment in payments:
+                            xf.write(self._sepa_credit_transfer_element(ns, payment))
+
+    def _write_sepa_direct_debit(self, path):
+        """Prelevements SEPA (pain.008.001.02), un bloc par schema et type de sequence"""
+        ns = SEPA_PAIN_008_NS
+        payments = self.payment_ids.filtered(lambda p: p.state == 'posted')
+        company = self.company_id
+        bank_account = self.journal_id.bank_account_id
+
+        payments_by_group = {}
+        for payment in payments:
+            key = (payment.sepa_mandate_id.scheme, payment.sepa_sequence_type)
+            payments_by_group.setdefault(key, []).append(payment)
+
+        with etree.xmlfile(path, encoding='UTF-8') as xf:
+            xf.write_declaration()
+            with xf.element('{%s}Document' % ns, nsmap={None: ns}):
+                with xf.element('{%s}CstmrDrctDbtInitn' % ns):
+                    xf.write(sepa_element(ns, 'GrpHdr', children=[
+                        sepa_element(ns, 'MsgId', sepa_text(self.name, 35)),
+                        sepa_element(ns, 'CreDtTm', fields.Datetime.now().strftime('%Y-%m-%dT%H:%M:%S')),
+                        sepa_element(ns, 'NbOfTxs', str(len(payments))),
+                        sepa_element(ns, 'CtrlSum', sepa_amount(sum(payments.mapped('amount')))),
+                        sepa_element(ns, 'InitgPty', children=[
+                            sepa_element(ns, 'Nm', sepa_text(company.name, 70)),
+                        ]),
+                    ]))
+                    for (scheme, sequence_type), group in sorted(payments_by_group.items()):
+                        with xf.element('{%s}PmtInf' % ns):
+                            for element in [
+                                sepa_element(ns, 'PmtInfId', sepa_text('%s-%s-%s' % (self.name, scheme, sequence_type), 35)),
+                                sepa_element(ns, 'PmtMtd', 'DD'),
+                                sepa_element(ns, 'BtchBookg', 'true' if self.group_bank_line else 'false'),
+                                sepa_element(ns, 'NbOfTxs', str(len(group))),
+                                sepa_element(ns, 'CtrlSum', sepa_amount(sum(p.amount for p in group))),
+                                sepa_element(ns, 'PmtTpInf', children=[
+                                    sepa_element(ns, 'SvcLvl', children=[sepa_element(ns, 'Cd', 'SEPA')]),
+                                    sepa_element(ns, 'LclInstrm', children=[sepa_element(ns, 'Cd', scheme)]),
+                                    sepa_element(ns, 'SeqTp', sequence_type),
+                                ]),
+                                sepa_element(ns, 'ReqdColltnDt', fields.Date.to_string(self.date)),
+                                sepa_element(ns, 'Cdtr', children=[
+                                    sepa_element(ns, 'Nm', sepa_text(company.name, 70)),
+                                ]),
+                                self._sepa_account_element(ns, 'CdtrAcct', bank_account),
+                                self._sepa_agent_element(ns, 'CdtrAgt', bank_account),
+                                sepa_element(ns, 'ChrgBr', 'SLEV'),
+                                sepa_element(ns, 'CdtrSchmeId', children=[
+                                    sepa_element(ns, 'Id', children=[
+                                        sepa_element(ns, 'PrvtId', children=[
+                                            sepa_element(ns, 'Othr', children=[
+                                                sepa_element(ns, 'Id', self.journal_id.sepa_creditor_identifier.replace(' ', '')),
+                                                sepa_element(ns, 'SchmeNm', children=[sepa_element(ns, 'Prtry', 'SEPA')]),
+                                            ]),
+                                        ]),
+                                    ]),
+                                ]),
+                            ]:
+                                xf.write(element)
+                            for payment in group:
+                                xf.write(self._sepa_direct_debit_element(ns, payment))
+
+    def _sepa_direct_debit_element(self, ns, payment):
+        """Transaction de prelevement (DrctDbtTxInf) d'un paiement"""
+        mandate = payment.sepa_mandate_id
+        partner_bank = payment.partner_bank_id
+        return sepa_element(ns, 'DrctDbtTxInf', children=[
+            sepa_element(ns, 'PmtId', children=[
+                sepa_element(ns, 'EndToEndId', sepa_text(payment.name, 35)),
+            ]),
+            sepa_element(ns, 'InstdAmt', sepa_amount(payment.amount), Ccy=payment.currency_id.name),
+            sepa_element(ns, 'DrctDbtTx', children=[
+                sepa_element(ns, 'MndtRltdInf', children=[
+                    sepa_element(ns, 'MndtId', sepa_text(mandate.name, 35)),
+                    sepa_element(ns, 'DtOfSgntr', fields.Date.to_string(mandate.signature_date)),
+                ]),
+            ]),
+            self._sepa_agent_element(ns, 'DbtrAgt', partner_bank),
+            sepa_element(ns, 'Dbtr', children=[
+                sepa_element(ns, 'Nm', sepa_text(payment.partner_id.name, 70)),
+            ]),
+            self._sepa_account_element(ns, 'DbtrAcct', partner_bank),
+            sepa_element(ns, 'RmtInf', children=[
+                sepa_element(ns, 'Ustrd', sepa_text(
+                    ' '.join(payment.move_ids.mapped('name')) or payment.communication or payment.name
+                )),
+            ]),
+        ])
+
+    def _sepa_credit_transfer_element(self, ns, payment):
+        """Transaction de virement (CdtTrfTxInf) d'un paiement"""
+        partner_bank = payment.partner_bank_id
+        children = [
+            sepa_element(ns, 'PmtId', children=[
+                sepa_element(ns, 'EndToEndId', sepa_text(payment.name, 35)),
+            ]),
+            sepa_element(ns, 'Amt', children=[
+                sepa_element(ns, 'InstdAmt', sepa_amount(payment.amount), Ccy=payment.currency_id.name),
+            ]),
+        ]
+        if partner_bank.bank_id.bic:
+            children.append(self._sepa_agent_element(ns, 'CdtrAgt', partner_bank))
+        children += [
+            sepa_element(ns, 'Cdtr', children=[
+                sepa_element(ns, 'Nm', sepa_text(payment.partner_id.name, 70)),
+            ]),
+            self._sepa_account_element(ns, 'CdtrAcct', partner_bank),
+            sepa_element(ns, 'RmtInf', children=[
+                sepa_element(ns, 'Ustrd', sepa_text(payment.communication or payment.ref or payment.name)),
+            ]),
+        ]
+        return sepa_element(ns, 'CdtTrfTxInf', children=children)
+
+    @api.model
+    def _sepa_account_element(self, ns, tag, partner_bank):
+        """Compte bancaire (IBAN)"""
+        iban = (partner_bank.sanitized_acc_number or '').upper()
+        return sepa_element(ns, tag, children=[
+            sepa_element(ns, 'Id', children=[sepa_element(ns, 'IBAN', iban)]),
+        ])
+
+    @api.model
+    def _sepa_agent_element(self, ns, tag, partner_bank):
+        """Etablissement bancaire (BIC)"""
+        bic = partner_bank.bank_id.bic
+        if bic:
+            institution = [sepa_element(ns, 'BIC', bic.replace(' ', '').upper())]
+        else:
+            institution = [sepa_element(ns, 'Othr', children=[sepa_element(ns, 'Id', 'NOTPROVIDED')])]
+        return sepa_element(ns, tag, children=[
+            sepa_element(ns, 'FinInstnId', children=institution),
+        ])
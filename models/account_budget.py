@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 
-from odoo import api, fields, models, _
+from odoo import api, fields, models, tools, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+
+
+def month_index(day):
+    """Rang du mois d'une date (annee * 12 + mois)"""
+    return day.year * 12 + day.month
 
 
 class AccountBudget(models.Model):
@@ -41,6 +47,13 @@ class AccountBudget(models.Model):
         required=True,
         default=lambda self: self.env.company,
     )
+    control_mode = fields.Selection([
+        ('none', 'Aucun'),
+        ('warning', 'Avertissement'),
+        ('block', 'Blocage'),
+    ], string='Controle budgetaire', required=True, default='none', tracking=True,
+        help="Controle a la comptabilisation des ecritures et a la confirmation des "
+             "commandes d'achat, une fois le budget valide")
 
     # Lignes de budget
     line_ids = fields.One2many(
@@ -50,6 +63,17 @@ class AccountBudget(models.Model):
         copy=True,
     )
 
+    # Versions figees du prevu
+    version_ids = fields.One2many(
+        'account.budget.version.custom',
+        'budget_id',
+        string='Versions',
+    )
+    version_count = fields.Integer(
+        string='Nombre de versions',
+        compute='_compute_version_count',
+    )
+
     # Responsable
     user_id = fields.Many2one(
         'res.users',
@@ -73,22 +97,47 @@ class AccountBudget(models.Model):
         compute='_compute_totals',
         currency_field='currency_id',
     )
+    total_committed = fields.Monetary(
+        string='Total engage',
+        compute='_compute_totals',
+        currency_field='currency_id',
+    )
+    total_forecast = fields.Monetary(
+        string='Total projete',
+        compute='_compute_totals',
+        currency_field='currency_id',
+    )
     currency_id = fields.Many2one(
         related='company_id.currency_id',
     )
 
+    def write(self, vals):
+        res = super().write(vals)
+        if {'date_from', 'date_to'}.intersection(vals):
+            self.filtered(lambda b: b.state == 'validate').line_ids._rebuild_consumption()
+        return res
+
     @api.constrains('date_from', 'date_to')
     def _check_dates(self):
         for budget in self:
             if budget.date_from > budget.date_to:
                 raise ValidationError(_("La date de debut doit etre anterieure a la date de fin."))
 
+    def _compute_version_count(self):
+        counts = dict(self.env['account.budget.version.custom']._read_group(
+            [('budget_id', 'in', self.ids)], groupby=['budget_id'], aggregates=['__count'],
+        ))
+        for budget in self:
+            budget.version_count = counts.get(budget, 0)
+
     @api.depends('line_ids.planned_amount', 'line_ids.practical_amount')
     def _compute_totals(self):
         for budget in self:
             budget.total_planned = sum(budget.line_ids.mapped('planned_amount'))
             budget.total_practical = sum(budget.line_ids.mapped('practical_amount'))
             budget.total_variance = budget.total_planned - budget.total_practical
+            budget.total_committed = sum(budget.line_ids.mapped('committed_amount'))
+            budget.total_forecast = sum(budget.line_ids.mapped('forecast_amount'))
 
     def action_confirm(self):
         for budget in self:
@@ -98,6 +147,7 @@ class AccountBudget(models.Model):
     def action_validate(self):
         for budget in self:
             budget.state = 'validate'
+        self.line_ids._rebuild_consumption()
         return True
 
     def action_done(self):
@@ -105,6 +155,23 @@ class AccountBudget(models.Model):
             budget.state = 'done'
         return True
 
+    def action_create_version(self):
+        """Figer le prevu actuel dans une nouvelle version"""
+        self.env['account.budget.version.custom']._create_snapshots(self)
+        return True
+
+    def action_compare_versions(self):
+        """Ouvrir l'assistant de comparaison des versions"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Comparer les versions'),
+            'res_model': 'account.budget.version.compare.custom',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_budget_id': self.id},
+        }
+
     def action_cancel(self):
         for budget in self:
             budget.state = 'cancel'
@@ -165,9 +232,33 @@ class AccountBudgetLine(models.Model):
     )
     practical_amount = fields.Monetary(
         string='Montant realise',
-        compute='_compute_practical_amount',
+        compute='_compute_budget_amounts',
         currency_field='currency_id',
     )
+    committed_amount = fields.Monetary(
+        string='Montant engage',
+        compute='_compute_budget_amounts',
+        currency_field='currency_id',
+        help="Commandes d'achat confirmees non encore facturees",
+    )
+    forecast_amount = fields.Monetary(
+        string='Montant projete',
+        compute='_compute_budget_amounts',
+        currency_field='currency_id',
+        help="Realise extrapole au rythme mensuel constate jusqu'a la date de fin",
+    )
+    available_amount = fields.Monetary(
+        string='Disponible',
+        compute='_compute_budget_amounts',
+        currency_field='currency_id',
+        help="Prevu - realise - engage",
+    )
+    consumed_amount = fields.Monetary(
+        string='Consomme',
+        compute='_compute_consumed_amount',
+        currency_field='currency_id',
+        help="Realise suivi au fil des comptabilisations (budgets valides)",
+    )
     variance = fields.Monetary(
         string='Ecart',
         compute='_compute_variance',
@@ -185,27 +276,287 @@ class AccountBudgetLine(models.Model):
         related='budget_id.company_id',
     )
 
-    def _compute_practical_amount(self):
+    def init(self):
+        super().init()
+        # Consommation des lignes de budget valides, tenue a chaque comptabilisation
+        self.env.cr.execute(SQL("""
+            CREATE TABLE IF NOT EXISTS account_budget_consumption_custom (
+                budget_line_id integer PRIMARY KEY
+                    REFERENCES account_budget_line_custom (id) ON DELETE CASCADE,
+                amount numeric NOT NULL DEFAULT 0
+            )
+        """))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines.filtered(lambda l: l.budget_id.state == 'validate')._rebuild_consumption()
+        return lines
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'account_id', 'analytic_account_id', 'budget_id'}.intersection(vals):
+            self.filtered(lambda l: l.budget_id.state == 'validate')._rebuild_consumption()
+        return res
+
+    def _compute_consumed_amount(self):
+        consumed = self._get_consumed_amounts()
+        for line in self:
+            line.consumed_amount = abs(consumed.get(line.id, 0.0))
+
+    def _get_consumed_amounts(self):
+        """Consommation signee des lignes : {line_id: montant}"""
+        if not self.ids:
+            return {}
+        self.env.cr.execute(SQL(
+            "SELECT budget_line_id, amount FROM account_budget_consumption_custom WHERE budget_line_id = ANY(%s)",
+            self.ids,
+        ))
+        return dict(self.env.cr.fetchall())
+
+    def _lock_consumed_amounts(self):
+        """
+        Consommation signee des lignes, verrouillee jusqu'a la fin de la
+        transaction pour serialiser les controles concurrents : {line_id: montant}
+        """
+        if not self.ids:
+            return {}
+        self.env.cr.execute(SQL("""
+            INSERT INTO account_budget_consumption_custom (budget_line_id)
+            SELECT unnest(%s::integer[])
+            ON CONFLICT (budget_line_id) DO NOTHING
+        """, self.ids))
+        self.env.cr.execute(SQL("""
+            SELECT budget_line_id, amount
+              FROM account_budget_consumption_custom
+             WHERE budget_line_id = ANY(%s)
+          ORDER BY budget_line_id
+               FOR UPDATE
+        """, self.ids))
+        return dict(self.env.cr.fetchall())
+
+    def _rebuild_consumption(self):
+        """Recalculer la consommation des lignes depuis le realise, en une requete"""
+        if not self:
+            return
+        self.env.flush_all()
+        self.env.cr.execute(SQL(
+            "DELETE FROM account_budget_consumption_custom WHERE budget_line_id = ANY(%s)", self.ids,
+        ))
+        self.env.cr.execute(SQL("""
+            INSERT INTO account_budget_consumption_custom (budget_line_id, amount)
+            SELECT budget_line_id, SUM(amount)
+              FROM (%s) practical
+          GROUP BY budget_line_id
+        """, self._get_practical_amounts_query(SQL("b.id = ANY(%s)", self.ids))))
+
+    @api.model
+    def _add_consumption(self, amount_by_line):
+        """Ajouter les montants {ligne de budget: montant} a la consommation, en une requete"""
+        amount_by_line_id = {line.id: amount for line, amount in amount_by_line.items() if amount}
+        if not amount_by_line_id:
+            return
+        self.env.cr.execute(SQL("""
+            INSERT INTO account_budget_consumption_custom AS consumption (budget_line_id, amount)
+            SELECT * FROM unnest(%s::integer[], %s::numeric[])
+            ON CONFLICT (budget_line_id) DO UPDATE
+               SET amount = consumption.amount + EXCLUDED.amount
+        """, list(amount_by_line_id), list(amount_by_line_id.values())))
+
+    @api.model
+    def _get_controlled_lines(self, account_ids, analytic_account_ids):
+        """Lignes des budgets valides portant sur ces comptes generaux ou analytiques"""
+        if not account_ids and not analytic_account_ids:
+            return self.browse()
+        return self.search([
+            ('budget_id.state', '=', 'validate'),
+            '|',
+            '&', ('analytic_account_id', '=', False), ('account_id', 'in', list(account_ids)),
+            ('analytic_account_id', 'in', list(analytic_account_ids)),
+        ])
+
+    @api.model
+    def _dispatch_budget_amounts(self, items, account_ids, analytic_account_ids):
+        """
+        Imputer des montants sur les lignes de budget valides.
+        items : tuples (origine, date, compte general, repartition analytique, montant)
+        Retourne {origine: {ligne de budget: montant}}
+        """
+        budget_lines = self._get_controlled_lines(account_ids, analytic_account_ids)
+        lines_by_account, lines_by_analytic = {}, {}
+        for budget_line in budget_lines:
+            if budget_line.analytic_account_id:
+                lines_by_analytic.setdefault(budget_line.analytic_account_id.id, []).append(budget_line)
+            else:
+                lines_by_account.setdefault(budget_line.account_id.id, []).append(budget_line)
+
+        amounts_by_origin = {}
+        for origin, date, account_id, distribution, amount in items:
+            amounts = amounts_by_origin.setdefault(origin, {})
+            for budget_line in lines_by_account.get(account_id, []):
+                if budget_line.date_from <= date <= budget_line.date_to:
+                    amounts[budget_line] = amounts.get(budget_line, 0.0) + amount
+            for analytic_id, percentage in (distribution or {}).items():
+                for budget_line in lines_by_analytic.get(int(analytic_id), []):
+                    if budget_line.date_from <= date <= budget_line.date_to:
+                        amounts[budget_line] = amounts.get(budget_line, 0.0) + amount * percentage / 100.0
+        return amounts_by_origin
+
+    @api.model
+    def _sum_budget_amounts(self, amounts_by_origin):
+        """Cumuler {origine: {ligne de budget: montant}} en {ligne de budget: montant}"""
+        total = {}
+        for amounts in amounts_by_origin.values():
+            for budget_line, amount in amounts.items():
+                total[budget_line] = total.get(budget_line, 0.0) + amount
+        return total
+
+    @api.model
+    def _post_budget_warnings(self, amounts_by_origin, warnings):
+        """Notifier chaque origine des depassements des lignes de budget qu'elle consomme"""
+        for origin, amounts in amounts_by_origin.items():
+            messages = [warnings[line] for line, amount in amounts.items() if amount and line in warnings]
+            if messages:
+                origin.message_post(body=_("Depassement budgetaire :\n%s") % '\n'.join(messages))
+
+    @api.model
+    def _check_budget_amounts(self, amount_by_line, include_commitments=False):
+        """
+        Verifier que les montants {ligne de budget: montant} ne depassent pas
+        le prevu des budgets sous controle. Leve une erreur pour les budgets
+        en blocage; retourne les avertissements des autres : {ligne de budget: message}.
+        La consommation des lignes controlees reste verrouillee jusqu'a la fin
+        de la transaction.
+        """
+        controlled = self.concat(*(
+            line for line, amount in amount_by_line.items()
+            if amount and line.budget_id.control_mode != 'none'
+        ))
+        if not controlled:
+            return {}
+        consumed = controlled._lock_consumed_amounts()
+        committed = {}
+        if include_commitments:
+            committed = {
+                line_id: sum(by_month.values())
+                for line_id, by_month in controlled._get_monthly_amounts(controlled._get_committed_amounts_query).items()
+            }
+
+        blocking, warnings = [], {}
+        for line in controlled:
+            before = consumed.get(line.id, 0.0)
+            after = before + amount_by_line[line]
+            if abs(after) <= abs(before) or line.currency_id.compare_amounts(
+                abs(after) + committed.get(line.id, 0.0), line.planned_amount
+            ) <= 0:
+                continue
+            message = _("Budget %s, ligne %s : %s pour un prevu de %s") % (
+                line.budget_id.name,
+                line.name or (line.analytic_account_id or line.account_id).display_name,
+                line.currency_id.round(abs(after) + committed.get(line.id, 0.0)),
+                line.planned_amount,
+            )
+            if line.budget_id.control_mode == 'block':
+                blocking.append(message)
+            else:
+                warnings[line] = message
+        if blocking:
+            raise UserError(_("Depassement budgetaire :\n%s") % '\n'.join(blocking))
+        return warnings
+
+    @api.model
+    def _get_practical_amounts_query(self, where):
+        """
+        Realise mensuel des lignes de budget : lignes analytiques pour les
+        lignes avec compte analytique, ecritures comptabilisees sinon.
+        Colonnes : budget_line_id, month, amount
+        """
+        return SQL("""
+            SELECT b.id AS budget_line_id, date_trunc('month', l.date)::date AS month, SUM(l.balance) AS amount
+              FROM account_budget_line_custom b
+              JOIN account_move_line_custom l
+                ON l.account_id = b.account_id
+               AND l.parent_state = 'posted'
+               AND l.date BETWEEN b.date_from AND b.date_to
+             WHERE b.analytic_account_id IS NULL AND %(where)s
+          GROUP BY b.id, date_trunc('month', l.date)
+         UNION ALL
+            SELECT b.id, date_trunc('month', l.date)::date, SUM(l.amount)
+              FROM account_budget_line_custom b
+              JOIN account_analytic_line_custom l
+                ON l.account_id = b.analytic_account_id
+               AND l.date BETWEEN b.date_from AND b.date_to
+             WHERE %(where)s
+          GROUP BY b.id, date_trunc('month', l.date)
+        """, where=where)
+
+    @api.model
+    def _get_committed_amounts_query(self, where):
+        """
+        Engagements mensuels : montant des lignes de commandes d'achat
+        confirmees, en devise societe, diminue des lignes de factures
+        comptabilisees qui leur sont liees, par date prevue.
+        Colonnes : budget_line_id, month, amount
+        """
+        return SQL("""
+            WITH billed AS (
+                SELECT l.purchase_line_id, SUM(l.balance) AS amount
+                  FROM account_move_line_custom l
+                 WHERE l.purchase_line_id IS NOT NULL
+                   AND l.parent_state = 'posted'
+              GROUP BY l.purchase_line_id
+            )
+            SELECT b.id AS budget_line_id, date_trunc('month', pol.date_planned)::date AS month,
+                   SUM(GREATEST(
+                       pol.price_subtotal / COALESCE(NULLIF(po.currency_rate, 0), 1) - COALESCE(billed.amount, 0),
+                       0
+                   )) AS amount
+              FROM account_budget_line_custom b
+              JOIN purchase_order_line pol
+                ON (pol.budget_analytic_account_id = b.analytic_account_id
+                    OR (b.analytic_account_id IS NULL AND pol.budget_account_id = b.account_id))
+              JOIN purchase_order po ON po.id = pol.order_id
+         LEFT JOIN billed ON billed.purchase_line_id = pol.id
+             WHERE po.state IN ('purchase', 'done')
+               AND pol.display_type IS NULL
+               AND pol.date_planned::date BETWEEN b.date_from AND b.date_to
+               AND %(where)s
+          GROUP BY b.id, date_trunc('month', pol.date_planned)
+        """, where=where)
+
+    def _get_monthly_amounts(self, query_builder):
+        """Montants par ligne de budget et par mois : {line_id: {mois: montant}}"""
+        amounts = {}
+        if not self.ids:
+            return amounts
+        self.env.flush_all()
+        self.env.cr.execute(query_builder(SQL("b.id = ANY(%s)", self.ids)))
+        for line_id, month, amount in self.env.cr.fetchall():
+            by_month = amounts.setdefault(line_id, {})
+            by_month[month] = by_month.get(month, 0.0) + (amount or 0.0)
+        return amounts
+
+    def _compute_budget_amounts(self):
+        """
+        Realise, engage, projete et disponible de toutes les lignes en deux
+        requetes groupees. La projection extrapole la moyenne mensuelle du
+        realise sur les mois restants jusqu'a la date de fin.
+        """
+        practical_by_line = self._get_monthly_amounts(self._get_practical_amounts_query)
+        committed_by_line = self._get_monthly_amounts(self._get_committed_amounts_query)
+        today = fields.Date.context_today(self)
         for line in self:
-            practical = 0.0
-            if line.analytic_account_id:
-                # Somme des lignes analytiques
-                analytic_lines = self.env['account.analytic.line.custom'].search([
-                    ('account_id', '=', line.analytic_account_id.id),
-                    ('date', '>=', line.date_from),
-                    ('date', '<=', line.date_to),
-                ])
-                practical = sum(analytic_lines.mapped('amount'))
-            elif line.account_id:
-                # Somme des ecritures comptables
-                move_lines = self.env['account.move.line.custom'].search([
-                    ('account_id', '=', line.account_id.id),
-                    ('date', '>=', line.date_from),
-                    ('date', '<=', line.date_to),
-                    ('move_id.state', '=', 'posted'),
-                ])
-                practical = sum(move_lines.mapped('balance'))
-            line.practical_amount = abs(practical)
+            practical = abs(sum(practical_by_line.get(line.id, {}).values()))
+            committed = sum(committed_by_line.get(line.id, {}).values())
+            forecast = practical
+            if line.date_from and line.date_to and line.date_from <= today < line.date_to:
+                elapsed_months = month_index(today) - month_index(line.date_from) + 1
+                total_months = month_index(line.date_to) - month_index(line.date_from) + 1
+                forecast = practical / elapsed_months * total_months
+            line.practical_amount = practical
+            line.committed_amount = committed
+            line.forecast_amount = forecast
+            line.available_amount = line.planned_amount - practical - committed
 
     @api.depends('planned_amount', 'practical_amount')
     def _compute_variance(self):
@@ -217,6 +568,143 @@ class AccountBudgetLine(models.Model):
                 line.variance_percent = 0.0
 
 
+class AccountBudgetVersion(models.Model):
+    """
+    Version de Budget
+    Instantane immuable du prevu de chaque ligne ({id de ligne: montant})
+    """
+    _name = 'account.budget.version.custom'
+    _description = 'Version de budget'
+    _order = 'budget_id, version_number desc'
+
+    name = fields.Char(string='Nom', required=True)
+    budget_id = fields.Many2one(
+        'account.budget.custom',
+        string='Budget',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    version_number = fields.Integer(string='Version', required=True)
+    date = fields.Datetime(string='Date', required=True, default=fields.Datetime.now)
+    user_id = fields.Many2one('res.users', string='Auteur', default=lambda self: self.env.user)
+    planned_amounts = fields.Json(string='Montants prevus', required=True)
+    total_planned = fields.Monetary(string='Total prevu', currency_field='currency_id')
+    currency_id = fields.Many2one(related='budget_id.currency_id')
+
+    _sql_constraints = [
+        ('budget_version_uniq', 'unique(budget_id, version_number)',
+         'Le numero de version doit etre unique par budget!'),
+    ]
+
+    @api.model
+    def _create_snapshots(self, budgets):
+        """Creer une version par budget, en une lecture des lignes et une creation"""
+        last_numbers = dict(self._read_group(
+            [('budget_id', 'in', budgets.ids)], groupby=['budget_id'], aggregates=['version_number:max'],
+        ))
+        planned_by_budget = {}
+        for line in budgets.line_ids:
+            planned_by_budget.setdefault(line.budget_id.id, {})[str(line.id)] = line.planned_amount
+        vals_list = []
+        for budget in budgets:
+            number = (last_numbers.get(budget) or 0) + 1
+            planned_amounts = planned_by_budget.get(budget.id, {})
+            vals_list.append({
+                'name': _('%s - version %s') % (budget.name, number),
+                'budget_id': budget.id,
+                'version_number': number,
+                'planned_amounts': planned_amounts,
+                'total_planned': sum(planned_amounts.values()),
+            })
+        return self.create(vals_list)
+
+    def write(self, vals):
+        raise UserError(_("Une version de budget est figee et ne peut pas etre modifiee."))
+
+    def _get_comparison(self, budget_lines):
+        """
+        Prevu de chaque version, prevu actuel et realise pour les lignes de
+        budget, en deux requetes groupees (depliage jsonb des versions et
+        realise des lignes).
+        Retourne {ligne de budget: {'planned': {version_id: montant}, 'current': montant, 'practical': montant}}
+        """
+        self.flush_recordset(['planned_amounts'])
+        self.env.cr.execute(SQL("""
+            SELECT v.id, entry.key::integer, entry.value::numeric
+              FROM account_budget_version_custom v
+             CROSS JOIN LATERAL jsonb_each_text(v.planned_amounts) entry
+             WHERE v.id = ANY(%s)
+               AND entry.key::integer = ANY(%s)
+        """, self.ids, budget_lines.ids))
+        planned_by_line = {}
+        for version_id, line_id, amount in self.env.cr.fetchall():
+            planned_by_line.setdefault(line_id, {})[version_id] = amount
+
+        practical_by_line = budget_lines._get_monthly_amounts(budget_lines._get_practical_amounts_query)
+        return {
+            line: {
+                'planned': planned_by_line.get(line.id, {}),
+                'current': line.planned_amount,
+                'practical': abs(sum(practical_by_line.get(line.id, {}).values())),
+            }
+            for line in budget_lines
+        }
+
+
+class AccountBudgetAnalysis(models.Model):
+    """
+    Analyse Budgetaire Mensuelle
+    Realise et engage par ligne de budget et par mois (colonnes du tableau croise)
+    """
+    _name = 'account.budget.analysis.custom'
+    _description = 'Analyse budgetaire mensuelle'
+    _auto = False
+    _order = 'month, budget_line_id'
+
+    budget_line_id = fields.Many2one('account.budget.line.custom', string='Ligne de budget', readonly=True)
+    budget_id = fields.Many2one('account.budget.custom', string='Budget', readonly=True)
+    account_id = fields.Many2one('account.account.custom', string='Compte general', readonly=True)
+    analytic_account_id = fields.Many2one(
+        'account.analytic.account.custom',
+        string='Compte analytique',
+        readonly=True,
+    )
+    month = fields.Date(string='Mois', readonly=True)
+    company_id = fields.Many2one('res.company', string='Societe', readonly=True)
+    currency_id = fields.Many2one(related='company_id.currency_id')
+    practical_amount = fields.Monetary(string='Realise', readonly=True, currency_field='currency_id')
+    committed_amount = fields.Monetary(string='Engage', readonly=True, currency_field='currency_id')
+
+    def init(self):
+        BudgetLine = self.env['account.budget.line.custom']
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL("""
+            CREATE VIEW %(table)s AS (
+                SELECT row_number() OVER () AS id,
+                       amounts.budget_line_id, b.budget_id, b.account_id, b.analytic_account_id,
+                       amounts.month, budget.company_id,
+                       SUM(amounts.practical) AS practical_amount,
+                       SUM(amounts.committed) AS committed_amount
+                  FROM (
+                        SELECT budget_line_id, month, amount AS practical, 0 AS committed
+                          FROM (%(practical)s) practical
+                     UNION ALL
+                        SELECT budget_line_id, month, 0, amount
+                          FROM (%(committed)s) committed
+                  ) amounts
+                  JOIN account_budget_line_custom b ON b.id = amounts.budget_line_id
+                  JOIN account_budget_custom budget ON budget.id = b.budget_id
+              GROUP BY amounts.budget_line_id, b.budget_id, b.account_id, b.analytic_account_id,
+                       amounts.month, budget.company_id
+            )
+        """,
+            table=SQL.identifier(self._table),
+            practical=BudgetLine._get_practical_amounts_query(SQL("TRUE")),
+            committed=BudgetLine._get_committed_amounts_query(SQL("TRUE")),
+        ))
+
+
 class AccountBudgetPost(models.Model):
     """
     Postes Budgetaires (regroupement de comptes)
@@ -43,6 +43,18 @@ class AccountFiscalYear(models.Model):
         ('done', 'Cloture'),
     ], string='Etat', default='draft')
 
+    # Archivage des lignes (exercices clotures)
+    lines_archived = fields.Boolean(
+        string='Lignes archivees',
+        readonly=True,
+        copy=False,
+    )
+    archive_date = fields.Datetime(
+        string='Date d archivage',
+        readonly=True,
+        copy=False,
+    )
+
     # Periodes
     period_ids = fields.One2many(
         'account.period.custom',
@@ -117,9 +129,74 @@ class AccountFiscalYear(models.Model):
     def action_reopen(self):
         """Reouvrir l'exercice fiscal"""
         for fy in self:
+            if fy.lines_archived:
+                raise UserError(_("Impossible de reouvrir l'exercice %s: ses lignes sont archivees.") % fy.name)
             fy.state = 'draft'
         return True
 
+    def action_export_liasse(self):
+        """Exporter la liasse fiscale (2050 a 2057) de l'exercice en JSON"""
+        self.ensure_one()
+        content = self.env['account.liasse.fiscale.custom']._export_json(self)
+        attachment = self.env['ir.attachment'].create({
+            'name': 'liasse_fiscale_%s.json' % (self.code or self.name),
+            'raw': content.encode(),
+            'mimetype': 'application/json',
+            'res_model': self._name,
+            'res_id': self.id,
+        })
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s?download=true' % attachment.id,
+            'target': 'self',
+        }
+
+    def action_archive_lines(self):
+        """
+        Archiver les lignes d'ecriture des exercices clotures dans la table
+        partitionnee par exercice. Les soldes doivent avoir ete reportes par
+        une ecriture d'a nouveaux comptabilisee sur l'exercice suivant.
+        """
+        Archive = self.env['account.move.line.archive.custom']
+        for fy in self.sorted('date_from'):
+            if fy.state != 'done':
+                raise UserError(_("Seuls les exercices clotures peuvent etre archives."))
+            if fy.lines_archived:
+                continue
+            fy._check_opening_entry()
+            Archive._archive_fiscal_year(fy)
+            fy.write({
+                'lines_archived': True,
+                'archive_date': fields.Datetime.now(),
+            })
+        return True
+
+    def _check_opening_entry(self):
+        """Verifier la presence des a nouveaux comptabilises sur l'exercice suivant"""
+        self.ensure_one()
+        next_fy = self.search([
+            ('company_id', '=', self.company_id.id),
+            ('date_from', '>', self.date_to),
+        ], order='date_from', limit=1)
+        if not next_fy:
+            raise UserError(_("Aucun exercice ne suit l'exercice %s: les a nouveaux ne sont pas reportes.") % self.name)
+        if not next_fy._has_opening_entry():
+            raise UserError(_(
+                "L'ecriture d'a nouveaux de l'exercice %s doit etre comptabilisee "
+                "avant d'archiver l'exercice %s."
+            ) % (next_fy.name, self.name))
+
+    def _has_opening_entry(self, date_to=None):
+        """Presence d'a nouveaux comptabilises sur l'exercice, jusqu'a date_to si precisee"""
+        self.ensure_one()
+        return bool(self.env['account.move.custom'].search_count([
+            ('company_id', '=', self.company_id.id),
+            ('journal_id.type', '=', 'situation'),
+            ('state', '=', 'posted'),
+            ('date', '>=', self.date_from),
+            ('date', '<=', min(date_to, self.date_to) if date_to else self.date_to),
+        ], limit=1))
+
 
 class AccountPeriod(models.Model):
     """
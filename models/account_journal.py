@@ -1,7 +1,24 @@
 # -*- coding: utf-8 -*-
 
-from odoo import api, fields, models, _
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from markupsafe import Markup
+
+from odoo import api, fields, models, tools, _
 from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+from .account_move import compute_move_hash
+
+# Duree de validite (secondes) des indicateurs du tableau de bord
+DASHBOARD_CACHE_TTL = 300
+# Nombre de semaines de l'historique des volumes (ventes/achats)
+DASHBOARD_GRAPH_WEEKS = 12
+# Verification de l'inalterabilite: pieces lues par bloc et journaux verifies en parallele
+HASH_CHECK_CHUNK_SIZE = 10000
+HASH_CHECK_WORKERS = 4
 
 
 class AccountJournal(models.Model):
@@ -65,6 +82,10 @@ class AccountJournal(models.Model):
         related='bank_account_id.bank_id',
         string='Banque',
     )
+    sepa_creditor_identifier = fields.Char(
+        string='Identifiant creancier SEPA (ICS)',
+        help="Requis pour les remises de prelevements SEPA",
+    )
 
     # Sequences
     sequence_id = fields.Many2one(
@@ -105,6 +126,13 @@ class AccountJournal(models.Model):
         help="Si rempli, seuls ces comptes peuvent etre utilises",
     )
 
+    # Inalterabilite
+    restrict_mode_hash_table = fields.Boolean(
+        string='Verrouiller les ecritures validees par hachage',
+        help="Chaque ecriture validee est chainee a la precedente du journal par une "
+             "empreinte; elle ne peut plus etre modifiee ni annulee.",
+    )
+
     # Couleur pour kanban
     color = fields.Integer(string='Couleur')
 
@@ -114,6 +142,57 @@ class AccountJournal(models.Model):
         compute='_compute_move_count',
     )
 
+    # Tableau de bord (banque/caisse)
+    dashboard_balance_gl = fields.Monetary(
+        string='Solde comptable',
+        compute='_compute_dashboard',
+        currency_field='company_currency_id',
+    )
+    dashboard_balance_statement = fields.Monetary(
+        string='Solde dernier releve',
+        compute='_compute_dashboard',
+        currency_field='company_currency_id',
+    )
+    dashboard_statement_date = fields.Date(
+        string='Date dernier releve',
+        compute='_compute_dashboard',
+    )
+    dashboard_unreconciled_count = fields.Integer(
+        string='Lignes a rapprocher',
+        compute='_compute_dashboard',
+    )
+    dashboard_unreconciled_amount = fields.Monetary(
+        string='Montant a rapprocher',
+        compute='_compute_dashboard',
+        currency_field='company_currency_id',
+    )
+
+    # Tableau de bord (ventes/achats)
+    dashboard_open_invoice_count = fields.Integer(
+        string='Factures ouvertes',
+        compute='_compute_dashboard',
+    )
+    dashboard_open_invoice_amount = fields.Monetary(
+        string='Reste du',
+        compute='_compute_dashboard',
+        currency_field='company_currency_id',
+    )
+    dashboard_overdue_amount = fields.Monetary(
+        string='Montant en retard',
+        compute='_compute_dashboard',
+        currency_field='company_currency_id',
+    )
+    dashboard_graph = fields.Html(
+        string='Volumes hebdomadaires',
+        compute='_compute_dashboard',
+        sanitize_style=True,
+        help="Histogramme des volumes factures sur les 12 dernieres semaines",
+    )
+    company_currency_id = fields.Many2one(
+        related='company_id.currency_id',
+        string='Devise societe',
+    )
+
     _sql_constraints = [
         ('code_company_uniq', 'unique(code, company_id)',
          'Le code du journal doit etre unique par societe!'),
@@ -125,6 +204,163 @@ class AccountJournal(models.Model):
                 ('journal_id', '=', journal.id),
             ])
 
+    def _compute_dashboard(self):
+        data_by_company = {}
+        for journal in self:
+            company_id = journal.company_id.id
+            if company_id not in data_by_company:
+                data_by_company[company_id] = self._get_dashboard_data(company_id)
+            data = data_by_company[company_id].get(journal.id, {})
+            journal.dashboard_balance_gl = data.get('balance_gl', 0.0)
+            journal.dashboard_balance_statement = data.get('balance_statement', 0.0)
+            journal.dashboard_statement_date = data.get('statement_date', False)
+            journal.dashboard_unreconciled_count = data.get('unreconciled_count', 0)
+            journal.dashboard_unreconciled_amount = data.get('unreconciled_amount', 0.0)
+            journal.dashboard_open_invoice_count = data.get('open_invoice_count', 0)
+            journal.dashboard_open_invoice_amount = data.get('open_invoice_amount', 0.0)
+            journal.dashboard_overdue_amount = data.get('overdue_amount', 0.0)
+            journal.dashboard_graph = journal._render_dashboard_graph(data.get('graph', []))
+
+    def _render_dashboard_graph(self, series):
+        """Histogramme HTML des volumes hebdomadaires, affiche dans le kanban sans widget JS"""
+        self.ensure_one()
+        if not series:
+            return False
+        maximum = max(abs(point['value']) for point in series) or 1.0
+        bars = Markup().join(
+            Markup('<div title="%s : %s" style="flex: 1; height: %s%%; background-color: #714B67;"></div>') % (
+                point['week'],
+                self.company_currency_id.round(point['value']),
+                max(2, round(abs(point['value']) * 100 / maximum)),
+            )
+            for point in series
+        )
+        return Markup('<div style="display: flex; align-items: flex-end; gap: 2px; height: 48px;">%s</div>') % bars
+
+    @api.model
+    def _get_dashboard_data(self, company_id):
+        """
+        Indicateurs du tableau de bord de tous les journaux d'une societe.
+        Les pieces et releves ne sont restreints que par societe : les
+        indicateurs sont servis aux seuls utilisateurs ayant acces a la
+        societe et aux pieces, et mis en cache par societe et par jour dans
+        le fuseau de l'utilisateur, recalcules au plus toutes les
+        DASHBOARD_CACHE_TTL secondes.
+        """
+        if not company_id or company_id not in self.env.companies.ids:
+            return {}
+        if not all(
+            self.env[model].has_access('read')
+            for model in ('account.move.custom', 'account.bank.statement.custom')
+        ):
+            return {}
+        today = fields.Date.context_today(self)
+        time_bucket = int(time.time() // DASHBOARD_CACHE_TTL)
+        return self._get_dashboard_data_cached(company_id, today, time_bucket)
+
+    @tools.ormcache('company_id', 'today', 'time_bucket')
+    def _get_dashboard_data_cached(self, company_id, today, time_bucket):
+        """Calcule les indicateurs de tous les journaux en quelques requetes groupees"""
+        self.env['account.move.line.custom'].flush_model()
+        self.env['account.move.custom'].flush_model()
+        self.env['account.bank.statement.line.custom'].flush_model()
+        self.env['account.bank.statement.custom'].flush_model()
+        self.flush_model()
+
+        cr = self.env.cr
+        week_start = today - timedelta(days=today.weekday())
+        graph_start = week_start - timedelta(weeks=DASHBOARD_GRAPH_WEEKS - 1)
+        weeks = [graph_start + timedelta(weeks=i) for i in range(DASHBOARD_GRAPH_WEEKS)]
+
+        result = {}
+
+        def journal_data(journal_id):
+            return result.setdefault(journal_id, {})
+
+        # Banque/caisse : solde comptable du compte par defaut
+        cr.execute(SQL("""
+            SELECT j.id, COALESCE(SUM(l.balance), 0)
+              FROM account_journal_custom j
+              JOIN account_move_line_custom l ON l.account_id = j.default_account_id
+             WHERE j.company_id = %s
+               AND j.type IN ('bank', 'cash')
+               AND l.parent_state = 'posted'
+             GROUP BY j.id
+        """, company_id))
+        for journal_id, balance in cr.fetchall():
+            journal_data(journal_id)['balance_gl'] = balance
+
+        # Banque/caisse : solde du dernier releve
+        cr.execute(SQL("""
+            SELECT DISTINCT ON (s.journal_id) s.journal_id, s.balance_end_real, s.date
+              FROM account_bank_statement_custom s
+              JOIN account_journal_custom j ON j.id = s.journal_id
+             WHERE j.company_id = %s
+             ORDER BY s.journal_id, s.date DESC, s.id DESC
+        """, company_id))
+        for journal_id, balance, statement_date in cr.fetchall():
+            data = journal_data(journal_id)
+            data['balance_statement'] = balance or 0.0
+            data['statement_date'] = statement_date
+
+        # Banque/caisse : lignes de releve non rapprochees
+        cr.execute(SQL("""
+            SELECT s.journal_id, COUNT(*), COALESCE(SUM(sl.amount), 0)
+              FROM account_bank_statement_line_custom sl
+              JOIN account_bank_statement_custom s ON s.id = sl.statement_id
+              JOIN account_journal_custom j ON j.id = s.journal_id
+             WHERE j.company_id = %s
+               AND sl.is_reconciled IS NOT TRUE
+             GROUP BY s.journal_id
+        """, company_id))
+        for journal_id, count, amount in cr.fetchall():
+            data = journal_data(journal_id)
+            data['unreconciled_count'] = count
+            data['unreconciled_amount'] = amount
+
+        # Ventes/achats : factures ouvertes et montant en retard
+        cr.execute(SQL("""
+            SELECT m.journal_id,
+                   COUNT(*),
+                   COALESCE(SUM(m.amount_residual * (CASE WHEN m.move_type IN ('out_refund', 'in_refund') THEN -1 ELSE 1 END)), 0),
+                   COALESCE(SUM(m.amount_residual * (CASE WHEN m.move_type IN ('out_refund', 'in_refund') THEN -1 ELSE 1 END))
+                            FILTER (WHERE COALESCE(m.invoice_date_due, m.date) < %s), 0)
+              FROM account_move_custom m
+             WHERE m.company_id = %s
+               AND m.state = 'posted'
+               AND m.move_type IN ('out_invoice', 'out_refund', 'in_invoice', 'in_refund')
+               AND m.payment_state IN ('not_paid', 'partial')
+             GROUP BY m.journal_id
+        """, today, company_id))
+        for journal_id, count, amount, overdue in cr.fetchall():
+            data = journal_data(journal_id)
+            data['open_invoice_count'] = count
+            data['open_invoice_amount'] = amount
+            data['overdue_amount'] = overdue
+
+        # Ventes/achats : volumes factures par semaine
+        cr.execute(SQL("""
+            SELECT m.journal_id,
+                   date_trunc('week', COALESCE(m.invoice_date, m.date))::date,
+                   SUM(ABS(m.amount_total) * (CASE WHEN m.move_type IN ('out_refund', 'in_refund') THEN -1 ELSE 1 END))
+              FROM account_move_custom m
+             WHERE m.company_id = %s
+               AND m.state = 'posted'
+               AND m.move_type IN ('out_invoice', 'out_refund', 'in_invoice', 'in_refund')
+               AND COALESCE(m.invoice_date, m.date) >= %s
+             GROUP BY 1, 2
+        """, company_id, graph_start))
+        volumes = {}
+        for journal_id, week, amount in cr.fetchall():
+            volumes.setdefault(journal_id, {})[week] = amount
+        for journal_id, journal_volumes in volumes.items():
+            journal_data(journal_id)['graph'] = [
+                {'week': fields.Date.to_string(week), 'value': journal_volumes.get(week, 0.0)}
+                for week in weeks
+            ]
+
+        return result
+
     @api.model_create_multi
     def create(self, vals_list):
         for vals in vals_list:
@@ -139,6 +375,111 @@ class AccountJournal(models.Model):
                 vals['sequence_id'] = self.env['ir.sequence'].create(seq_vals).id
         return super().create(vals_list)
 
+    def write(self, vals):
+        if 'restrict_mode_hash_table' in vals and not vals['restrict_mode_hash_table']:
+            hashed_count = self.env['account.move.custom'].search_count([
+                ('journal_id', 'in', self.ids),
+                ('inalterable_hash', '!=', False),
+            ], limit=1)
+            if hashed_count:
+                raise UserError(_("Le verrouillage ne peut pas etre desactive: des ecritures du journal sont deja chainees."))
+        return super().write(vals)
+
+    def _get_last_hash(self):
+        """Dernier (numero de chainage, empreinte) du journal, (0, '') si aucun"""
+        self.ensure_one()
+        self.env.cr.execute(SQL("""
+            SELECT secure_sequence_number, inalterable_hash
+              FROM account_move_custom
+             WHERE journal_id = %s
+               AND secure_sequence_number IS NOT NULL
+          ORDER BY secure_sequence_number DESC
+             LIMIT 1
+        """, self.id))
+        return self.env.cr.fetchone() or (0, '')
+
+    def _check_hash_integrity(self, chunk_size=HASH_CHECK_CHUNK_SIZE):
+        """
+        Recalculer la chaine du journal en la parcourant par blocs de pieces
+        (pagination sur le numero de chainage), sans charger le journal entier.
+        Retourne le resultat de la verification du journal.
+        """
+        self.ensure_one()
+        Move = self.env['account.move.custom']
+        digits = self.company_id.currency_id.decimal_places
+        result = {'journal': self.display_name, 'valid': True, 'count': 0, 'first_date': False, 'last_date': False}
+        last_number, previous_hash = 0, ''
+        while True:
+            self.env.cr.execute(SQL("""
+                SELECT id, name, date, secure_sequence_number, inalterable_hash
+                  FROM account_move_custom
+                 WHERE journal_id = %s
+                   AND secure_sequence_number > %s
+              ORDER BY secure_sequence_number
+                 LIMIT %s
+            """, self.id, last_number, chunk_size))
+            rows = self.env.cr.fetchall()
+            if not rows:
+                break
+            hash_data = Move._get_hash_data([row[0] for row in rows], digits)
+            for move_id, name, move_date, number, stored_hash in rows:
+                if number != last_number + 1:
+                    result.update(valid=False, error=_("Chaine interrompue avant la piece %s (numero %s attendu, %s trouve).") % (name, last_number + 1, number))
+                    return result
+                previous_hash = compute_move_hash(previous_hash, *hash_data.get(move_id, ((name, str(move_date)), [])))
+                if previous_hash != stored_hash:
+                    result.update(valid=False, error=_("Empreinte invalide pour la piece %s: elle a ete alteree.") % name)
+                    return result
+                last_number = number
+                result['count'] += 1
+                result['first_date'] = result['first_date'] or move_date
+                result['last_date'] = move_date
+        return result
+
+    def _check_hash_integrity_parallel(self, max_workers=HASH_CHECK_WORKERS):
+        """
+        Verifier les journaux verrouilles, un fil par journal, chacun avec son
+        propre curseur (lecture des donnees validees uniquement).
+        """
+        journals = self.filtered('restrict_mode_hash_table')
+        registry = self.env.registry
+        if len(journals) < 2 or registry.in_test_mode():
+            return [journal._check_hash_integrity() for journal in journals]
+        uid, context = self.env.uid, self.env.context
+
+        def check_journal(journal_id):
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                return env[self._name].browse(journal_id)._check_hash_integrity()
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(journals))) as executor:
+            return list(executor.map(check_journal, journals.ids))
+
+    def action_check_hash_integrity(self):
+        """Verifier l'inalterabilite des journaux et afficher le resultat"""
+        results = self._check_hash_integrity_parallel()
+        if not results:
+            raise UserError(_("Aucun journal selectionne n'est verrouille par hachage."))
+        messages = []
+        for result in results:
+            if result['valid']:
+                messages.append(_("%s: %s pieces verifiees (%s - %s)") % (
+                    result['journal'], result['count'], result['first_date'] or '', result['last_date'] or '',
+                ))
+            else:
+                messages.append('%s: %s' % (result['journal'], result['error']))
+        all_valid = all(result['valid'] for result in results)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Chaine d'inalterabilite valide") if all_valid else _("Chaine d'inalterabilite corrompue"),
+                'message': '\n'.join(messages),
+                'type': 'success' if all_valid else 'danger',
+                'sticky': True,
+            },
+        }
+
     def action_view_moves(self):
         """Voir les ecritures du journal"""
         self.ensure_one()
@@ -1,8 +1,46 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError, ValidationError
-from datetime import date
+from odoo.tools import SQL, float_compare, float_repr, split_every
+from datetime import date, timedelta
+
+from .res_currency import CurrencyRateCache
+
+INVOICE_MOVE_TYPES = ('out_invoice', 'out_refund', 'in_invoice', 'in_refund')
+TERM_ACCOUNT_TYPES = ('asset_receivable', 'liability_payable')
+AMOUNT_FIELDS = ('amount_untaxed', 'amount_tax', 'amount_total', 'amount_residual')
+# Comptes de reevaluation : ecarts de conversion (creances/dettes) et change realise (tresorerie)
+REVALUATION_ACCOUNT_CODES = {
+    'unrealized_loss': '476000',
+    'unrealized_gain': '477000',
+    'loss': '666000',
+    'gain': '766000',
+}
+# Champs couverts par l'empreinte d'inalterabilite (interdits en ecriture une fois hachee)
+HASHED_MOVE_FIELDS = {'name', 'date', 'journal_id', 'company_id', 'line_ids', 'state'}
+HASHED_LINE_FIELDS = {'move_id', 'account_id', 'partner_id', 'debit', 'credit', 'amount_currency', 'currency_id'}
+REVERSED_MOVE_TYPES = {
+    'entry': 'entry',
+    'out_invoice': 'out_refund',
+    'out_refund': 'out_invoice',
+    'in_invoice': 'in_refund',
+    'in_refund': 'in_invoice',
+    # Un recu n'a pas de type avoir: son extourne est une ecriture simple
+    'out_receipt': 'entry',
+    'in_receipt': 'entry',
+}
+
+
+def compute_move_hash(previous_hash, move_values, lines_values):
+    """Empreinte SHA-256 d'une piece, chainee a l'empreinte de la piece precedente"""
+    digest = hashlib.sha256(previous_hash.encode())
+    digest.update('|'.join(move_values).encode())
+    for line_values in lines_values:
+        digest.update(('\n' + '|'.join(line_values)).encode())
+    return digest.hexdigest()
 
 
 class AccountMove(models.Model):
@@ -116,11 +154,59 @@ class AccountMove(models.Model):
     # Dates factures
     invoice_date = fields.Date(string='Date facture')
     invoice_date_due = fields.Date(string='Date echeance')
+    invoice_payment_term_id = fields.Many2one(
+        'account.payment.term.custom',
+        string='Conditions de paiement',
+        compute='_compute_invoice_payment_term',
+        store=True,
+        readonly=False,
+    )
 
     # Origine
     invoice_origin = fields.Char(string='Document origine')
     narration = fields.Html(string='Notes internes')
 
+    # Lignes deplacees dans l'archive de l'exercice (exercice cloture)
+    lines_archived = fields.Boolean(
+        string='Lignes archivees',
+        readonly=True,
+        copy=False,
+    )
+    archived_line_ids = fields.One2many(
+        'account.move.line.archive.custom',
+        'move_id',
+        string='Lignes archivees',
+    )
+
+    # Extourne
+    reversed_entry_id = fields.Many2one(
+        'account.move.custom',
+        string='Extourne de',
+        readonly=True,
+        copy=False,
+        index='btree_not_null',
+    )
+    reversal_move_ids = fields.One2many(
+        'account.move.custom',
+        'reversed_entry_id',
+        string='Extournes',
+    )
+
+    # Ecriture recurrente
+    recurring_template_id = fields.Many2one(
+        'account.move.recurring.custom',
+        string='Modele recurrent',
+        readonly=True,
+        copy=False,
+        index='btree_not_null',
+    )
+    recurring_period = fields.Date(
+        string='Periode recurrente',
+        readonly=True,
+        copy=False,
+        help="Premier jour du mois de l'echeance generee",
+    )
+
     # Paiements lies
     payment_ids = fields.Many2many(
         'account.payment.custom',
@@ -144,17 +230,74 @@ class AccountMove(models.Model):
         store=True,
     )
 
-    @api.depends('line_ids.debit', 'line_ids.credit', 'line_ids.amount_currency')
+    # Inalterabilite: chaine d'empreintes par journal
+    secure_sequence_number = fields.Integer(
+        string='Numero de chainage',
+        readonly=True,
+        copy=False,
+    )
+    inalterable_hash = fields.Char(
+        string='Empreinte',
+        readonly=True,
+        copy=False,
+    )
+
+    _sql_constraints = [
+        ('recurring_period_uniq', 'unique(recurring_template_id, recurring_period)',
+         'Une ecriture a deja ete generee pour ce modele sur cette periode!'),
+        ('secure_sequence_uniq', 'unique(journal_id, secure_sequence_number)',
+         'Le numero de chainage doit etre unique par journal!'),
+    ]
+
+    @api.depends('line_ids.debit', 'line_ids.credit', 'line_ids.amount_currency', 'line_ids.amount_residual')
     def _compute_amounts(self):
+        # Pieces en base: une requete groupee; nouvelles pieces (formulaire): calcul en memoire
+        stored_moves = self.filtered(lambda m: isinstance(m.id, int))
+        if stored_moves:
+            stored_moves._compute_amounts_sql()
+        (self - stored_moves)._compute_amounts_python()
+
+    def _compute_amounts_sql(self):
+        """Montants de toutes les pieces en une requete sur les lignes jointes aux comptes"""
+        self.env['account.move.line.custom'].flush_model(
+            ['move_id', 'account_id', 'tax_line_id', 'debit', 'balance', 'amount_residual'])
+        self.env['account.account.custom'].flush_model(['account_type'])
+        self.env.cr.execute(SQL("""
+            SELECT l.move_id,
+                   SUM(l.balance) FILTER (WHERE COALESCE(a.account_type, '') NOT IN %(term_types)s AND l.tax_line_id IS NULL),
+                   SUM(l.balance) FILTER (WHERE COALESCE(a.account_type, '') NOT IN %(term_types)s AND l.tax_line_id IS NOT NULL),
+                   SUM(l.debit),
+                   SUM(l.amount_residual) FILTER (WHERE a.account_type IN %(term_types)s)
+              FROM account_move_line_custom l
+              JOIN account_account_custom a ON a.id = l.account_id
+             WHERE l.move_id = ANY(%(move_ids)s)
+          GROUP BY l.move_id
+        """, term_types=TERM_ACCOUNT_TYPES, move_ids=self.ids))
+        totals = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+
         for move in self:
-            if move.move_type in ('out_invoice', 'out_refund', 'in_invoice', 'in_refund'):
+            untaxed, tax, debit, residual = totals.get(move.id, (None, None, None, None))
+            if move.move_type in INVOICE_MOVE_TYPES:
+                move.amount_untaxed = untaxed or 0.0
+                move.amount_tax = tax or 0.0
+                move.amount_total = move.amount_untaxed + move.amount_tax
+                move.amount_residual = residual or 0.0
+            else:
+                move.amount_untaxed = 0
+                move.amount_tax = 0
+                move.amount_total = debit or 0.0
+                move.amount_residual = 0
+
+    def _compute_amounts_python(self):
+        for move in self:
+            if move.move_type in INVOICE_MOVE_TYPES:
                 # Pour les factures
-                lines = move.line_ids.filtered(lambda l: l.account_id.account_type not in ('asset_receivable', 'liability_payable'))
+                lines = move.line_ids.filtered(lambda l: l.account_id.account_type not in TERM_ACCOUNT_TYPES)
                 move.amount_untaxed = sum(lines.filtered(lambda l: not l.tax_line_id).mapped('balance'))
                 move.amount_tax = sum(lines.filtered(lambda l: l.tax_line_id).mapped('balance'))
                 move.amount_total = move.amount_untaxed + move.amount_tax
 
-                receivable_lines = move.line_ids.filtered(lambda l: l.account_id.account_type in ('asset_receivable', 'liability_payable'))
+                receivable_lines = move.line_ids.filtered(lambda l: l.account_id.account_type in TERM_ACCOUNT_TYPES)
                 move.amount_residual = sum(receivable_lines.mapped('amount_residual'))
             else:
                 move.amount_untaxed = 0
@@ -162,6 +305,66 @@ class AccountMove(models.Model):
                 move.amount_total = sum(move.line_ids.mapped('debit'))
                 move.amount_residual = 0
 
+    def _update_residual_from_lines(self):
+        """
+        Recalculer en SQL le reste a payer des factures depuis leurs lignes
+        client/fournisseur, puis le statut de paiement de ces seules pieces.
+        """
+        if not self:
+            return
+        self.flush_recordset(['amount_residual', 'payment_state'])
+        self.env.cr.execute(SQL("""
+            UPDATE account_move_custom m
+               SET amount_residual = sub.residual
+              FROM (
+                    SELECT l.move_id, SUM(l.amount_residual) AS residual
+                      FROM account_move_line_custom l
+                      JOIN account_account_custom a ON a.id = l.account_id
+                     WHERE l.move_id = ANY(%(move_ids)s)
+                       AND a.account_type IN %(term_types)s
+                  GROUP BY l.move_id
+                   ) sub
+             WHERE m.id = sub.move_id
+               AND m.move_type IN %(invoice_types)s
+        """, move_ids=self.ids, term_types=TERM_ACCOUNT_TYPES, invoice_types=INVOICE_MOVE_TYPES))
+        self.invalidate_recordset(['amount_residual'])
+        self.env.add_to_compute(self._fields['payment_state'], self)
+        self.flush_recordset(['payment_state'])
+
+    def _recompute_amounts(self, chunk_size=10000):
+        """
+        Recalculer et enregistrer les montants par paquets (apres un import
+        ou une correction de masse), sans passer par le graphe de dependances.
+        """
+        fields_to_compute = [self._fields[fname] for fname in AMOUNT_FIELDS]
+        for ids in split_every(chunk_size, self.ids):
+            moves = self.browse(ids)
+            for field in fields_to_compute:
+                self.env.add_to_compute(field, moves)
+            moves.flush_recordset(list(AMOUNT_FIELDS))
+            moves.invalidate_recordset(list(AMOUNT_FIELDS))
+        return True
+
+    @api.depends('partner_id', 'move_type', 'company_id')
+    def _compute_invoice_payment_term(self):
+        for move in self:
+            partner = move.partner_id.with_company(move.company_id)
+            if move.move_type in ('out_invoice', 'out_refund'):
+                move.invoice_payment_term_id = partner.property_payment_term_id
+            elif move.move_type in ('in_invoice', 'in_refund'):
+                move.invoice_payment_term_id = partner.property_supplier_payment_term_id
+            else:
+                move.invoice_payment_term_id = False
+
+    @api.onchange('invoice_date', 'invoice_payment_term_id')
+    def _onchange_invoice_payment_term(self):
+        for move in self:
+            if move.invoice_payment_term_id and move.invoice_date:
+                schedule = move.invoice_payment_term_id.compute(
+                    abs(move.amount_total), move.invoice_date, currency=move.currency_id)
+                if schedule:
+                    move.invoice_date_due = schedule[-1][0]
+
     @api.depends('line_ids.debit', 'line_ids.credit')
     def _compute_is_balanced(self):
         for move in self:
@@ -201,7 +404,7 @@ class AccountMove(models.Model):
                 ) % (move.name, sum(move.line_ids.mapped('debit')), sum(move.line_ids.mapped('credit'))))
 
     def action_post(self):
-        """Valider l'ecriture"""
+        """Valider les ecritures"""
         for move in self:
             if move.state != 'draft':
                 raise UserError(_("Seules les ecritures en brouillon peuvent etre validees."))
@@ -210,47 +413,442 @@ class AccountMove(models.Model):
             if not move.is_balanced:
                 raise UserError(_("L'ecriture n'est pas equilibree."))
 
-            # Generer le numero
-            if move.name == '/':
-                move.name = move.journal_id.sequence_id.next_by_id()
+        # Controle budgetaire avant comptabilisation
+        BudgetLine = self.env['account.budget.line.custom']
+        budget_amounts_by_move = self.line_ids._get_budget_amounts()
+        budget_amounts = BudgetLine._sum_budget_amounts(budget_amounts_by_move)
+        budget_warnings = BudgetLine._check_budget_amounts(budget_amounts)
+
+        # Echeances et numeros
+        self._apply_payment_terms()
+        self.filtered(lambda m: m.name == '/')._assign_sequence_names()
 
-            move.state = 'posted'
+        self.write({'state': 'posted'})
+        self._hash_moves()
+        self.line_ids._create_analytic_lines()
+        BudgetLine._add_consumption(budget_amounts)
+        self.env['account.report.custom']._invalidate_balances_cache()
+        BudgetLine._post_budget_warnings(budget_amounts_by_move, budget_warnings)
         return True
 
+    def _hash_moves(self):
+        """
+        Chainer les pieces des journaux verrouilles: numero de chainage et
+        empreinte par journal, calcules sur une lecture groupee des lignes
+        puis ecrits en une seule mise a jour.
+        """
+        moves = self.filtered('journal_id.restrict_mode_hash_table')
+        if not moves:
+            return
+        self.env['account.move.line.custom'].flush_model(HASHED_LINE_FIELDS)
+        moves.flush_recordset(['name', 'date'])
+        ids, numbers, hashes = [], [], []
+        for journal, journal_moves in moves.grouped('journal_id').items():
+            # Un seul chainage a la fois par journal
+            self.env.cr.execute(SQL(
+                "SELECT id FROM account_journal_custom WHERE id = %s FOR UPDATE", journal.id,
+            ))
+            sequence_number, previous_hash = journal._get_last_hash()
+            hash_data = self._get_hash_data(journal_moves.ids, journal.company_id.currency_id.decimal_places)
+            for move in journal_moves.sorted(lambda m: (m.date, m.name, m.id)):
+                sequence_number += 1
+                previous_hash = compute_move_hash(previous_hash, *hash_data[move.id])
+                ids.append(move.id)
+                numbers.append(sequence_number)
+                hashes.append(previous_hash)
+        self.env.cr.execute(SQL("""
+            UPDATE account_move_custom m
+               SET secure_sequence_number = chain.number,
+                   inalterable_hash = chain.hash
+              FROM unnest(%s::integer[], %s::integer[], %s::varchar[]) AS chain(id, number, hash)
+             WHERE m.id = chain.id
+        """, ids, numbers, hashes))
+        moves.invalidate_recordset(['secure_sequence_number', 'inalterable_hash'])
+
+    @api.model
+    def _get_hash_data(self, move_ids, digits):
+        """
+        Valeurs hachees des pieces {move_id: ((numero, date), [(ligne, compte, partenaire,
+        debit, credit, devise, montant devise)])}
+        Le compte est hache par son identifiant: un changement de code ne
+        modifie pas les empreintes. Les lignes des exercices archives sont
+        lues dans l'archive.
+        """
+        self.env.cr.execute(SQL("""
+            SELECT m.id, m.name, m.date, l.id, l.account_id, l.partner_id, l.debit, l.credit,
+                   l.currency_id, l.amount_currency, c.decimal_places
+              FROM account_move_custom m
+              JOIN (
+                    SELECT id, move_id, account_id, partner_id, debit, credit, currency_id, amount_currency
+                      FROM account_move_line_custom
+                     WHERE move_id = ANY(%(move_ids)s)
+                 UNION ALL
+                    SELECT id, move_id, account_id, partner_id, debit, credit, currency_id, amount_currency
+                      FROM account_move_line_archive_custom
+                     WHERE move_id = ANY(%(move_ids)s)
+                   ) l ON l.move_id = m.id
+         LEFT JOIN res_currency c ON c.id = l.currency_id
+             WHERE m.id = ANY(%(move_ids)s)
+          ORDER BY m.id, l.id
+        """, move_ids=move_ids))
+        hash_data = {}
+        for (move_id, name, move_date, line_id, account_id, partner_id, debit, credit,
+                currency_id, amount_currency, currency_digits) in self.env.cr.fetchall():
+            move_values, lines_values = hash_data.setdefault(move_id, ((name, str(move_date)), []))
+            lines_values.append((
+                str(line_id), str(account_id), str(partner_id or ''),
+                float_repr(float(debit or 0.0), digits), float_repr(float(credit or 0.0), digits),
+                str(currency_id or ''),
+                float_repr(float(amount_currency or 0.0), currency_digits if currency_digits is not None else digits),
+            ))
+        return hash_data
+
+    def _check_not_hashed(self):
+        hashed = self.filtered('inalterable_hash')
+        if hashed:
+            raise UserError(_(
+                "Les ecritures suivantes sont protegees par la chaine d'inalterabilite "
+                "et ne peuvent plus etre modifiees: %s"
+            ) % ', '.join(hashed.mapped('name')))
+
+    def write(self, vals):
+        if HASHED_MOVE_FIELDS.intersection(vals):
+            self._check_not_hashed()
+        return super().write(vals)
+
+    @api.ondelete(at_uninstall=False)
+    def _unlink_except_hashed(self):
+        self._check_not_hashed()
+
+    def _assign_sequence_names(self):
+        """Numeroter les ecritures en reservant les numeros par sequence de journal"""
+        for journal, moves in self.grouped('journal_id').items():
+            if not journal.sequence_id:
+                raise UserError(_("Le journal %s n'a pas de sequence.") % journal.name)
+            names = journal.sequence_id._next_batch(len(moves))
+            for move, name in zip(moves, names):
+                move.name = name
+
+    def _apply_payment_terms(self):
+        """
+        Calculer les echeanciers des factures par condition de paiement et
+        ecrire invoice_date_due / date_maturity en ecritures groupees par date.
+        Les echeances sont affectees dans l'ordre aux lignes client/fournisseur
+        lorsqu'il y en a autant; sinon toutes recoivent la derniere echeance.
+        """
+        invoices = self.filtered(lambda m: m.invoice_payment_term_id and m.move_type != 'entry')
+        moves_by_due_date = {}
+        lines_by_due_date = {}
+
+        for (term, currency), moves in invoices.grouped(
+            lambda m: (m.invoice_payment_term_id, m.currency_id)
+        ).items():
+            schedules = term.compute_batch(
+                [(abs(move.amount_total), move.invoice_date or move.date) for move in moves],
+                currency=currency,
+            )
+            for move, schedule in zip(moves, schedules):
+                if not schedule:
+                    continue
+                moves_by_due_date.setdefault(schedule[-1][0], []).append(move.id)
+                term_lines = move.line_ids.filtered(
+                    lambda l: l.account_id.account_type in ('asset_receivable', 'liability_payable'))
+                if len(term_lines) == len(schedule):
+                    due_dates = [due_date for due_date, dummy in schedule]
+                else:
+                    due_dates = [schedule[-1][0]] * len(term_lines)
+                for line, due_date in zip(term_lines, due_dates):
+                    lines_by_due_date.setdefault(due_date, []).append(line.id)
+
+        for due_date, move_ids in moves_by_due_date.items():
+            self.browse(move_ids).write({'invoice_date_due': due_date})
+        MoveLine = self.env['account.move.line.custom']
+        for due_date, line_ids in lines_by_due_date.items():
+            MoveLine.browse(line_ids).write({'date_maturity': due_date})
+
+    def _check_lines_not_archived(self):
+        archived = self.filtered('lines_archived')
+        if archived:
+            raise UserError(_(
+                "Les lignes des ecritures suivantes sont archivees (exercice cloture): %s"
+            ) % ', '.join(archived.mapped('name')))
+
     def action_cancel(self):
         """Annuler l'ecriture"""
+        self._check_lines_not_archived()
+        self._check_not_hashed()
         for move in self:
             if move.state == 'posted':
                 # Verifier si des lignes sont lettrees
                 if any(line.reconciled for line in move.line_ids):
                     raise UserError(_("Impossible d'annuler une ecriture avec des lignes lettrees."))
-            move.state = 'cancel'
+        self.line_ids.analytic_line_ids.unlink()
+        posted_moves = self.filtered(lambda m: m.state == 'posted')
+        BudgetLine = self.env['account.budget.line.custom']
+        budget_amounts = BudgetLine._sum_budget_amounts(posted_moves.line_ids._get_budget_amounts())
+        BudgetLine._add_consumption({budget_line: -amount for budget_line, amount in budget_amounts.items()})
+        if posted_moves:
+            self.env['account.report.custom']._invalidate_balances_cache()
+        self.write({'state': 'cancel'})
         return True
 
     def action_draft(self):
         """Remettre en brouillon"""
-        for move in self:
-            if move.state == 'cancel':
-                move.state = 'draft'
+        self._check_lines_not_archived()
+        self._check_not_hashed()
+        self.filtered(lambda m: m.state == 'cancel').write({'state': 'draft'})
         return True
 
     def action_reverse(self):
-        """Extourner l'ecriture"""
-        self.ensure_one()
-        reverse_move = self.copy({
-            'ref': _('Extourne de %s') % self.name,
-            'date': fields.Date.today(),
-        })
-        # Inverser debit/credit
-        for line in reverse_move.line_ids:
-            line.debit, line.credit = line.credit, line.debit
-        return {
+        """Extourner les ecritures"""
+        reverse_moves = self._reverse_moves()
+        action = {
             'type': 'ir.actions.act_window',
             'name': _('Extourne'),
             'res_model': 'account.move.custom',
-            'view_mode': 'form',
-            'res_id': reverse_move.id,
         }
+        if len(reverse_moves) == 1:
+            action.update({'view_mode': 'form', 'res_id': reverse_moves.id})
+        else:
+            action.update({'view_mode': 'list,form', 'domain': [('id', 'in', reverse_moves.ids)]})
+        return action
+
+    def _reverse_moves(self, date=None, reason=None, auto_post=False, reconcile=False):
+        """
+        Extourner les ecritures en une seule creation : les valeurs des
+        pieces inverses (debit/credit permutes) sont preparees en memoire.
+        Optionnellement, les extournes sont comptabilisees puis lettrees
+        avec leur piece d'origine sur les comptes lettrables.
+        """
+        self._check_lines_not_archived()
+        date = date or fields.Date.context_today(self)
+        reverse_moves = self.create([move._prepare_reverse_move_vals(date, reason) for move in self])
+
+        if auto_post:
+            reverse_moves.action_post()
+        if reconcile:
+            reverse_moves._reconcile_with_reversed_entries()
+        return reverse_moves
+
+    def _prepare_reverse_move_vals(self, date, reason=None):
+        """Valeurs de l'extourne de la piece"""
+        self.ensure_one()
+        ref = _('Extourne de %s') % self.name
+        if reason:
+            ref = '%s, %s' % (ref, reason)
+        return {
+            'move_type': REVERSED_MOVE_TYPES.get(self.move_type, 'entry'),
+            'journal_id': self.journal_id.id,
+            'company_id': self.company_id.id,
+            'currency_id': self.currency_id.id,
+            'partner_id': self.partner_id.id,
+            'date': date,
+            'invoice_date': date if self.move_type != 'entry' else False,
+            'ref': ref,
+            'reversed_entry_id': self.id,
+            'line_ids': [(0, 0, line._prepare_reverse_line_vals()) for line in self.line_ids],
+        }
+
+    def _reconcile_with_reversed_entries(self):
+        """Lettrer chaque extourne avec sa piece d'origine (comptes lettrables)"""
+        moves = self.filtered(lambda m: m.state == 'posted' and m.reversed_entry_id.state == 'posted')
+        pair_by_move_id = {}
+        for move in moves:
+            pair_by_move_id[move.id] = pair_by_move_id[move.reversed_entry_id.id] = move
+        lines = (moves.line_ids | moves.reversed_entry_id.line_ids).filtered(
+            lambda l: l.account_id.reconcile and not l.reconciled
+        )
+        groups = lines.grouped(
+            lambda l: (pair_by_move_id[l.move_id.id], l.account_id, l.partner_id)
+        ).values()
+        return self.env['account.move.line.custom']._reconcile_groups(groups)
+
+    @api.model
+    def _get_revaluation_accounts(self, company):
+        """Comptes 476/477/666/766 de la societe, par role"""
+        accounts = self.env['account.account.custom'].search([
+            ('company_id', '=', company.id),
+            ('code', 'in', list(REVALUATION_ACCOUNT_CODES.values())),
+        ])
+        account_by_code = {account.code: account for account in accounts}
+        missing = [code for code in REVALUATION_ACCOUNT_CODES.values() if code not in account_by_code]
+        if missing:
+            raise UserError(_("Comptes de reevaluation introuvables: %s") % ', '.join(missing))
+        return {role: account_by_code[code] for role, code in REVALUATION_ACCOUNT_CODES.items()}
+
+    @api.model
+    def _get_exchange_journal(self, company):
+        """Journal des ecarts de change : premier journal d'operations diverses"""
+        journal = self.env['account.journal.custom'].search([
+            ('company_id', '=', company.id),
+            ('type', '=', 'general'),
+        ], limit=1)
+        if not journal:
+            raise UserError(_("Aucun journal d'operations diverses pour la societe %s.") % company.name)
+        return journal
+
+    @api.model
+    def _get_revaluation_balances(self, company, revaluation_date):
+        """
+        Soldes en devise etrangere a reevaluer a la date, en une requete,
+        groupes par compte, partenaire et devise :
+        - tresorerie : solde des lignes en cours et archivees a la date; les
+          a nouveaux ne comptent que s'ils precedent la premiere ligne
+          ordinaire (reprise d'un historique externe);
+        - creances et dettes : residuel a la date des lignes lettrables, hors
+          lettrages dont la contrepartie est posterieure a la date.
+        Retourne des tuples (account_id, partner_id, currency_id, is_cash, amount_currency, balance)
+        """
+        self.env['account.move.line.custom'].flush_model([
+            'account_id', 'partner_id', 'currency_id', 'company_id', 'journal_id', 'date', 'parent_state',
+            'balance', 'amount_currency',
+        ])
+        self.env['account.partial.reconcile.custom'].flush_model([
+            'debit_move_id', 'credit_move_id', 'amount', 'amount_currency', 'max_date', 'company_id',
+        ])
+        self.env['account.account.custom'].flush_model(['account_type', 'reconcile'])
+        self.env.cr.execute(SQL("""
+            WITH cash_lines AS (
+                    SELECT l.account_id, l.partner_id, l.currency_id, l.date, l.amount_currency, l.balance,
+                           j.type = 'situation' AS is_opening
+                      FROM account_move_line_custom l
+                      JOIN account_account_custom a ON a.id = l.account_id
+                      JOIN account_journal_custom j ON j.id = l.journal_id
+                     WHERE l.company_id = %(company_id)s
+                       AND l.parent_state = 'posted'
+                       AND l.date <= %(date)s
+                       AND l.currency_id <> %(company_currency_id)s
+                       AND a.account_type = 'asset_cash'
+                 UNION ALL
+                    SELECT l.account_id, l.partner_id, l.currency_id, l.date, l.amount_currency, l.balance,
+                           j.type = 'situation' AS is_opening
+                      FROM account_move_line_archive_custom l
+                      JOIN account_account_custom a ON a.id = l.account_id
+                      JOIN account_journal_custom j ON j.id = l.journal_id
+                     WHERE l.company_id = %(company_id)s
+                       AND l.parent_state = 'posted'
+                       AND l.date <= %(date)s
+                       AND l.currency_id <> %(company_currency_id)s
+                       AND a.account_type = 'asset_cash'
+            ),
+            history AS (
+                SELECT MIN(date) AS start_date FROM cash_lines WHERE NOT is_opening
+            ),
+            matched AS (
+                    SELECT p.debit_move_id AS line_id, p.amount, p.amount_currency
+                      FROM account_partial_reconcile_custom p
+                     WHERE p.company_id = %(company_id)s
+                       AND p.max_date <= %(date)s
+                 UNION ALL
+                    SELECT p.credit_move_id, p.amount, p.amount_currency
+                      FROM account_partial_reconcile_custom p
+                     WHERE p.company_id = %(company_id)s
+                       AND p.max_date <= %(date)s
+            ),
+            open_items AS (
+                SELECT l.account_id, l.partner_id, l.currency_id,
+                       SIGN(l.balance) * (ABS(COALESCE(l.amount_currency, 0)) - COALESCE(SUM(m.amount_currency), 0)) AS amount_currency,
+                       SIGN(l.balance) * (ABS(l.balance) - COALESCE(SUM(m.amount), 0)) AS balance
+                  FROM account_move_line_custom l
+                  JOIN account_account_custom a ON a.id = l.account_id
+             LEFT JOIN matched m ON m.line_id = l.id
+                 WHERE l.company_id = %(company_id)s
+                   AND l.parent_state = 'posted'
+                   AND l.date <= %(date)s
+                   AND l.currency_id <> %(company_currency_id)s
+                   AND a.reconcile IS TRUE
+                   AND a.account_type <> 'asset_cash'
+              GROUP BY l.id
+                HAVING ABS(l.balance) <> COALESCE(SUM(m.amount), 0)
+            )
+                SELECT account_id, partner_id, currency_id, TRUE, SUM(amount_currency), SUM(balance)
+                  FROM cash_lines, history
+                 WHERE NOT is_opening OR history.start_date IS NULL OR date <= history.start_date
+              GROUP BY account_id, partner_id, currency_id
+             UNION ALL
+                SELECT account_id, partner_id, currency_id, FALSE, SUM(amount_currency), SUM(balance)
+                  FROM open_items
+              GROUP BY account_id, partner_id, currency_id
+        """, company_id=company.id, date=revaluation_date, company_currency_id=company.currency_id.id))
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _prepare_revaluation_move_vals(self, company, revaluation_date, journal, rate_cache=None):
+        """
+        Valeurs de l'ecriture de reevaluation : une ligne d'ajustement par
+        compte/partenaire/devise, contreparties agregees en 476/477 pour les
+        creances et dettes, en 666/766 pour la tresorerie.
+        Retourne False s'il n'y a rien a reevaluer.
+        """
+        rate_cache = rate_cache or CurrencyRateCache(self.env, company)
+        currency = company.currency_id
+        balances = self._get_revaluation_balances(company, revaluation_date)
+        rate_cache.prefetch(self.env['res.currency'].browse({row[2] for row in balances}))
+        accounts = self._get_revaluation_accounts(company)
+
+        line_vals_list = []
+        counterparts = dict.fromkeys(accounts, 0.0)
+        for account_id, partner_id, currency_id, is_cash, amount_currency, balance in balances:
+            foreign_currency = self.env['res.currency'].browse(currency_id)
+            difference = currency.round(
+                rate_cache.convert(amount_currency or 0.0, foreign_currency, revaluation_date) - balance
+            )
+            if currency.is_zero(difference):
+                continue
+            # Lignes en devise societe : exclues des reevaluations suivantes
+            line_vals_list.append({
+                'name': _('Reevaluation %s') % foreign_currency.name,
+                'account_id': account_id,
+                'partner_id': partner_id,
+                'currency_id': currency.id,
+                'debit': difference if difference > 0 else 0.0,
+                'credit': -difference if difference < 0 else 0.0,
+            })
+            if is_cash:
+                counterparts['gain' if difference > 0 else 'loss'] += difference
+            else:
+                counterparts['unrealized_gain' if difference > 0 else 'unrealized_loss'] += difference
+
+        if not line_vals_list:
+            return False
+        for role, amount in counterparts.items():
+            if currency.is_zero(amount):
+                continue
+            line_vals_list.append({
+                'name': accounts[role].name,
+                'account_id': accounts[role].id,
+                'currency_id': currency.id,
+                'debit': -amount if amount < 0 else 0.0,
+                'credit': amount if amount > 0 else 0.0,
+            })
+        return {
+            'move_type': 'entry',
+            'journal_id': journal.id,
+            'company_id': company.id,
+            'date': revaluation_date,
+            'ref': _('Reevaluation des devises au %s') % revaluation_date,
+            'line_ids': [(0, 0, vals) for vals in line_vals_list],
+        }
+
+    @api.model
+    def _create_currency_revaluation(self, company, revaluation_date, journal):
+        """
+        Reevaluer les soldes en devise a la date : une ecriture comptabilisee
+        pour toute la societe, extournee le lendemain et lettree avec son extourne.
+        Retourne l'ecriture de reevaluation (vide s'il n'y a rien a reevaluer).
+        """
+        move_vals = self._prepare_revaluation_move_vals(company, revaluation_date, journal)
+        if not move_vals:
+            return self.browse()
+        move = self.create(move_vals)
+        move.action_post()
+        move._reverse_moves(
+            date=revaluation_date + timedelta(days=1),
+            reason=_('extourne automatique'),
+            auto_post=True,
+            reconcile=True,
+        )
+        return move
 
     def action_register_payment(self):
         """Ouvrir wizard de paiement"""
@@ -287,6 +885,11 @@ class AccountMoveLine(models.Model):
     )
     move_name = fields.Char(related='move_id.name', store=True)
     date = fields.Date(related='move_id.date', store=True, index=True)
+    parent_state = fields.Selection(
+        related='move_id.state',
+        store=True,
+        string='Etat piece',
+    )
 
     name = fields.Char(string='Libelle')
     ref = fields.Char(string='Reference')
@@ -370,6 +973,29 @@ class AccountMoveLine(models.Model):
         'tag_id',
         string='Tags analytiques',
     )
+    analytic_distribution = fields.Json(
+        string='Repartition analytique',
+        compute='_compute_analytic_distribution',
+        store=True,
+        readonly=False,
+        copy=True,
+        help="Pourcentages par compte analytique ({id du compte: pourcentage}), "
+             "100 au plus par plan analytique",
+    )
+    analytic_line_ids = fields.One2many(
+        'account.analytic.line.custom',
+        'move_line_id',
+        string='Lignes analytiques',
+    )
+
+    # Achats
+    purchase_line_id = fields.Many2one(
+        'purchase.order.line',
+        string='Ligne de commande d achat',
+        index='btree_not_null',
+        copy=False,
+        help="Ligne de commande facturee : deduite des engagements budgetaires une fois comptabilisee",
+    )
 
     # Lettrage
     reconciled = fields.Boolean(
@@ -397,25 +1023,487 @@ class AccountMoveLine(models.Model):
         store=True,
         currency_field='company_currency_id',
     )
+    amount_residual_currency = fields.Monetary(
+        string='Residuel en devise',
+        compute='_compute_amount_residual',
+        store=True,
+        currency_field='currency_id',
+    )
+    is_open_item = fields.Boolean(
+        string='Non lettre',
+        compute='_compute_is_open_item',
+        store=True,
+        help="Ligne comptabilisee sur un compte lettrable, non lettree et avec un residuel",
+    )
 
     # Echeance
     date_maturity = fields.Date(string='Date echeance')
 
+    def init(self):
+        super().init()
+        # Index des requetes de grand livre, balance et lettrage
+        self.env.cr.execute(SQL("""
+            CREATE INDEX IF NOT EXISTS account_move_line_custom_account_date_posted_idx
+                ON account_move_line_custom (account_id, date)
+                INCLUDE (debit, credit, balance)
+             WHERE parent_state = 'posted'
+        """))
+        self.env.cr.execute(SQL("""
+            DROP INDEX IF EXISTS account_move_line_custom_partner_account_unreconciled_idx
+        """))
+        self.env.cr.execute(SQL("""
+            CREATE INDEX IF NOT EXISTS account_move_line_custom_open_item_idx
+                ON account_move_line_custom (partner_id, account_id)
+                INCLUDE (amount_residual, date_maturity)
+             WHERE is_open_item
+        """))
+        self.env.cr.execute(SQL("""
+            CREATE INDEX IF NOT EXISTS account_move_line_custom_journal_date_idx
+                ON account_move_line_custom (journal_id, date)
+        """))
+        self.env.cr.execute(SQL("""
+            CREATE INDEX IF NOT EXISTS account_move_line_custom_analytic_distribution_idx
+                ON account_move_line_custom USING gin (analytic_distribution)
+        """))
+
     @api.depends('debit', 'credit')
     def _compute_balance(self):
         for line in self:
             line.balance = line.debit - line.credit
 
+    @api.depends('analytic_account_id')
+    def _compute_analytic_distribution(self):
+        # Compte analytique unique : repartition a 100%, videe avec le compte
+        for line in self:
+            if line.analytic_account_id:
+                line.analytic_distribution = {str(line.analytic_account_id.id): 100.0}
+            else:
+                line.analytic_distribution = False
+
+    @api.constrains('analytic_distribution')
+    def _check_analytic_distribution(self):
+        distributions = [line.analytic_distribution for line in self if line.analytic_distribution]
+        account_ids = {int(account_id) for distribution in distributions for account_id in distribution}
+        accounts = self.env['account.analytic.account.custom'].browse(account_ids).exists()
+        plan_by_account = {account.id: account.plan_id for account in accounts}
+        for distribution in distributions:
+            total_by_plan = {}
+            for account_id, percentage in distribution.items():
+                if int(account_id) not in plan_by_account:
+                    raise ValidationError(_("Compte analytique inconnu dans la repartition: %s") % account_id)
+                if not isinstance(percentage, (int, float)) or percentage < 0:
+                    raise ValidationError(_("Pourcentage analytique invalide: %s") % percentage)
+                plan = plan_by_account[int(account_id)]
+                total_by_plan[plan] = total_by_plan.get(plan, 0.0) + percentage
+            for plan, total in total_by_plan.items():
+                if float_compare(total, 100.0, precision_digits=2) > 0:
+                    raise ValidationError(_(
+                        "La repartition sur le plan %s depasse 100%%."
+                    ) % (plan.name or _('sans plan')))
+
     @api.depends('full_reconcile_id')
     def _compute_reconciled(self):
         for line in self:
             line.reconciled = bool(line.full_reconcile_id)
 
-    @api.depends('debit', 'credit', 'matched_debit_ids', 'matched_credit_ids')
+    @api.depends('debit', 'credit', 'amount_currency')
     def _compute_amount_residual(self):
+        # Les lettrages partiels mettent a jour le residuel en SQL (_update_residual_from_partials)
         for line in self:
-            matched_amount = sum(line.matched_debit_ids.mapped('amount')) + sum(line.matched_credit_ids.mapped('amount'))
-            line.amount_residual = abs(line.balance) - matched_amount
+            partials = line.matched_debit_ids | line.matched_credit_ids
+            line.amount_residual = abs(line.balance) - sum(partials.mapped('amount'))
+            line.amount_residual_currency = abs(line.amount_currency) - sum(partials.mapped('amount_currency'))
+
+    @api.depends('parent_state', 'account_id.reconcile', 'reconciled', 'amount_residual')
+    def _compute_is_open_item(self):
+        for line in self:
+            line.is_open_item = (
+                line.parent_state == 'posted'
+                and line.account_id.reconcile
+                and not line.reconciled
+                and not line.company_currency_id.is_zero(line.amount_residual)
+            )
+
+    @api.model
+    def _get_open_items_domain(self, partner_ids=None, account_ids=None, company_id=None):
+        """Domaine des lignes non lettrees, servi par l'index partiel sur is_open_item"""
+        domain = [('is_open_item', '=', True)]
+        if partner_ids is not None:
+            domain.append(('partner_id', 'in', list(partner_ids)))
+        if account_ids is not None:
+            domain.append(('account_id', 'in', list(account_ids)))
+        if company_id:
+            domain.append(('company_id', '=', company_id))
+        return domain
+
+    @api.model
+    def _get_open_items(self, partner_ids=None, account_ids=None, company_id=None):
+        """
+        Lignes non lettrees par partenaire/compte, triees par echeance.
+        Le cout depend du nombre de lignes ouvertes, pas de la taille du grand livre.
+        """
+        return self.search(
+            self._get_open_items_domain(partner_ids, account_ids, company_id),
+            order='date_maturity, date, id',
+        )
+
+    def _update_residual_from_partials(self):
+        """
+        Recalculer en SQL le residuel des lignes a partir de leurs lettrages
+        partiels, puis celui de leurs pieces et leur statut de paiement.
+        """
+        if not self:
+            return
+        self.env['account.partial.reconcile.custom'].flush_model(
+            ['debit_move_id', 'credit_move_id', 'amount', 'amount_currency'])
+        self.flush_recordset([
+            'balance', 'amount_currency', 'amount_residual', 'amount_residual_currency',
+            'parent_state', 'reconciled', 'is_open_item',
+        ])
+        self.env.cr.execute(SQL("""
+            WITH matched AS (
+                SELECT l.id,
+                       COALESCE(SUM(p.amount), 0) AS amount,
+                       COALESCE(SUM(p.amount_currency), 0) AS amount_currency
+                  FROM account_move_line_custom l
+             LEFT JOIN account_partial_reconcile_custom p
+                    ON p.debit_move_id = l.id OR p.credit_move_id = l.id
+                 WHERE l.id = ANY(%s)
+              GROUP BY l.id
+            ),
+            residual AS (
+                SELECT l.id,
+                       ABS(l.balance) - matched.amount AS amount,
+                       ABS(COALESCE(l.amount_currency, 0)) - matched.amount_currency AS amount_currency
+                  FROM account_move_line_custom l
+                  JOIN matched ON matched.id = l.id
+            )
+            UPDATE account_move_line_custom l
+               SET amount_residual = residual.amount,
+                   amount_residual_currency = residual.amount_currency,
+                   is_open_item = (
+                       l.parent_state = 'posted'
+                       AND a.reconcile IS TRUE
+                       AND l.reconciled IS NOT TRUE
+                       AND ABS(residual.amount) >= cur.rounding / 2
+                   )
+              FROM residual, account_account_custom a, res_company comp, res_currency cur
+             WHERE l.id = residual.id
+               AND a.id = l.account_id
+               AND comp.id = l.company_id
+               AND cur.id = comp.currency_id
+         RETURNING l.move_id
+        """, self.ids))
+        move_ids = {move_id for move_id, in self.env.cr.fetchall()}
+        self.invalidate_recordset(['amount_residual', 'amount_residual_currency', 'is_open_item'])
+        self.env['account.move.custom'].browse(move_ids)._update_residual_from_lines()
+
+    def reconcile(self):
+        """
+        Lettrer les lignes entre elles.
+        Les lignes sont regroupees par compte et partenaire, puis les debits
+        sont imputes sur les credits par ordre d'echeance. Un lettrage
+        complet est cree pour chaque groupe entierement solde.
+        Retourne les lettrages partiels crees.
+        """
+        lines = self.filtered(lambda l: not l.reconciled)
+        return self._reconcile_groups(lines.grouped(lambda l: (l.account_id, l.partner_id)).values())
+
+    @api.model
+    def _reconcile_groups(self, groups):
+        """
+        Lettrer chaque groupe de lignes independamment (lignes d'un meme
+        compte et partenaire), en creant partiels et lettrages complets
+        en une fois pour tous les groupes.
+        Les groupes en devise etrangere sont imputes sur le residuel en devise;
+        les ecarts de change realises sont soldes par une seule ecriture
+        d'ecart par societe pour tout le lot.
+        """
+        Partial = self.env['account.partial.reconcile.custom']
+
+        def sort_key(line):
+            return (line.date_maturity or line.date or fields.Date.today(), line.id)
+
+        partial_vals_list = []
+        full_groups = []
+        exchange_groups = []
+        for group in groups:
+            account = group.account_id
+            if not account.reconcile:
+                raise UserError(_("Le compte %s n'est pas lettrable.") % account.display_name)
+            currency = group.company_id.currency_id[:1] or self.env.company.currency_id
+            foreign_currency = group[:1].currency_id
+            if foreign_currency == currency or any(line.currency_id != foreign_currency for line in group):
+                foreign_currency = None
+            # Imputation sur le residuel en devise si toutes les lignes partagent une devise etrangere
+            match_currency = foreign_currency or currency
+            match_index = 2 if foreign_currency else 1
+            debits = [[line, line.amount_residual, line.amount_residual_currency] for line in group.sorted(sort_key)
+                      if line.balance > 0 and not match_currency.is_zero(
+                          line.amount_residual_currency if foreign_currency else line.amount_residual)]
+            credits = [[line, line.amount_residual, line.amount_residual_currency] for line in group.sorted(sort_key)
+                       if line.balance < 0 and not match_currency.is_zero(
+                           line.amount_residual_currency if foreign_currency else line.amount_residual)]
+
+            group_partials = []
+            debit_index = credit_index = 0
+            while debit_index < len(debits) and credit_index < len(credits):
+                debit, credit = debits[debit_index], credits[credit_index]
+                partial_vals = {
+                    'debit_move_id': debit[0].id,
+                    'credit_move_id': credit[0].id,
+                    'company_id': debit[0].company_id.id,
+                    'company_currency_id': currency.id,
+                }
+                if foreign_currency:
+                    # Chaque ligne valorise la part imputee a son propre cours;
+                    # la difference reste en residuel societe (ecart de change)
+                    amount_currency = min(debit[2], credit[2])
+                    amount = min(
+                        debit[1] if amount_currency == debit[2]
+                        else currency.round(debit[1] * amount_currency / debit[2]),
+                        credit[1] if amount_currency == credit[2]
+                        else currency.round(credit[1] * amount_currency / credit[2]),
+                    )
+                    debit[2] -= amount_currency
+                    credit[2] -= amount_currency
+                    partial_vals.update(currency_id=foreign_currency.id, amount_currency=amount_currency)
+                else:
+                    amount = min(debit[1], credit[1])
+                partial_vals['amount'] = amount
+                group_partials.append(partial_vals)
+                debit[1] -= amount
+                credit[1] -= amount
+                if match_currency.is_zero(debit[match_index]):
+                    debit_index += 1
+                if match_currency.is_zero(credit[match_index]):
+                    credit_index += 1
+
+            fully_matched = all(match_currency.is_zero(item[match_index]) for item in debits + credits)
+            if group_partials and fully_matched:
+                full_groups.append((group, len(partial_vals_list), len(group_partials)))
+            partial_vals_list += group_partials
+
+            if foreign_currency:
+                # Lignes soldees en devise mais pas en devise societe
+                differences = [(line, residual) for line, residual, residual_currency in debits + credits
+                               if foreign_currency.is_zero(residual_currency) and not currency.is_zero(residual)]
+                if differences:
+                    exchange_groups.append((group, differences))
+
+        # Ecritures d'ecart creees avant les partiels, leurs partiels a la suite
+        exchange_lines_by_group = {}
+        exchange_move_by_company = {}
+        exchange_slices = {}
+        if exchange_groups:
+            exchange_moves, exchange_partials_by_group, exchange_lines_by_group = \
+                self._create_exchange_difference_moves(exchange_groups)
+            exchange_move_by_company = {move.company_id: move for move in exchange_moves}
+            for group, group_partials in exchange_partials_by_group.items():
+                exchange_slices[group] = (len(partial_vals_list), len(group_partials))
+                partial_vals_list += group_partials
+
+        partials = Partial.create(partial_vals_list)
+
+        # Lettrages complets : un numero reserve par groupe solde
+        if full_groups:
+            names = self.env['ir.sequence']._next_batch_by_code('account.reconcile.custom', len(full_groups))
+            full_vals_list = []
+            for (group, start, count), name in zip(full_groups, names):
+                exchange_lines = exchange_lines_by_group.get(group, self.browse())
+                exchange_start, exchange_count = exchange_slices.get(group, (0, 0))
+                full_vals_list.append({
+                    'name': name or 'NEW',
+                    'reconciled_line_ids': [(6, 0, (group | exchange_lines).ids)],
+                    'partial_reconcile_ids': [(6, 0, (
+                        partials[start:start + count]
+                        | partials[exchange_start:exchange_start + exchange_count]
+                        | group.matched_debit_ids | group.matched_credit_ids
+                    ).ids)],
+                    'exchange_move_id': exchange_move_by_company[group.company_id].id if exchange_lines else False,
+                })
+            fulls = self.env['account.full.reconcile.custom'].create(full_vals_list)
+            for (group, _start, _count), full in zip(full_groups, fulls):
+                (group | exchange_lines_by_group.get(group, self.browse())).full_reconcile_id = full
+
+        return partials
+
+    @api.model
+    def _create_exchange_difference_moves(self, exchange_groups):
+        """
+        Ecritures d'ecart de change realise : une ecriture par societe pour
+        tout le lot, avec par groupe une ligne par sens qui solde le residuel
+        societe des lignes deja soldees en devise (contrepartie 666/766).
+        exchange_groups : liste de (groupe, [(ligne, residuel societe)])
+        Retourne (ecritures, partiels d'ecart par groupe, lignes d'ecart par groupe)
+        """
+        Move = self.env['account.move.custom']
+        groups_by_company = {}
+        for group, differences in exchange_groups:
+            groups_by_company.setdefault(group.company_id, []).append((group, differences))
+
+        move_vals_list = []
+        targets_by_company = {}
+        for company, company_groups in groups_by_company.items():
+            currency = company.currency_id
+            accounts = Move._get_revaluation_accounts(company)
+            line_vals_list = []
+            targets = []
+            loss = gain = 0.0
+            for group, differences in company_groups:
+                for debit_side in (True, False):
+                    side = [(line, residual) for line, residual in differences if (line.balance > 0) == debit_side]
+                    if not side:
+                        continue
+                    amount = currency.round(sum(residual for dummy, residual in side))
+                    # Residuel restant au debit : perte; au credit : gain
+                    line_vals_list.append({
+                        'name': _('Ecart de change'),
+                        'account_id': group.account_id.id,
+                        'partner_id': side[0][0].partner_id.id,
+                        'currency_id': side[0][0].currency_id.id,
+                        'amount_currency': 0.0,
+                        'debit': 0.0 if debit_side else amount,
+                        'credit': amount if debit_side else 0.0,
+                    })
+                    targets.append((group, debit_side, side))
+                    if debit_side:
+                        loss += amount
+                    else:
+                        gain += amount
+            for role, amount in (('loss', loss), ('gain', gain)):
+                if not currency.is_zero(amount):
+                    line_vals_list.append({
+                        'name': accounts[role].name,
+                        'account_id': accounts[role].id,
+                        'currency_id': currency.id,
+                        'debit': amount if role == 'loss' else 0.0,
+                        'credit': amount if role == 'gain' else 0.0,
+                    })
+            move_vals_list.append({
+                'move_type': 'entry',
+                'journal_id': Move._get_exchange_journal(company).id,
+                'company_id': company.id,
+                'date': max(line.date for group, dummy in company_groups for line in group),
+                'ref': _('Ecarts de change'),
+                'line_ids': [(0, 0, vals) for vals in line_vals_list],
+            })
+            targets_by_company[company] = targets
+
+        moves = Move.create(move_vals_list)
+        moves.action_post()
+
+        partials_by_group = {}
+        lines_by_group = {}
+        for move in moves:
+            # Les lignes sont creees dans l'ordre des valeurs; les contreparties suivent
+            for exchange_line, (group, debit_side, side) in zip(
+                move.line_ids.sorted('id'), targets_by_company[move.company_id]
+            ):
+                lines_by_group[group] = lines_by_group.get(group, self.browse()) | exchange_line
+                partials_by_group.setdefault(group, []).extend({
+                    'debit_move_id': (line if debit_side else exchange_line).id,
+                    'credit_move_id': (exchange_line if debit_side else line).id,
+                    'amount': residual,
+                    'company_id': move.company_id.id,
+                    'company_currency_id': move.company_id.currency_id.id,
+                } for line, residual in side)
+        return moves, partials_by_group, lines_by_group
+
+    def _prepare_analytic_line_vals(self, account_by_id):
+        """
+        Valeurs des lignes analytiques de la ligne (montant positif au debit),
+        une par compte de la repartition. Les montants sont arrondis sur le
+        cumul de chaque plan pour que les parts d'un plan a 100% soldent la ligne.
+        """
+        self.ensure_one()
+        currency = self.company_currency_id
+        cumulated_by_plan = {}
+        vals_list = []
+        for account_id, percentage in self.analytic_distribution.items():
+            account = account_by_id[int(account_id)]
+            previous_percentage, previous_amount = cumulated_by_plan.get(account.plan_id, (0.0, 0.0))
+            cumulated_percentage = previous_percentage + percentage
+            cumulated_amount = currency.round(self.balance * cumulated_percentage / 100.0)
+            cumulated_by_plan[account.plan_id] = (cumulated_percentage, cumulated_amount)
+            vals_list.append({
+                'name': self.name or self.move_id.name,
+                'date': self.date,
+                'account_id': account.id,
+                'partner_id': self.partner_id.id,
+                'amount': cumulated_amount - previous_amount,
+                'currency_id': currency.id,
+                'unit_amount': self.quantity * percentage / 100.0,
+                'move_line_id': self.id,
+                'general_account_id': self.account_id.id,
+                'company_id': self.company_id.id,
+            })
+        return vals_list
+
+    def _create_analytic_lines(self):
+        """
+        Generer en une seule creation les lignes analytiques des lignes
+        comptabilisees qui n'en ont pas encore, d'apres leur repartition.
+        """
+        lines = self.filtered(
+            lambda l: l.parent_state == 'posted' and l.analytic_distribution and not l.analytic_line_ids
+        )
+        account_ids = {int(account_id) for line in lines for account_id in line.analytic_distribution}
+        accounts = self.env['account.analytic.account.custom'].browse(account_ids)
+        account_by_id = {account.id: account for account in accounts}
+        vals_list = [vals for line in lines for vals in line._prepare_analytic_line_vals(account_by_id)]
+        return self.env['account.analytic.line.custom'].create(vals_list)
+
+    def _get_budget_amounts(self):
+        """Montants des lignes imputes sur les lignes de budget valides : {piece: {ligne de budget: montant}}"""
+        lines = self.filtered(lambda l: l.account_id)
+        analytic_account_ids = {
+            int(account_id) for line in lines for account_id in (line.analytic_distribution or {})
+        }
+        return self.env['account.budget.line.custom']._dispatch_budget_amounts(
+            [(line.move_id, line.date, line.account_id.id, line.analytic_distribution, line.balance) for line in lines],
+            set(lines.account_id.ids),
+            analytic_account_ids,
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        move_ids = {vals['move_id'] for vals in vals_list if vals.get('move_id')}
+        self.env['account.move.custom'].browse(move_ids)._check_not_hashed()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if HASHED_LINE_FIELDS.intersection(vals):
+            self.move_id._check_not_hashed()
+            if vals.get('move_id'):
+                self.env['account.move.custom'].browse(vals['move_id'])._check_not_hashed()
+        return super().write(vals)
+
+    @api.ondelete(at_uninstall=False)
+    def _unlink_except_hashed(self):
+        self.move_id._check_not_hashed()
+
+    def _prepare_reverse_line_vals(self):
+        """Valeurs de la ligne inverse (debit et credit permutes)"""
+        self.ensure_one()
+        return {
+            'name': self.name,
+            'ref': self.ref,
+            'account_id': self.account_id.id,
+            'partner_id': self.partner_id.id,
+            'currency_id': self.currency_id.id,
+            'debit': self.credit,
+            'credit': self.debit,
+            'amount_currency': -self.amount_currency,
+            'quantity': self.quantity,
+            'product_id': self.product_id.id,
+            'tax_ids': [(6, 0, self.tax_ids.ids)],
+            'tax_line_id': self.tax_line_id.id,
+            'analytic_account_id': self.analytic_account_id.id,
+            'analytic_distribution': self.analytic_distribution,
+            'analytic_tag_ids': [(6, 0, self.analytic_tag_ids.ids)],
+            'date_maturity': self.date_maturity,
+        }
 
     @api.onchange('account_id')
     def _onchange_account_id(self):
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+# Colonnes recopiees de account_move_line_custom vers l'archive
+ARCHIVED_LINE_COLUMNS = (
+    'id', 'move_id', 'move_name', 'date', 'account_id', 'partner_id', 'journal_id',
+    'company_id', 'currency_id', 'name', 'ref', 'debit', 'credit', 'balance',
+    'amount_currency', 'date_maturity', 'parent_state', 'analytic_account_id',
+)
+
+
+class AccountMoveLineArchive(models.Model):
+    """
+    Lignes d'ecriture archivees
+    Table partitionnee par exercice fiscal (une partition par exercice archive),
+    alimentee par l'archivage des exercices clotures.
+    """
+    _name = 'account.move.line.archive.custom'
+    _description = 'Ligne d ecriture archivee'
+    _auto = False
+    _order = 'date desc, move_name desc, id'
+
+    fiscal_year_id = fields.Many2one(
+        'account.fiscal.year.custom',
+        string='Exercice fiscal',
+        readonly=True,
+    )
+    move_id = fields.Many2one(
+        'account.move.custom',
+        string='Piece',
+        readonly=True,
+    )
+    move_name = fields.Char(string='Numero', readonly=True)
+    date = fields.Date(string='Date', readonly=True)
+
+    account_id = fields.Many2one('account.account.custom', string='Compte', readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Partenaire', readonly=True)
+    journal_id = fields.Many2one('account.journal.custom', string='Journal', readonly=True)
+    company_id = fields.Many2one('res.company', string='Societe', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Devise', readonly=True)
+    company_currency_id = fields.Many2one(related='company_id.currency_id')
+    analytic_account_id = fields.Many2one(
+        'account.analytic.account.custom',
+        string='Compte analytique',
+        readonly=True,
+    )
+
+    name = fields.Char(string='Libelle', readonly=True)
+    ref = fields.Char(string='Reference', readonly=True)
+
+    debit = fields.Monetary(string='Debit', readonly=True, currency_field='company_currency_id')
+    credit = fields.Monetary(string='Credit', readonly=True, currency_field='company_currency_id')
+    balance = fields.Monetary(string='Solde', readonly=True, currency_field='company_currency_id')
+    amount_currency = fields.Monetary(string='Montant devise', readonly=True, currency_field='currency_id')
+
+    date_maturity = fields.Date(string='Date echeance', readonly=True)
+    parent_state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('posted', 'Comptabilise'),
+        ('cancel', 'Annule'),
+    ], string='Etat piece', readonly=True)
+    reconcile_name = fields.Char(
+        string='Lettrage',
+        readonly=True,
+        help="Numero du lettrage complet au moment de l'archivage",
+    )
+
+    def init(self):
+        # Table mere partitionnee; les index sont propages a chaque partition
+        self.env.cr.execute(SQL("""
+            CREATE TABLE IF NOT EXISTS account_move_line_archive_custom (
+                id integer NOT NULL,
+                fiscal_year_id integer NOT NULL,
+                move_id integer,
+                move_name varchar,
+                date date,
+                account_id integer,
+                partner_id integer,
+                journal_id integer,
+                company_id integer,
+                currency_id integer,
+                name varchar,
+                ref varchar,
+                debit numeric,
+                credit numeric,
+                balance numeric,
+                amount_currency numeric,
+                date_maturity date,
+                parent_state varchar,
+                analytic_account_id integer,
+                reconcile_name varchar,
+                PRIMARY KEY (fiscal_year_id, id)
+            ) PARTITION BY LIST (fiscal_year_id)
+        """))
+        self.env.cr.execute(SQL("""
+            CREATE INDEX IF NOT EXISTS account_move_line_archive_custom_account_date_idx
+                ON account_move_line_archive_custom (account_id, date)
+        """))
+        self.env.cr.execute(SQL("""
+            CREATE INDEX IF NOT EXISTS account_move_line_archive_custom_move_idx
+                ON account_move_line_archive_custom (move_id)
+        """))
+
+    @api.model
+    def _create_partition(self, fiscal_year):
+        """Creer la partition d'un exercice"""
+        self.env.cr.execute(SQL(
+            "CREATE TABLE IF NOT EXISTS %s PARTITION OF account_move_line_archive_custom FOR VALUES IN (%s)",
+            SQL.identifier('account_move_line_archive_custom_fy%s' % fiscal_year.id),
+            fiscal_year.id,
+        ))
+
+    @api.model
+    def _archive_fiscal_year(self, fiscal_year):
+        """
+        Deplacer les lignes d'un exercice cloture vers sa partition d'archive.
+        Les lettrages internes a l'exercice sont supprimes avant les lignes;
+        les pieces restent en place avec l'indicateur lines_archived.
+        """
+        cr = self.env.cr
+        self.env.flush_all()
+
+        # Un lettrage entre cet exercice et un autre empecherait de conserver
+        # des residuels coherents dans l'exercice encore actif
+        cr.execute(SQL("""
+            SELECT COUNT(*)
+              FROM account_partial_reconcile_custom p
+              JOIN account_move_line_custom d ON d.id = p.debit_move_id
+              JOIN account_move_custom dm ON dm.id = d.move_id
+              JOIN account_move_line_custom c ON c.id = p.credit_move_id
+              JOIN account_move_custom cm ON cm.id = c.move_id
+             WHERE (dm.fiscal_year_id IS NOT DISTINCT FROM %(fy)s) <> (cm.fiscal_year_id IS NOT DISTINCT FROM %(fy)s)
+        """, fy=fiscal_year.id))
+        [cross_year_count] = cr.fetchone()
+        if cross_year_count:
+            raise UserError(_(
+                "%d lettrages relient l'exercice %s a un autre exercice. "
+                "Delettrez-les avant d'archiver."
+            ) % (cross_year_count, fiscal_year.name))
+
+        self._create_partition(fiscal_year)
+
+        columns = SQL(', ').join(SQL.identifier(column) for column in ARCHIVED_LINE_COLUMNS)
+        line_columns = SQL(', ').join(SQL.identifier('l', column) for column in ARCHIVED_LINE_COLUMNS)
+        cr.execute(SQL("""
+            INSERT INTO account_move_line_archive_custom (%(columns)s, fiscal_year_id, reconcile_name)
+            SELECT %(line_columns)s, m.fiscal_year_id, fr.name
+              FROM account_move_line_custom l
+              JOIN account_move_custom m ON m.id = l.move_id
+         LEFT JOIN account_full_reconcile_custom fr ON fr.id = l.full_reconcile_id
+             WHERE m.fiscal_year_id = %(fy)s
+        """, columns=columns, line_columns=line_columns, fy=fiscal_year.id))
+        archived_count = cr.rowcount
+
+        cr.execute(SQL("""
+            SELECT DISTINCT l.full_reconcile_id
+              FROM account_move_line_custom l
+              JOIN account_move_custom m ON m.id = l.move_id
+             WHERE m.fiscal_year_id = %s
+               AND l.full_reconcile_id IS NOT NULL
+        """, fiscal_year.id))
+        full_reconcile_ids = [row[0] for row in cr.fetchall()]
+
+        cr.execute(SQL("""
+            DELETE FROM account_partial_reconcile_custom p
+             USING account_move_line_custom l, account_move_custom m
+             WHERE p.debit_move_id = l.id
+               AND m.id = l.move_id
+               AND m.fiscal_year_id = %s
+        """, fiscal_year.id))
+        cr.execute(SQL("""
+            DELETE FROM account_move_line_custom l
+             USING account_move_custom m
+             WHERE m.id = l.move_id
+               AND m.fiscal_year_id = %s
+        """, fiscal_year.id))
+        if full_reconcile_ids:
+            cr.execute(SQL(
+                "DELETE FROM account_full_reconcile_custom WHERE id = ANY(%s)",
+                full_reconcile_ids,
+            ))
+        cr.execute(SQL(
+            "UPDATE account_move_custom SET lines_archived = TRUE WHERE fiscal_year_id = %s",
+            fiscal_year.id,
+        ))
+
+        self.env.invalidate_all()
+        return archived_count
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+
+RECURRING_PERIOD_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'yearly': 12,
+}
+
+
+class AccountMoveRecurring(models.Model):
+    """
+    Modele d'Ecriture Recurrente
+    Loyers, dotations, provisions... generes a chaque periode par le planificateur
+    """
+    _name = 'account.move.recurring.custom'
+    _description = 'Modele d ecriture recurrente'
+    _inherit = ['mail.thread']
+    _order = 'next_date, id'
+
+    name = fields.Char(string='Nom', required=True, tracking=True)
+    active = fields.Boolean(default=True)
+    company_id = fields.Many2one(
+        'res.company',
+        string='Societe',
+        required=True,
+        default=lambda self: self.env.company,
+    )
+    journal_id = fields.Many2one(
+        'account.journal.custom',
+        string='Journal',
+        required=True,
+        domain="[('company_id', '=', company_id)]",
+    )
+    partner_id = fields.Many2one('res.partner', string='Partenaire')
+    ref = fields.Char(string='Reference')
+
+    line_ids = fields.One2many(
+        'account.move.recurring.line.custom',
+        'recurring_id',
+        string='Lignes',
+        copy=True,
+    )
+
+    # Planification
+    recurring_period = fields.Selection([
+        ('monthly', 'Mensuelle'),
+        ('quarterly', 'Trimestrielle'),
+        ('yearly', 'Annuelle'),
+    ], string='Periodicite', required=True, default='monthly', tracking=True)
+    date_start = fields.Date(
+        string='Premiere echeance',
+        required=True,
+        default=fields.Date.context_today,
+        help="Date de la premiere ecriture; le jour est repris pour les suivantes",
+    )
+    date_end = fields.Date(string='Derniere echeance')
+    generated_count = fields.Integer(
+        string='Ecritures generees',
+        readonly=True,
+        copy=False,
+    )
+    next_date = fields.Date(
+        string='Prochaine echeance',
+        compute='_compute_next_date',
+        store=True,
+        index=True,
+    )
+
+    auto_post = fields.Boolean(string='Comptabiliser automatiquement', default=True)
+    auto_reverse = fields.Boolean(
+        string='Extourner au 1er de la periode suivante',
+        help="Pour les ecritures de provision (charges a payer, produits a recevoir)",
+    )
+
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('running', 'En cours'),
+        ('done', 'Termine'),
+    ], string='Etat', default='draft', tracking=True)
+
+    move_ids = fields.One2many(
+        'account.move.custom',
+        'recurring_template_id',
+        string='Ecritures generees',
+    )
+
+    @api.depends('date_start', 'recurring_period', 'generated_count')
+    def _compute_next_date(self):
+        for template in self:
+            template.next_date = template._get_occurrence_date(template.generated_count)
+
+    @api.constrains('line_ids')
+    def _check_balanced(self):
+        for template in self:
+            debit = sum(template.line_ids.mapped('debit'))
+            credit = sum(template.line_ids.mapped('credit'))
+            if template.company_id.currency_id.compare_amounts(debit, credit):
+                raise ValidationError(_("Le modele %s n'est pas equilibre.") % template.name)
+
+    def _get_occurrence_date(self, index):
+        """Date de la n-ieme ecriture (calculee depuis la premiere pour eviter la derive des jours)"""
+        self.ensure_one()
+        if not self.date_start:
+            return False
+        return self.date_start + relativedelta(months=index * RECURRING_PERIOD_MONTHS[self.recurring_period])
+
+    def action_start(self):
+        for template in self:
+            if not template.line_ids:
+                raise UserError(_("Le modele %s n'a pas de lignes.") % template.name)
+        self.write({'state': 'running'})
+        return True
+
+    def action_stop(self):
+        self.write({'state': 'done'})
+        return True
+
+    def action_draft(self):
+        self.write({'state': 'draft'})
+        return True
+
+    def action_generate(self):
+        """Generer les ecritures echues jusqu'a aujourd'hui"""
+        self._generate_entries(fields.Date.context_today(self))
+        return True
+
+    @api.model
+    def _cron_generate_entries(self):
+        """Planificateur : generer toutes les ecritures recurrentes echues"""
+        templates = self.search([
+            ('state', '=', 'running'),
+            ('next_date', '<=', fields.Date.context_today(self)),
+        ])
+        templates._generate_entries(fields.Date.context_today(self))
+
+    def _generate_entries(self, date_to):
+        """
+        Generer en une fois les ecritures echues jusqu'a date_to.
+        Les periodes deja generees sont ignorees (index unique modele/periode),
+        ce qui rend une relance sans effet.
+        Retourne les ecritures creees.
+        """
+        Move = self.env['account.move.custom']
+        templates = self.filtered(lambda t: t.state == 'running' and t.next_date and t.next_date <= date_to)
+        if not templates:
+            return Move
+
+        existing = templates._get_generated_periods()
+        move_vals_list = []
+        template_ids_by_count = {}
+        for template in templates:
+            count = template.generated_count
+            entry_date = template._get_occurrence_date(count)
+            while entry_date <= date_to and (not template.date_end or entry_date <= template.date_end):
+                period = entry_date.replace(day=1)
+                if (template.id, period) not in existing:
+                    move_vals_list.append(template._prepare_move_vals(entry_date, period))
+                count += 1
+                entry_date = template._get_occurrence_date(count)
+            template_ids_by_count.setdefault(count, []).append(template.id)
+        # Une ecriture par nombre d'occurrences plutot qu'une par modele
+        for count, template_ids in template_ids_by_count.items():
+            self.browse(template_ids).write({'generated_count': count})
+
+        moves = Move.create(move_vals_list)
+        moves.filtered(lambda m: m.recurring_template_id.auto_post).action_post()
+
+        # Extournes au premier jour de la periode suivante, groupees par date
+        to_reverse = moves.filtered(lambda m: m.state == 'posted' and m.recurring_template_id.auto_reverse)
+        for reversal_date, reversed_moves in to_reverse.grouped(
+            lambda m: m.date.replace(day=1) + relativedelta(
+                months=RECURRING_PERIOD_MONTHS[m.recurring_template_id.recurring_period])
+        ).items():
+            reversed_moves._reverse_moves(date=reversal_date, auto_post=True, reconcile=True)
+
+        templates.filtered(lambda t: t.date_end and t.next_date > t.date_end).write({'state': 'done'})
+        return moves
+
+    def _get_generated_periods(self):
+        """Couples (modele, periode) deja generes, en une requete"""
+        self.env['account.move.custom'].flush_model(['recurring_template_id', 'recurring_period'])
+        self.env.cr.execute(SQL("""
+            SELECT recurring_template_id, recurring_period
+              FROM account_move_custom
+             WHERE recurring_template_id = ANY(%s)
+        """, self.ids))
+        return set(self.env.cr.fetchall())
+
+    def _prepare_move_vals(self, entry_date, period):
+        """Valeurs de l'ecriture de la periode"""
+        self.ensure_one()
+        return {
+            'move_type': 'entry',
+            'journal_id': self.journal_id.id,
+            'company_id': self.company_id.id,
+            'partner_id': self.partner_id.id,
+            'date': entry_date,
+            'ref': self.ref or self.name,
+            'recurring_template_id': self.id,
+            'recurring_period': period,
+            'line_ids': [(0, 0, line._prepare_move_line_vals()) for line in self.line_ids],
+        }
+
+
+class AccountMoveRecurringLine(models.Model):
+    """
+    Ligne de Modele d'Ecriture Recurrente
+    """
+    _name = 'account.move.recurring.line.custom'
+    _description = 'Ligne de modele d ecriture recurrente'
+    _order = 'sequence, id'
+
+    recurring_id = fields.Many2one(
+        'account.move.recurring.custom',
+        string='Modele',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    sequence = fields.Integer(default=10)
+    name = fields.Char(string='Libelle')
+    account_id = fields.Many2one(
+        'account.account.custom',
+        string='Compte',
+        required=True,
+    )
+    partner_id = fields.Many2one('res.partner', string='Partenaire')
+    analytic_account_id = fields.Many2one(
+        'account.analytic.account.custom',
+        string='Compte analytique',
+    )
+    company_currency_id = fields.Many2one(related='recurring_id.company_id.currency_id')
+    debit = fields.Monetary(string='Debit', currency_field='company_currency_id')
+    credit = fields.Monetary(string='Credit', currency_field='company_currency_id')
+
+    def _prepare_move_line_vals(self):
+        self.ensure_one()
+        return {
+            'name': self.name or self.recurring_id.name,
+            'account_id': self.account_id.id,
+            'partner_id': (self.partner_id or self.recurring_id.partner_id).id,
+            'analytic_account_id': self.analytic_account_id.id,
+            'debit': self.debit,
+            'credit': self.credit,
+        }
@@ -81,6 +81,39 @@ class AccountPayment(models.Model):
         ('cash', 'Especes'),
     ], string='Methode de paiement', default='manual')
 
+    # Compte bancaire du partenaire (virements SEPA)
+    partner_bank_id = fields.Many2one(
+        'res.partner.bank',
+        string='Compte bancaire du partenaire',
+        compute='_compute_partner_bank_id',
+        store=True,
+        readonly=False,
+        domain="[('partner_id', '=', partner_id)]",
+    )
+
+    # Mandat de prelevement SEPA
+    sepa_mandate_id = fields.Many2one(
+        'account.sepa.mandate.custom',
+        string='Mandat SEPA',
+        index='btree_not_null',
+        domain="[('partner_id', '=', partner_id), ('state', '=', 'active')]",
+    )
+    sepa_sequence_type = fields.Selection([
+        ('FRST', 'Premier (FRST)'),
+        ('RCUR', 'Recurrent (RCUR)'),
+    ], string='Sequence SEPA', readonly=True, copy=False,
+        help="Fixee a la premiere generation du fichier de prelevement et reprise a chaque regeneration",
+    )
+
+    # Lot de paiements
+    batch_payment_id = fields.Many2one(
+        'account.batch.payment.custom',
+        string='Lot de paiements',
+        copy=False,
+        index='btree_not_null',
+        ondelete='set null',
+    )
+
     # Reference
     ref = fields.Char(string='Reference/Memo')
     communication = fields.Char(string='Communication')
@@ -117,55 +150,105 @@ class AccountPayment(models.Model):
         compute='_compute_destination_account',
     )
 
-    @api.depends('partner_id', 'payment_type', 'partner_type')
+    @api.depends('partner_id', 'payment_type', 'partner_type', 'company_id')
     def _compute_destination_account(self):
+        Account = self.env['account.account.custom']
+        for company, payments in self.grouped('company_id').items():
+            receivable_id, payable_id = Account._get_partner_default_account_ids(company.id)
+            for payment in payments.with_company(company):
+                if payment.partner_type == 'customer':
+                    # Compte client
+                    account = payment.partner_id.property_account_receivable_id or Account.browse(receivable_id)
+                else:
+                    # Compte fournisseur
+                    account = payment.partner_id.property_account_payable_id or Account.browse(payable_id)
+                payment.destination_account_id = account
+
+    @api.depends('partner_id')
+    def _compute_partner_bank_id(self):
         for payment in self:
-            if payment.partner_type == 'customer':
-                # Compte client
-                payment.destination_account_id = self.env['account.account.custom'].search([
-                    ('account_type', '=', 'asset_receivable'),
-                    ('company_id', '=', payment.company_id.id),
-                ], limit=1)
-            else:
-                # Compte fournisseur
-                payment.destination_account_id = self.env['account.account.custom'].search([
-                    ('account_type', '=', 'liability_payable'),
-                    ('company_id', '=', payment.company_id.id),
-                ], limit=1)
+            payment.partner_bank_id = payment.partner_id.bank_ids[:1]
 
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('name', '/') == '/':
-                vals['name'] = self.env['ir.sequence'].next_by_code('account.payment.custom') or '/'
+        to_name = [vals for vals in vals_list if vals.get('name', '/') == '/']
+        names = self.env['ir.sequence']._next_batch_by_code('account.payment.custom', len(to_name))
+        for vals, name in zip(to_name, names):
+            vals['name'] = name or '/'
         return super().create(vals_list)
 
     def action_post(self):
-        """Valider le paiement"""
-        for payment in self:
-            if payment.state != 'draft':
-                raise UserError(_("Seuls les paiements en brouillon peuvent etre valides."))
-            if payment.amount <= 0:
-                raise UserError(_("Le montant doit etre positif."))
+        """Valider les paiements"""
+        self._check_can_post()
 
-            # Creer l'ecriture comptable
-            move_vals = payment._prepare_move_vals()
-            move = self.env['account.move.custom'].create(move_vals)
-            move.action_post()
+        # Creer toutes les ecritures en une seule fois
+        moves = self.env['account.move.custom'].create([
+            payment._prepare_move_vals() for payment in self
+        ])
+        moves.action_post()
 
-            payment.write({
-                'state': 'posted',
-                'move_id': move.id,
-            })
+        for payment, move in zip(self, moves):
+            payment.move_id = move
+        self.write({'state': 'posted'})
 
-            # Lettrer avec les factures si applicable
-            if payment.move_ids:
-                payment._reconcile_invoices()
+        # Lettrer avec les factures si applicable
+        self.filtered('move_ids')._reconcile_invoices()
 
         return True
 
-    def _prepare_move_vals(self):
-        """Preparer les valeurs de l'ecriture comptable"""
+    def _post_grouped(self, date=None, ref=None):
+        """
+        Valider les paiements avec une seule ecriture : une ligne de
+        contrepartie par paiement et une seule ligne de tresorerie.
+        """
+        self._check_can_post()
+        journal = self.journal_id
+        if len(journal) != 1:
+            raise UserError(_("Les paiements regroupes doivent utiliser le meme journal."))
+
+        line_vals = []
+        liquidity_balance = 0.0
+        for payment in self:
+            liquidity_vals, counterpart_vals = payment._prepare_move_line_vals()
+            line_vals.append(counterpart_vals)
+            liquidity_balance += liquidity_vals['debit'] - liquidity_vals['credit']
+
+        label = ref or _("Paiements regroupes")
+        line_vals.append({
+            'name': label,
+            'account_id': journal.default_account_id.id,
+            'debit': liquidity_balance if liquidity_balance > 0 else 0.0,
+            'credit': -liquidity_balance if liquidity_balance < 0 else 0.0,
+        })
+
+        move = self.env['account.move.custom'].create({
+            'date': date or max(self.mapped('date')),
+            'journal_id': journal.id,
+            'ref': label,
+            'move_type': 'entry',
+            'line_ids': [(0, 0, vals) for vals in line_vals],
+        })
+        move.action_post()
+
+        self.write({
+            'state': 'posted',
+            'move_id': move.id,
+        })
+
+        self.filtered('move_ids')._reconcile_invoices()
+
+        return move
+
+    def _check_can_post(self):
+        """Verifier que les paiements peuvent etre valides"""
+        for payment in self:
+            if payment.state != 'draft':
+                raise UserError(_("Seuls les paiements en brouillon peuvent etre valides."))
+            if payment.amount <= 0:
+                raise UserError(_("Le montant doit etre positif."))
+
+    def _prepare_move_line_vals(self):
+        """Preparer les lignes de tresorerie et de contrepartie du paiement"""
         self.ensure_one()
 
         # Compte banque/caisse
@@ -173,17 +256,34 @@ class AccountPayment(models.Model):
         if not liquidity_account:
             raise UserError(_("Veuillez configurer un compte par defaut sur le journal %s") % self.journal_id.name)
 
+        liquidity_vals = {
+            'name': self.communication or self.name,
+            'account_id': liquidity_account.id,
+            'partner_id': self.partner_id.id,
+            'debit': 0,
+            'credit': 0,
+        }
+        counterpart_vals = dict(liquidity_vals, account_id=self.destination_account_id.id)
+
         # Sens de l'ecriture
         if self.payment_type == 'inbound':
-            debit_account = liquidity_account
-            credit_account = self.destination_account_id
-            debit_amount = self.amount
-            credit_amount = self.amount
+            liquidity_vals['debit'] = self.amount
+            counterpart_vals['credit'] = self.amount
         else:
-            debit_account = self.destination_account_id
-            credit_account = liquidity_account
-            debit_amount = self.amount
-            credit_amount = self.amount
+            counterpart_vals['debit'] = self.amount
+            liquidity_vals['credit'] = self.amount
+
+        return liquidity_vals, counterpart_vals
+
+    def _prepare_move_vals(self):
+        """Preparer les valeurs de l'ecriture comptable"""
+        self.ensure_one()
+
+        liquidity_vals, counterpart_vals = self._prepare_move_line_vals()
+        if self.payment_type == 'inbound':
+            line_vals = [liquidity_vals, counterpart_vals]
+        else:
+            line_vals = [counterpart_vals, liquidity_vals]
 
         return {
             'date': self.date,
@@ -191,30 +291,21 @@ class AccountPayment(models.Model):
             'ref': self.ref or self.name,
             'partner_id': self.partner_id.id,
             'move_type': 'entry',
-            'line_ids': [
-                (0, 0, {
-                    'name': self.communication or self.name,
-                    'account_id': debit_account.id,
-                    'partner_id': self.partner_id.id,
-                    'debit': debit_amount,
-                    'credit': 0,
-                }),
-                (0, 0, {
-                    'name': self.communication or self.name,
-                    'account_id': credit_account.id,
-                    'partner_id': self.partner_id.id,
-                    'debit': 0,
-                    'credit': credit_amount,
-                }),
-            ],
+            'line_ids': [(0, 0, vals) for vals in line_vals],
         }
 
     def _reconcile_invoices(self):
-        """Lettrer le paiement avec les factures"""
-        self.ensure_one()
-        # Implementation simplifiee du lettrage
-        # A completer selon les besoins
-        pass
+        """Lettrer les paiements avec leurs factures, en un seul lettrage groupe"""
+        lines = self.env['account.move.line.custom']
+        for payment in self:
+            account = payment.destination_account_id
+            lines |= payment.move_id.line_ids.filtered(
+                lambda l: l.account_id == account and l.partner_id == payment.partner_id
+            )
+            lines |= payment.move_ids.line_ids.filtered(
+                lambda l: l.account_id == account and not l.reconciled and l.parent_state == 'posted'
+            )
+        lines.filtered(lambda l: l.account_id.reconcile).reconcile()
 
     def action_cancel(self):
         """Annuler le paiement"""
@@ -104,14 +104,27 @@ class AccountPartialReconcile(models.Model):
                 partial.credit_move_id.date or fields.Date.today()
             )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        partials = super().create(vals_list)
+        (partials.debit_move_id | partials.credit_move_id)._update_residual_from_partials()
+        return partials
+
     def unlink(self):
         """Supprimer le lettrage"""
-        full_reconciles = self.mapped('full_reconcile_id')
+        full_reconciles = self.full_reconcile_id
+        lines = self.debit_move_id | self.credit_move_id
         res = super().unlink()
-        # Supprimer les lettrages complets vides
-        for full in full_reconciles:
-            if not full.partial_reconcile_ids:
-                full.unlink()
+        # Un lettrage complet ampute d'un partiel n'est plus complet : le defaire
+        # avant de recalculer residuels et statut des lignes
+        if full_reconciles:
+            fully_reconciled_lines = self.env['account.move.line.custom'].search([
+                ('full_reconcile_id', 'in', full_reconciles.ids),
+            ])
+            fully_reconciled_lines.write({'full_reconcile_id': False})
+            full_reconciles.unlink()
+            lines |= fully_reconciled_lines
+        lines.exists()._update_residual_from_partials()
         return res
 
 
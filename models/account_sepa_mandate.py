@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+
+
+class AccountSepaMandate(models.Model):
+    """
+    Mandat de Prelevement SEPA
+    """
+    _name = 'account.sepa.mandate.custom'
+    _description = 'Mandat de prelevement SEPA'
+    _inherit = ['mail.thread']
+    _order = 'signature_date desc, id desc'
+
+    name = fields.Char(
+        string='Reference unique (RUM)',
+        required=True,
+        copy=False,
+        tracking=True,
+    )
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Debiteur',
+        required=True,
+        index=True,
+        tracking=True,
+    )
+    partner_bank_id = fields.Many2one(
+        'res.partner.bank',
+        string='Compte bancaire',
+        required=True,
+        domain="[('partner_id', '=', partner_id)]",
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Societe',
+        required=True,
+        default=lambda self: self.env.company,
+    )
+
+    signature_date = fields.Date(
+        string='Date de signature',
+        required=True,
+        default=fields.Date.context_today,
+    )
+    scheme = fields.Selection([
+        ('CORE', 'CORE (particuliers)'),
+        ('B2B', 'B2B (entreprises)'),
+    ], string='Schema', required=True, default='CORE')
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('active', 'Actif'),
+        ('revoked', 'Revoque'),
+    ], string='Etat', default='draft', tracking=True)
+
+    last_collection_date = fields.Date(
+        string='Dernier prelevement',
+        readonly=True,
+        copy=False,
+        help="Vide tant qu'aucun prelevement n'a ete remis (sequence FRST)",
+    )
+
+    payment_ids = fields.One2many(
+        'account.payment.custom',
+        'sepa_mandate_id',
+        string='Prelevements',
+    )
+
+    _sql_constraints = [
+        ('name_company_uniq', 'unique(name, company_id)',
+         'La reference du mandat doit etre unique par societe!'),
+    ]
+
+    def action_activate(self):
+        for mandate in self:
+            if not mandate.partner_bank_id:
+                raise UserError(_("Le mandat %s n'a pas de compte bancaire.") % mandate.name)
+        self.write({'state': 'active'})
+        return True
+
+    def action_revoke(self):
+        self.write({'state': 'revoked'})
+        return True
+
+    def action_draft(self):
+        self.write({'state': 'draft'})
+        return True
+
+    def _get_sequence_type(self):
+        """Type de sequence SEPA du prochain prelevement remis sur le mandat"""
+        self.ensure_one()
+        return 'RCUR' if self.last_collection_date else 'FRST'
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, models
+from odoo.tools import SQL
+
+
+class IrSequence(models.Model):
+    """
+    Extension Sequence pour la numerotation en lot
+    """
+    _inherit = 'ir.sequence'
+
+    @api.model
+    def _next_batch_by_code(self, code, count):
+        """Equivalent de next_by_code pour `count` numeros"""
+        company_id = self.env.company.id
+        sequence = self.sudo().search([
+            ('code', '=', code),
+            ('company_id', 'in', [company_id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            return [False] * count
+        return sequence._next_batch(count)
+
+    def _next_batch(self, count):
+        """
+        Reserver `count` numeros consecutifs en une seule requete.
+        Les sequences sans trou ou par plage de dates gardent la
+        numerotation unitaire standard.
+        """
+        self.ensure_one()
+        if count <= 0:
+            return []
+        if self.implementation != 'standard' or self.use_date_range:
+            return [self.next_by_id() for _i in range(count)]
+
+        self.env.cr.execute(SQL(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            'ir_sequence_%03d' % self.id, count,
+        ))
+        return [self.get_next_char(number) for number, in self.env.cr.fetchall()]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+
+
+class PurchaseOrder(models.Model):
+    """
+    Commande d'Achat
+    Controle budgetaire a la confirmation
+    """
+    _inherit = 'purchase.order'
+
+    def button_confirm(self):
+        BudgetLine = self.env['account.budget.line.custom']
+        budget_amounts_by_order = self.order_line._get_budget_amounts()
+        budget_warnings = BudgetLine._check_budget_amounts(
+            BudgetLine._sum_budget_amounts(budget_amounts_by_order), include_commitments=True,
+        )
+        res = super().button_confirm()
+        BudgetLine._post_budget_warnings(budget_amounts_by_order, budget_warnings)
+        return res
+
+
+class PurchaseOrderLine(models.Model):
+    """
+    Ligne de Commande d'Achat
+    Imputation budgetaire des engagements
+    """
+    _inherit = 'purchase.order.line'
+
+    budget_account_id = fields.Many2one(
+        'account.account.custom',
+        string='Compte budgetaire',
+        index='btree_not_null',
+    )
+    budget_analytic_account_id = fields.Many2one(
+        'account.analytic.account.custom',
+        string='Compte analytique budgetaire',
+        index='btree_not_null',
+    )
+
+    def _get_budget_amounts(self):
+        """
+        Montants hors taxes en devise societe imputes sur les lignes de budget
+        valides : {commande: {ligne de budget: montant}}
+        """
+        lines = self.filtered(lambda l: not l.display_type and (l.budget_account_id or l.budget_analytic_account_id))
+        return self.env['account.budget.line.custom']._dispatch_budget_amounts(
+            [(
+                line.order_id,
+                line.date_planned.date(),
+                line.budget_account_id.id,
+                line.budget_analytic_account_id and {str(line.budget_analytic_account_id.id): 100.0},
+                line.price_subtotal / (line.order_id.currency_rate or 1.0),
+            ) for line in lines],
+            set(lines.budget_account_id.ids),
+            set(lines.budget_analytic_account_id.ids),
+        )
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_right
+
+from odoo.tools import SQL
+
+
+class CurrencyRateCache:
+    """
+    Cache des taux de change par (devise, date)
+    La table des taux de chaque devise est chargee une seule fois (une requete
+    pour toutes les devises demandees), puis chaque date est resolue en memoire.
+    Les taux propres a la societe priment sur les taux partages.
+    """
+
+    def __init__(self, env, company):
+        self.env = env
+        self.company = company
+        self.company_currency = company.currency_id
+        self._tables = {}
+        self._rates = {}
+
+    def prefetch(self, currencies):
+        """Charger en une requete les tables de taux des devises non encore chargees"""
+        currency_ids = [cid for cid in set(currencies.ids) | {self.company_currency.id} if cid not in self._tables]
+        if not currency_ids:
+            return
+        self.env['res.currency.rate'].flush_model(['currency_id', 'company_id', 'name', 'rate'])
+        self.env.cr.execute(SQL("""
+            SELECT DISTINCT ON (currency_id, name) currency_id, name, rate
+              FROM res_currency_rate
+             WHERE currency_id = ANY(%(currency_ids)s)
+               AND (company_id = %(company_id)s OR company_id IS NULL)
+          ORDER BY currency_id, name, company_id NULLS LAST
+        """, currency_ids=currency_ids, company_id=self.company.id))
+        for currency_id in currency_ids:
+            self._tables[currency_id] = ([], [])
+        for currency_id, rate_date, rate in self.env.cr.fetchall():
+            dates, rates = self._tables[currency_id]
+            dates.append(rate_date)
+            rates.append(rate)
+
+    def _get_currency_rate(self, currency_id, date):
+        """Dernier taux connu a la date (a defaut le premier taux, a defaut 1)"""
+        if currency_id not in self._tables:
+            self.prefetch(self.env['res.currency'].browse(currency_id))
+        dates, rates = self._tables[currency_id]
+        if not rates:
+            return 1.0
+        index = bisect_right(dates, date)
+        return rates[index - 1] if index else rates[0]
+
+    def get_rate(self, currency, date):
+        """Nombre d'unites de la devise pour une unite de la devise societe"""
+        key = (currency.id, date)
+        if key not in self._rates:
+            self._rates[key] = (
+                self._get_currency_rate(currency.id, date)
+                / self._get_currency_rate(self.company_currency.id, date)
+            )
+        return self._rates[key]
+
+    def convert(self, amount, currency, date):
+        """Convertir un montant en devise vers la devise societe (arrondi)"""
+        if currency == self.company_currency:
+            return self.company_currency.round(amount)
+        return self.company_currency.round(amount / self.get_rate(currency, date))
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+
 from odoo import api, fields, models, _
 
 
@@ -88,26 +92,40 @@ class ResPartner(models.Model):
     invoice_warn_msg = fields.Text(string='Message avertissement')
 
     def _compute_accounting_stats(self):
-        for partner in self:
-            # Calculer debit/credit depuis les lignes d'ecriture
-            domain = [
-                ('partner_id', '=', partner.id),
-                ('move_id.state', '=', 'posted'),
+        # Debit/credit/du depuis les lignes d'ecriture, en une requete groupee
+        line_totals = {
+            partner.id: (debit, credit)
+            for partner, debit, credit in self.env['account.move.line.custom']._read_group([
+                ('partner_id', 'in', self.ids),
+                ('parent_state', '=', 'posted'),
                 ('account_id.account_type', 'in', ['asset_receivable', 'liability_payable']),
-            ]
-            lines = self.env['account.move.line.custom'].search(domain)
-
-            partner.debit = sum(lines.mapped('debit'))
-            partner.credit = sum(lines.mapped('credit'))
-            partner.total_due = sum(lines.mapped('amount_residual'))
-
-            # Total facture
-            invoices = self.env['account.move.custom'].search([
-                ('partner_id', '=', partner.id),
+            ], groupby=['partner_id'], aggregates=['debit:sum', 'credit:sum'])
+        }
+        # Du : lignes ouvertes uniquement (index partiel)
+        MoveLine = self.env['account.move.line.custom']
+        due = {
+            partner.id: residual
+            for partner, residual in MoveLine._read_group(
+                MoveLine._get_open_items_domain(partner_ids=self.ids) + [
+                    ('account_id.account_type', 'in', ['asset_receivable', 'liability_payable']),
+                ],
+                groupby=['partner_id'],
+                aggregates=['amount_residual:sum'],
+            )
+        }
+        # Total facture
+        invoiced = {
+            partner.id: amount_total
+            for partner, amount_total in self.env['account.move.custom']._read_group([
+                ('partner_id', 'in', self.ids),
                 ('state', '=', 'posted'),
                 ('move_type', 'in', ['out_invoice', 'out_refund']),
-            ])
-            partner.total_invoiced = sum(invoices.mapped('amount_total'))
+            ], groupby=['partner_id'], aggregates=['amount_total:sum'])
+        }
+        for partner in self:
+            partner.debit, partner.credit = line_totals.get(partner.id, (0.0, 0.0))
+            partner.total_due = due.get(partner.id, 0.0)
+            partner.total_invoiced = invoiced.get(partner.id, 0.0)
 
     def _compute_invoice_count(self):
         for partner in self:
@@ -141,7 +159,7 @@ class ResPartner(models.Model):
             'view_mode': 'list,form',
             'domain': [
                 ('partner_id', '=', self.id),
-                ('move_id.state', '=', 'posted'),
+                ('parent_state', '=', 'posted'),
             ],
         }
 
@@ -173,43 +191,71 @@ class AccountPaymentTerm(models.Model):
         default=lambda self: self.env.company,
     )
 
-    def compute(self, value, date_ref=False):
+    def compute(self, value, date_ref=False, currency=None):
         """
         Calculer les echeances de paiement
         Retourne une liste de tuples (date, montant)
         """
         self.ensure_one()
-        date_ref = date_ref or fields.Date.today()
-        amount = value
-        result = []
-
-        for line in self.line_ids:
-            if line.value == 'fixed':
-                amt = min(line.value_amount, amount)
-            elif line.value == 'percent':
-                amt = value * (line.value_amount / 100.0)
-            else:  # balance
-                amt = amount
-
-            if amt:
-                # Calculer la date
-                if line.delay_type == 'days_after':
-                    next_date = fields.Date.add(date_ref, days=line.nb_days)
-                elif line.delay_type == 'days_end_of_month':
-                    from dateutil.relativedelta import relativedelta
-                    next_date = fields.Date.add(date_ref, days=line.nb_days)
-                    next_date = next_date + relativedelta(day=31)
-                elif line.delay_type == 'days_end_of_month_on':
-                    from dateutil.relativedelta import relativedelta
-                    next_date = date_ref + relativedelta(day=31)
-                    next_date = fields.Date.add(next_date, days=line.nb_days)
-                else:
-                    next_date = date_ref
-
-                result.append((next_date, amt))
-                amount -= amt
-
-        return result
+        return self.compute_batch([(value, date_ref or fields.Date.today())], currency=currency)[0]
+
+    def compute_batch(self, values, currency=None):
+        """
+        Calculer les echeances pour une liste de (montant, date de reference).
+        La structure des lignes est lue une seule fois; la ligne de solde
+        recoit le reste apres arrondi des echeances precedentes.
+        Retourne une liste d'echeanciers [(date, montant), ...] dans l'ordre
+        des valeurs recues.
+        """
+        self.ensure_one()
+        structure = self._get_schedule_structure()
+        round_amount = currency.round if currency else (lambda amount: amount)
+        due_dates_cache = {}
+        schedules = []
+
+        for value, date_ref in values:
+            due_dates = due_dates_cache.get(date_ref)
+            if due_dates is None:
+                due_dates = due_dates_cache[date_ref] = [
+                    self._get_due_date(date_ref, delay_type, nb_days)
+                    for dummy, dummy, delay_type, nb_days in structure
+                ]
+
+            amount = value
+            schedule = []
+            for (value_type, value_amount, dummy, dummy), due_date in zip(structure, due_dates):
+                if value_type == 'fixed':
+                    amt = round_amount(min(value_amount, amount))
+                elif value_type == 'percent':
+                    amt = round_amount(value * (value_amount / 100.0))
+                else:  # balance
+                    amt = amount
+
+                if amt:
+                    schedule.append((due_date, amt))
+                    amount = round_amount(amount - amt)
+            schedules.append(schedule)
+
+        return schedules
+
+    def _get_schedule_structure(self):
+        """Lignes de la condition sous forme de tuples (type, valeur, type delai, jours)"""
+        self.ensure_one()
+        return [
+            (line.value, line.value_amount, line.delay_type, line.nb_days)
+            for line in self.line_ids
+        ]
+
+    @api.model
+    def _get_due_date(self, date_ref, delay_type, nb_days):
+        """Date d'echeance d'une ligne a partir de la date de reference"""
+        if delay_type == 'days_after':
+            return date_ref + timedelta(days=nb_days)
+        if delay_type == 'days_end_of_month':
+            return date_ref + timedelta(days=nb_days) + relativedelta(day=31)
+        if delay_type == 'days_end_of_month_on':
+            return date_ref + relativedelta(day=31) + timedelta(days=nb_days)
+        return date_ref
 
 
 class AccountPaymentTermLine(models.Model):
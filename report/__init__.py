@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import account_report
+from . import account_liasse
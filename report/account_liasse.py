@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+
+import json
+import re
+
+from odoo import api, models, _
+from odoo.exceptions import UserError
+
+from .account_report import (
+    CUMULATIVE_COLUMNS, DUE_AFTER_FIVE_YEARS_COLUMN, DUE_AFTER_ONE_YEAR_COLUMN,
+    PERIOD_COLUMNS, PERIOD_CREDIT_COLUMN, PERIOD_DEBIT_COLUMN, parse_code_ranges,
+)
+
+# Correspondance plages de comptes PCG -> cases de la liasse fiscale.
+# Chaque case: (code, libelle, definition) ou la definition contient
+#   'accounts': soldes de toutes les plages, 'debit' / 'credit': seuls les
+#   comptes a solde debiteur / crediteur, 'sign': -1 pour les soldes
+#   crediteurs presentes en positif, 'column': le montant lu (voir
+#   LIASSE_COLUMNS, colonne du formulaire par defaut), ou 'formula' sur
+#   d'autres cases.
+# Hors grand livre, et donc hors de cette correspondance: les reevaluations
+# et virements de poste a poste des tableaux 2054 a 2056, les echeances
+# d'origine des emprunts du 2057 et les tableaux fiscaux 2058-A, 2058-B,
+# 2058-C et 2059 (reintegrations, deficits reportables, plus-values).
+
+
+# Montants lus dans les colonnes des soldes agreges par compte
+LIASSE_COLUMNS = {
+    'period': lambda values: values[PERIOD_COLUMNS[0]],
+    'closing': lambda values: values[CUMULATIVE_COLUMNS[0]],
+    'opening': lambda values: (
+        values[CUMULATIVE_COLUMNS[0]] - values[PERIOD_DEBIT_COLUMN] + values[PERIOD_CREDIT_COLUMN]
+    ),
+    'debits': lambda values: values[PERIOD_DEBIT_COLUMN],
+    'credits': lambda values: values[PERIOD_CREDIT_COLUMN],
+    'within_one_year': lambda values: values[CUMULATIVE_COLUMNS[0]] - values[DUE_AFTER_ONE_YEAR_COLUMN],
+    'after_one_year': lambda values: values[DUE_AFTER_ONE_YEAR_COLUMN],
+    'one_to_five_years': lambda values: values[DUE_AFTER_ONE_YEAR_COLUMN] - values[DUE_AFTER_FIVE_YEARS_COLUMN],
+    'after_five_years': lambda values: values[DUE_AFTER_FIVE_YEARS_COLUMN],
+}
+FORMULA_TERM = re.compile(r'([+-]?)\s*([A-Z0-9]{2})')
+MOVEMENT_LABELS = ("debut d'exercice", "augmentations", "diminutions", "fin d'exercice")
+
+
+def movement_boxes(rows, sign=1, increase='debits', decrease='credits'):
+    """
+    Cases des tableaux de mouvements (2054 a 2056). Chaque ligne
+    (libelle, comptes, cases debut, augmentations, diminutions, fin) donne
+    quatre cases; augmentations et diminutions sont les debits et credits de
+    l'exercice hors a nouveaux. Une ligne de total donne a la place des
+    comptes le tuple des libelles des lignes qu'elle additionne.
+    """
+    boxes, codes_by_label = [], {}
+    for label, accounts, *codes in rows:
+        codes_by_label[label] = codes
+        if isinstance(accounts, tuple):
+            definitions = [
+                {'formula': ' + '.join(codes_by_label[row][index] for row in accounts)}
+                for index in range(len(MOVEMENT_LABELS))
+            ]
+        else:
+            definitions = [
+                {'accounts': accounts, 'sign': sign, 'column': 'opening'},
+                {'accounts': accounts, 'column': increase},
+                {'accounts': accounts, 'column': decrease},
+                {'accounts': accounts, 'sign': sign},
+            ]
+        boxes += [
+            (code, "%s - %s" % (label, column_label), definition)
+            for code, column_label, definition in zip(codes, MOVEMENT_LABELS, definitions)
+        ]
+    return boxes
+
+
+def maturity_boxes(rows, totals, sign=1):
+    """
+    Cases de l'etat des echeances (2057): montant brut de chaque ligne
+    (code, libelle, definition), puis totaux par echeance
+    (code, libelle, colonne) portant sur les comptes de toutes les lignes.
+    """
+    ranges = {}
+    for code, label, definition in rows:
+        for balance_filter in ('accounts', 'debit', 'credit'):
+            if definition.get(balance_filter):
+                ranges.setdefault(balance_filter, []).append(definition[balance_filter])
+    boxes = [(code, label, dict(definition, sign=sign)) for code, label, definition in rows]
+    boxes += [
+        (code, label, dict({key: ','.join(value) for key, value in ranges.items()}, sign=sign, column=column))
+        for code, label, column in totals
+    ]
+    return boxes
+
+
+LIASSE_BOXES = {
+    # Bilan actif (brut / amortissements et depreciations)
+    '2050': [
+        ('AA', "Capital souscrit non appele", {'accounts': '109'}),
+        ('AB', "Frais d'etablissement - brut", {'accounts': '201'}),
+        ('AC', "Frais d'etablissement - amortissements", {'accounts': '2801', 'sign': -1}),
+        ('CX', "Frais de developpement - brut", {'accounts': '203'}),
+        ('CQ', "Frais de developpement - amortissements", {'accounts': '2803', 'sign': -1}),
+        ('AF', "Concessions, brevets et droits similaires - brut", {'accounts': '205'}),
+        ('AG', "Concessions, brevets et droits similaires - amortissements", {'accounts': '2805,2905', 'sign': -1}),
+        ('AH', "Fonds commercial - brut", {'accounts': '206-207'}),
+        ('AI', "Fonds commercial - amortissements", {'accounts': '2807,2906-2907', 'sign': -1}),
+        ('AJ', "Autres immobilisations incorporelles - brut", {'accounts': '208,232'}),
+        ('AK', "Autres immobilisations incorporelles - amortissements", {'accounts': '2808,2908,2932', 'sign': -1}),
+        ('AL', "Avances et acomptes sur immobilisations incorporelles", {'accounts': '237'}),
+        ('AN', "Terrains - brut", {'accounts': '211-212'}),
+        ('AO', "Terrains - amortissements", {'accounts': '2811-2812,2911', 'sign': -1}),
+        ('AP', "Constructions - brut", {'accounts': '213-214'}),
+        ('AQ', "Constructions - amortissements", {'accounts': '2813-2814', 'sign': -1}),
+        ('AR', "Installations techniques, materiel et outillage - brut", {'accounts': '215'}),
+        ('AS', "Installations techniques, materiel et outillage - amortissements", {'accounts': '2815', 'sign': -1}),
+        ('AT', "Autres immobilisations corporelles - brut", {'accounts': '218'}),
+        ('AU', "Autres immobilisations corporelles - amortissements", {'accounts': '2818', 'sign': -1}),
+        ('AV', "Immobilisations en cours - brut", {'accounts': '231'}),
+        ('AW', "Immobilisations en cours - depreciations", {'accounts': '2931', 'sign': -1}),
+        ('AX', "Avances et acomptes sur immobilisations corporelles", {'accounts': '238'}),
+        ('CU', "Autres participations - brut", {'accounts': '261,266'}),
+        ('CV', "Autres participations - depreciations", {'accounts': '2961,2966', 'sign': -1}),
+        ('BB', "Creances rattachees a des participations - brut", {'accounts': '267-268'}),
+        ('BC', "Creances rattachees a des participations - depreciations", {'accounts': '2967-2968', 'sign': -1}),
+        ('BD', "Autres titres immobilises - brut", {'accounts': '271-273'}),
+        ('BE', "Autres titres immobilises - depreciations", {'accounts': '2971-2973', 'sign': -1}),
+        ('BF', "Prets - brut", {'accounts': '274'}),
+        ('BG', "Prets - depreciations", {'accounts': '2974', 'sign': -1}),
+        ('BH', "Autres immobilisations financieres - brut", {'accounts': '275-276'}),
+        ('BI', "Autres immobilisations financieres - depreciations", {'accounts': '2975-2976', 'sign': -1}),
+        ('BJ', "Total actif immobilise - brut",
+         {'formula': 'AB + CX + AF + AH + AJ + AL + AN + AP + AR + AT + AV + AX + CU + BB + BD + BF + BH'}),
+        ('BK', "Total actif immobilise - amortissements",
+         {'formula': 'AC + CQ + AG + AI + AK + AO + AQ + AS + AU + AW + CV + BC + BE + BG + BI'}),
+        ('BL', "Matieres premieres, approvisionnements - brut", {'accounts': '31-32'}),
+        ('BM', "Matieres premieres, approvisionnements - depreciations", {'accounts': '391-392', 'sign': -1}),
+        ('BN', "En cours de production de biens - brut", {'accounts': '33'}),
+        ('BO', "En cours de production de biens - depreciations", {'accounts': '393', 'sign': -1}),
+        ('BP', "En cours de production de services - brut", {'accounts': '34'}),
+        ('BQ', "En cours de production de services - depreciations", {'accounts': '394', 'sign': -1}),
+        ('BR', "Produits intermediaires et finis - brut", {'accounts': '35'}),
+        ('BS', "Produits intermediaires et finis - depreciations", {'accounts': '395', 'sign': -1}),
+        ('BT', "Marchandises - brut", {'accounts': '37'}),
+        ('BU', "Marchandises - depreciations", {'accounts': '397', 'sign': -1}),
+        ('BV', "Avances et acomptes verses sur commandes", {'accounts': '4091'}),
+        ('BX', "Clients et comptes rattaches - brut", {'accounts': '411-418'}),
+        ('BY', "Clients et comptes rattaches - depreciations", {'accounts': '491', 'sign': -1}),
+        ('BZ', "Autres creances - brut",
+         {'debit': '42-44,450-455,4560-4561,4563-4569,457-459,46,470-475,478-479', 'accounts': '4096-4098'}),
+        ('CA', "Autres creances - depreciations", {'accounts': '495-496', 'sign': -1}),
+        ('CB', "Capital souscrit appele non verse", {'accounts': '4562'}),
+        ('CD', "Valeurs mobilieres de placement - brut", {'accounts': '50'}),
+        ('CE', "Valeurs mobilieres de placement - depreciations", {'accounts': '590', 'sign': -1}),
+        ('CF', "Disponibilites", {'debit': '51-53'}),
+        ('CH', "Charges constatees d'avance", {'accounts': '486'}),
+        ('CJ', "Total actif circulant - brut",
+         {'formula': 'BL + BN + BP + BR + BT + BV + BX + BZ + CB + CD + CF + CH'}),
+        ('CK', "Total actif circulant - depreciations",
+         {'formula': 'BM + BO + BQ + BS + BU + BY + CA + CE'}),
+        ('CL', "Charges a repartir sur plusieurs exercices", {'accounts': '481'}),
+        ('CM', "Primes de remboursement des obligations", {'accounts': '169'}),
+        ('CN', "Ecarts de conversion actif", {'accounts': '476'}),
+        ('CO', "Total general - brut", {'formula': 'AA + BJ + CJ + CL + CM + CN'}),
+        ('1A', "Total general - amortissements et depreciations", {'formula': 'BK + CK'}),
+    ],
+    # Bilan passif
+    '2051': [
+        ('DA', "Capital social ou individuel", {'accounts': '101,108', 'sign': -1}),
+        ('DB', "Primes d'emission, de fusion, d'apport", {'accounts': '104', 'sign': -1}),
+        ('DC', "Ecarts de reevaluation", {'accounts': '105', 'sign': -1}),
+        ('DD', "Reserve legale", {'accounts': '1061', 'sign': -1}),
+        ('DE', "Reserves statutaires ou contractuelles", {'accounts': '1063', 'sign': -1}),
+        ('DF', "Reserves reglementees", {'accounts': '1062,1064', 'sign': -1}),
+        ('DG', "Autres reserves", {'accounts': '1068', 'sign': -1}),
+        ('DH', "Report a nouveau", {'accounts': '11', 'sign': -1}),
+        # Resultat non encore affecte: solde du 12 et des classes 6 et 7
+        ('DI', "Resultat de l'exercice", {'accounts': '12,6,7', 'sign': -1}),
+        ('DJ', "Subventions d'investissement", {'accounts': '13', 'sign': -1}),
+        ('DK', "Provisions reglementees", {'accounts': '14', 'sign': -1}),
+        ('DL', "Total capitaux propres", {'formula': 'DA + DB + DC + DD + DE + DF + DG + DH + DI + DJ + DK'}),
+        ('DM', "Produit des emissions de titres participatifs", {'accounts': '1671', 'sign': -1}),
+        ('DN', "Avances conditionnees", {'accounts': '1674', 'sign': -1}),
+        ('DO', "Total autres fonds propres", {'formula': 'DM + DN'}),
+        ('DP', "Provisions pour risques", {'accounts': '151', 'sign': -1}),
+        ('DQ', "Provisions pour charges", {'accounts': '153-158', 'sign': -1}),
+        ('DR', "Total provisions", {'formula': 'DP + DQ'}),
+        ('DS', "Emprunts obligataires convertibles", {'accounts': '161', 'sign': -1}),
+        ('DT', "Autres emprunts obligataires", {'accounts': '163', 'sign': -1}),
+        ('DU', "Emprunts et dettes aupres des etablissements de credit",
+         {'accounts': '164', 'credit': '51-53', 'sign': -1}),
+        ('DV', "Emprunts et dettes financieres divers",
+         {'accounts': '165-166,1675-1678,168,17', 'credit': '455', 'sign': -1}),
+        ('DW', "Avances et acomptes recus sur commandes en cours", {'accounts': '4191', 'sign': -1}),
+        ('DX', "Dettes fournisseurs et comptes rattaches", {'accounts': '401,403,408', 'sign': -1}),
+        ('DY', "Dettes fiscales et sociales", {'credit': '42-44', 'sign': -1}),
+        ('DZ', "Dettes sur immobilisations et comptes rattaches", {'accounts': '404-405', 'sign': -1}),
+        ('EA', "Autres dettes", {'credit': '450-454,456-459,46,470-475,478-479', 'sign': -1}),
+        ('EB', "Produits constates d'avance", {'accounts': '487', 'sign': -1}),
+        ('EC', "Total dettes", {'formula': 'DS + DT + DU + DV + DW + DX + DY + DZ + EA + EB'}),
+        ('ED', "Ecarts de conversion passif", {'accounts': '477', 'sign': -1}),
+        ('EE', "Total general", {'formula': 'DL + DO + DR + EC + ED'}),
+    ],
+    # Compte de resultat (exploitation et financier)
+    '2052': [
+        ('FC', "Ventes de marchandises", {'accounts': '707,7097', 'sign': -1}),
+        ('FF', "Production vendue - biens", {'accounts': '701-703,7091-7093', 'sign': -1}),
+        ('FI', "Production vendue - services", {'accounts': '704-706,708,7094-7096,7098', 'sign': -1}),
+        ('FL', "Chiffre d'affaires net", {'formula': 'FC + FF + FI'}),
+        ('FM', "Production stockee", {'accounts': '713', 'sign': -1}),
+        ('FN', "Production immobilisee", {'accounts': '72', 'sign': -1}),
+        ('FO', "Subventions d'exploitation", {'accounts': '74', 'sign': -1}),
+        ('FP', "Reprises sur amortissements et provisions, transferts de charges",
+         {'accounts': '781,791', 'sign': -1}),
+        ('FQ', "Autres produits", {'accounts': '750-754,756-759', 'sign': -1}),
+        ('FR', "Total des produits d'exploitation", {'formula': 'FL + FM + FN + FO + FP + FQ'}),
+        ('FS', "Achats de marchandises", {'accounts': '607,6097'}),
+        ('FT', "Variation de stock (marchandises)", {'accounts': '6037'}),
+        ('FU', "Achats de matieres premieres et autres approvisionnements",
+         {'accounts': '601-602,6091-6092'}),
+        ('FV', "Variation de stock (matieres premieres et approvisionnements)", {'accounts': '6031-6032'}),
+        ('FW', "Autres achats et charges externes", {'accounts': '604-606,6094-6096,6098,61-62'}),
+        ('FX', "Impots, taxes et versements assimiles", {'accounts': '63'}),
+        ('FY', "Salaires et traitements", {'accounts': '641,644'}),
+        ('FZ', "Charges sociales", {'accounts': '645-648'}),
+        ('GA', "Dotations aux amortissements sur immobilisations", {'accounts': '6811-6812'}),
+        ('GB', "Dotations aux provisions sur immobilisations", {'accounts': '6816'}),
+        ('GC', "Dotations aux provisions sur actif circulant", {'accounts': '6817'}),
+        ('GD', "Dotations aux provisions pour risques et charges", {'accounts': '6815'}),
+        ('GE', "Autres charges", {'accounts': '650-654,656-659'}),
+        ('GF', "Total des charges d'exploitation",
+         {'formula': 'FS + FT + FU + FV + FW + FX + FY + FZ + GA + GB + GC + GD + GE'}),
+        ('GG', "Resultat d'exploitation", {'formula': 'FR - GF'}),
+        ('GH', "Benefice attribue ou perte transferee", {'accounts': '755', 'sign': -1}),
+        ('GI', "Perte supportee ou benefice transfere", {'accounts': '655'}),
+        ('GJ', "Produits financiers de participations", {'accounts': '761', 'sign': -1}),
+        ('GK', "Produits des autres valeurs mobilieres et creances de l'actif immobilise",
+         {'accounts': '762', 'sign': -1}),
+        ('GL', "Autres interets et produits assimiles", {'accounts': '763-765,768', 'sign': -1}),
+        ('GM', "Reprises sur provisions et transferts de charges", {'accounts': '786,796', 'sign': -1}),
+        ('GN', "Differences positives de change", {'accounts': '766', 'sign': -1}),
+        ('GO', "Produits nets sur cessions de valeurs mobilieres de placement", {'accounts': '767', 'sign': -1}),
+        ('GP', "Total des produits financiers", {'formula': 'GJ + GK + GL + GM + GN + GO'}),
+        ('GQ', "Dotations financieres aux amortissements et provisions", {'accounts': '686'}),
+        ('GR', "Interets et charges assimilees", {'accounts': '661,664-665,668'}),
+        ('GS', "Differences negatives de change", {'accounts': '666'}),
+        ('GT', "Charges nettes sur cessions de valeurs mobilieres de placement", {'accounts': '667'}),
+        ('GU', "Total des charges financieres", {'formula': 'GQ + GR + GS + GT'}),
+        ('GV', "Resultat financier", {'formula': 'GP - GU'}),
+        ('GW', "Resultat courant avant impots", {'formula': 'GG + GH - GI + GV'}),
+    ],
+    # Compte de resultat (exceptionnel et resultat net)
+    '2053': [
+        ('HA', "Produits exceptionnels sur operations de gestion", {'accounts': '771-772', 'sign': -1}),
+        ('HB', "Produits exceptionnels sur operations en capital", {'accounts': '775-778', 'sign': -1}),
+        ('HC', "Reprises sur provisions et transferts de charges", {'accounts': '787,797', 'sign': -1}),
+        ('HD', "Total des produits exceptionnels", {'formula': 'HA + HB + HC'}),
+        ('HE', "Charges exceptionnelles sur operations de gestion", {'accounts': '671-672'}),
+        ('HF', "Charges exceptionnelles sur operations en capital", {'accounts': '675-678'}),
+        ('HG', "Dotations exceptionnelles aux amortissements et provisions", {'accounts': '687'}),
+        ('HH', "Total des charges exceptionnelles", {'formula': 'HE + HF + HG'}),
+        ('HI', "Resultat exceptionnel", {'formula': 'HD - HH'}),
+        ('HJ', "Participation des salaries aux resultats de l'entreprise", {'accounts': '691'}),
+        ('HK', "Impots sur les benefices", {'accounts': '695-699'}),
+        ('HL', "Total des produits", {'formula': 'FR + GH + GP + HD'}),
+        ('HM', "Total des charges", {'formula': 'GF + GI + GU + HH + HJ + HK'}),
+        ('HN', "Benefice ou perte", {'formula': 'HL - HM'}),
+    ],
+    # Immobilisations (valeurs brutes)
+    '2054': movement_boxes([
+        ("Frais d'etablissement et de developpement", '201,203', 'CZ', 'D9', 'D7', 'D0'),
+        ("Autres postes d'immobilisations incorporelles", '205-208,232,237', 'KD', 'KF', 'LV', 'LW'),
+        ("Terrains", '211-212', 'KG', 'KI', 'IK', 'IL'),
+        ("Constructions sur sol propre", '2131,2138', 'KJ', 'KL', 'IN', 'IO'),
+        ("Constructions sur sol d'autrui", '214', 'KM', 'KO', 'IQ', 'IR'),
+        ("Installations generales, agencements et amenagements des constructions", '2135', 'KP', 'KR', 'IT', 'IU'),
+        ("Installations techniques, materiel et outillage industriels", '215', 'KS', 'KU', 'IW', 'IX'),
+        ("Installations generales, agencements, amenagements divers", '2181', 'KV', 'KX', 'IZ', 'I0'),
+        ("Materiel de transport", '2182', 'KY', 'LA', 'I2', 'I3'),
+        ("Materiel de bureau et informatique, mobilier", '2183-2184', 'LB', 'LD', 'I5', 'I6'),
+        ("Emballages recuperables et divers", '2185-2188', 'LE', 'LG', 'I8', 'I9'),
+        ("Immobilisations corporelles en cours", '231', 'LH', 'LJ', 'J0', 'J1'),
+        ("Avances et acomptes", '238', 'LK', 'LM', 'J2', 'J3'),
+        ("Total immobilisations corporelles", (
+            "Terrains", "Constructions sur sol propre", "Constructions sur sol d'autrui",
+            "Installations generales, agencements et amenagements des constructions",
+            "Installations techniques, materiel et outillage industriels",
+            "Installations generales, agencements, amenagements divers", "Materiel de transport",
+            "Materiel de bureau et informatique, mobilier", "Emballages recuperables et divers",
+            "Immobilisations corporelles en cours", "Avances et acomptes",
+        ), 'LN', 'LP', 'J4', 'J5'),
+        ("Autres participations", '261,266-268', '8U', '8W', 'J6', 'J7'),
+        ("Autres titres immobilises", '271-273', '1P', '1S', 'J8', 'J9'),
+        ("Prets et autres immobilisations financieres", '274-276', '1T', '1V', 'K0', 'K1'),
+        ("Total immobilisations financieres", (
+            "Autres participations", "Autres titres immobilises", "Prets et autres immobilisations financieres",
+        ), 'LQ', 'LS', 'K2', 'K3'),
+        ("Total general", (
+            "Frais d'etablissement et de developpement", "Autres postes d'immobilisations incorporelles",
+            "Total immobilisations corporelles", "Total immobilisations financieres",
+        ), '0G', '0J', 'K4', 'K5'),
+    ]),
+    # Amortissements: dotations au credit, reprises et sorties au debit
+    '2055': movement_boxes([
+        ("Frais d'etablissement et de developpement", '2801,2803', 'CY', 'EL', 'EM', 'EN'),
+        ("Autres immobilisations incorporelles", '2805-2808', 'PE', 'PF', 'PG', 'PH'),
+        ("Terrains", '2811-2812', 'PI', 'PJ', 'PK', 'PL'),
+        ("Constructions sur sol propre", '28131,28138', 'PM', 'PN', 'PO', 'PQ'),
+        ("Constructions sur sol d'autrui", '2814', 'PR', 'PS', 'PT', 'PU'),
+        ("Installations generales, agencements et amenagements des constructions", '28135', 'PV', 'PW', 'PX', 'PY'),
+        ("Installations techniques, materiel et outillage industriels", '2815', 'PZ', 'QA', 'QB', 'QC'),
+        ("Installations generales, agencements, amenagements divers", '28181', 'QD', 'QE', 'QF', 'QG'),
+        ("Materiel de transport", '28182', 'QH', 'QI', 'QJ', 'QK'),
+        ("Materiel de bureau et informatique, mobilier", '28183-28184', 'QL', 'QM', 'QN', 'QO'),
+        ("Emballages recuperables et divers", '28185-28188', 'QP', 'QR', 'QS', 'QT'),
+        ("Total immobilisations corporelles", (
+            "Terrains", "Constructions sur sol propre", "Constructions sur sol d'autrui",
+            "Installations generales, agencements et amenagements des constructions",
+            "Installations techniques, materiel et outillage industriels",
+            "Installations generales, agencements, amenagements divers", "Materiel de transport",
+            "Materiel de bureau et informatique, mobilier", "Emballages recuperables et divers",
+        ), 'QU', 'QV', 'QW', 'QX'),
+        ("Total general", (
+            "Frais d'etablissement et de developpement", "Autres immobilisations incorporelles",
+            "Total immobilisations corporelles",
+        ), '0N', '0P', '0Q', '0R'),
+    ], sign=-1, increase='credits', decrease='debits'),
+    # Provisions et depreciations: dotations au credit, reprises au debit
+    '2056': movement_boxes([
+        ("Provisions reglementees", '14', '3Z', '4A', '4E', '4F'),
+        ("Provisions pour litiges", '1511', '4X', '4Y', '4Z', '5A'),
+        ("Provisions pour garanties donnees aux clients", '1512', '5B', '5C', '5D', '5E'),
+        ("Provisions pour pertes sur marches a terme", '1513', '5F', '5H', '5J', '5K'),
+        ("Provisions pour amendes et penalites", '1514', '5L', '5M', '5N', '5P'),
+        ("Provisions pour pertes de change", '1515', '5R', '5S', '5T', '5U'),
+        ("Provisions pour pensions et obligations similaires", '153', '5V', '5W', '5X', '5Y'),
+        ("Provisions pour impots", '155', '5Z', '6A', '6B', '6C'),
+        ("Provisions pour renouvellement des immobilisations", '156', '6E', '6F', '6G', '6H'),
+        ("Provisions pour gros entretien et grandes revisions", '1572', 'EO', 'EP', 'EQ', 'ER'),
+        ("Provisions pour charges sociales et fiscales sur conges a payer", '1582', '6J', '6K', '6L', '6M'),
+        ("Autres provisions pour risques et charges",
+         '1516-1518,154,1571,1573-1579,1581,1583-1589', '6N', '6P', '6R', '6S'),
+        ("Total provisions pour risques et charges", (
+            "Provisions pour litiges", "Provisions pour garanties donnees aux clients",
+            "Provisions pour pertes sur marches a terme", "Provisions pour amendes et penalites",
+            "Provisions pour pertes de change", "Provisions pour pensions et obligations similaires",
+            "Provisions pour impots", "Provisions pour renouvellement des immobilisations",
+            "Provisions pour gros entretien et grandes revisions",
+            "Provisions pour charges sociales et fiscales sur conges a payer",
+            "Autres provisions pour risques et charges",
+        ), '7B', '7C', '7D', '7E'),
+        ("Depreciations des immobilisations incorporelles", '290', '6T', '6U', '6V', '6W'),
+        ("Depreciations des immobilisations corporelles", '291-293', '6X', '6Y', '6Z', '7A'),
+        ("Depreciations des titres de participation", '296', '9U', '9V', '9W', '9X'),
+        ("Depreciations des autres immobilisations financieres", '297', '06', '07', '08', '09'),
+        ("Depreciations des stocks et en cours", '39', '7F', '7G', '7H', '7J'),
+        ("Depreciations des comptes clients", '491', '7K', '7L', '7M', '7N'),
+        ("Autres depreciations", '495-496,59', '7P', '7R', '7S', '7T'),
+        ("Total depreciations", (
+            "Depreciations des immobilisations incorporelles", "Depreciations des immobilisations corporelles",
+            "Depreciations des titres de participation", "Depreciations des autres immobilisations financieres",
+            "Depreciations des stocks et en cours", "Depreciations des comptes clients", "Autres depreciations",
+        ), '7U', '7V', '7W', '7X'),
+        ("Total general", (
+            "Provisions reglementees", "Total provisions pour risques et charges", "Total depreciations",
+        ), '8P', '8R', '8S', '8T'),
+    ], sign=-1, increase='credits', decrease='debits'),
+    # Echeances des creances et des dettes a la cloture
+    '2057': maturity_boxes([
+        ('UL', "Creances rattachees a des participations", {'accounts': '267-268'}),
+        ('UP', "Prets", {'accounts': '274'}),
+        ('UT', "Autres immobilisations financieres", {'accounts': '275-276'}),
+        ('VA', "Clients douteux ou litigieux", {'accounts': '416'}),
+        ('UX', "Autres creances clients", {'accounts': '411,413,417-418'}),
+        ('UY', "Personnel et comptes rattaches", {'debit': '421-428'}),
+        ('UZ', "Securite sociale et autres organismes sociaux", {'debit': '431-438'}),
+        ('VM', "Etat - impots sur les benefices", {'debit': '444'}),
+        ('VB', "Etat - taxe sur la valeur ajoutee", {'debit': '445'}),
+        ('VN', "Etat - autres impots, taxes et versements assimiles", {'debit': '442,446-447'}),
+        ('VP', "Etat - divers", {'debit': '441,448-449'}),
+        ('VC', "Groupe et associes", {'debit': '451,455'}),
+        ('VR', "Debiteurs divers", {'debit': '46'}),
+        ('VS', "Charges constatees d'avance", {'accounts': '486'}),
+    ], [
+        ('VT', "Total creances - montant brut", 'closing'),
+        ('VU', "Total creances - a un an au plus", 'within_one_year'),
+        ('VV', "Total creances - a plus d'un an", 'after_one_year'),
+    ]) + maturity_boxes([
+        ('7Y', "Emprunts obligataires convertibles", {'accounts': '161'}),
+        ('7Z', "Autres emprunts obligataires", {'accounts': '163'}),
+        ('VG', "Emprunts et dettes aupres des etablissements de credit", {'accounts': '164', 'credit': '51-53'}),
+        ('8A', "Emprunts et dettes financieres divers", {'accounts': '165-166,1675-1678,168,17', 'credit': '455'}),
+        ('8B', "Fournisseurs et comptes rattaches", {'accounts': '401,403,408'}),
+        ('8C', "Personnel et comptes rattaches", {'credit': '421-428'}),
+        ('8D', "Securite sociale et autres organismes sociaux", {'credit': '431-438'}),
+        ('8E', "Etat - impots sur les benefices", {'credit': '444'}),
+        ('VW', "Etat - taxe sur la valeur ajoutee", {'credit': '445'}),
+        ('VQ', "Etat - autres impots, taxes et versements assimiles", {'credit': '442,446-447'}),
+        ('8J', "Dettes sur immobilisations et comptes rattaches", {'accounts': '404-405'}),
+        ('VI', "Groupe et associes", {'credit': '451'}),
+        ('8K', "Autres dettes", {'credit': '46'}),
+        ('8L', "Produits constates d'avance", {'accounts': '487'}),
+    ], [
+        ('VY', "Total dettes - montant brut", 'closing'),
+        ('VZ', "Total dettes - a un an au plus", 'within_one_year'),
+        ('8M', "Total dettes - a plus d'un an et cinq ans au plus", 'one_to_five_years'),
+        ('8N', "Total dettes - a plus de cinq ans", 'after_five_years'),
+    ], sign=-1),
+}
+# Montant lu par defaut pour chaque formulaire: soldes a la cloture pour le
+# bilan et les tableaux annexes, mouvements de l'exercice pour le compte de
+# resultat
+LIASSE_FORM_COLUMNS = {
+    '2050': 'closing',
+    '2051': 'closing',
+    '2052': 'period',
+    '2053': 'period',
+    '2054': 'closing',
+    '2055': 'closing',
+    '2056': 'closing',
+    '2057': 'closing',
+}
+
+
+class AccountLiasseFiscale(models.AbstractModel):
+    """
+    Liasse Fiscale (regime reel normal)
+    Toutes les cases sont calculees a partir d'une seule agregation des
+    soldes par compte de l'exercice, repliee sur les plages de comptes.
+    """
+    _name = 'account.liasse.fiscale.custom'
+    _description = 'Liasse fiscale'
+
+    @api.model
+    def _get_boxes(self, fiscal_year):
+        """Montants de l'exercice par formulaire et par case {formulaire: {case: montant}}"""
+        folded = self.env['account.report.custom']._get_folded_balances(
+            fiscal_year.company_id, fiscal_year.date_from, fiscal_year.date_to,
+        )
+        # Montants en euros sans centimes; les totaux portent sur les cases arrondies
+        amounts = {}
+        for form, boxes in LIASSE_BOXES.items():
+            for box, label, definition in boxes:
+                if 'formula' in definition:
+                    terms = FORMULA_TERM.findall(definition['formula'])
+                    missing = {code for sign, code in terms} - set(amounts)
+                    if missing:
+                        raise UserError(_("Case(s) %s inconnue(s) dans la formule de la case %s.") % (', '.join(sorted(missing)), box))
+                    amounts[box] = sum(-amounts[code] if sign == '-' else amounts[code] for sign, code in terms)
+                    continue
+                column = LIASSE_COLUMNS[definition.get('column', LIASSE_FORM_COLUMNS[form])]
+                value = 0.0
+                for balance_filter in ('accounts', 'debit', 'credit'):
+                    if definition.get(balance_filter):
+                        value += column(folded.sum(
+                            parse_code_ranges(definition[balance_filter]),
+                            balance_filter='all' if balance_filter == 'accounts' else balance_filter,
+                        ))
+                amounts[box] = round(definition.get('sign', 1) * value)
+        return {
+            form: {box: amounts[box] for box, label, definition in boxes}
+            for form, boxes in LIASSE_BOXES.items()
+        }
+
+    @api.model
+    def _export_json(self, fiscal_year):
+        """
+        Export JSON de la liasse: cles triees et une case par ligne, pour
+        comparer deux exercices avec un simple diff
+        """
+        data = {
+            'company': fiscal_year.company_id.name,
+            'siret': fiscal_year.company_id.company_registry or '',
+            'fiscal_year': fiscal_year.name,
+            'date_from': str(fiscal_year.date_from),
+            'date_to': str(fiscal_year.date_to),
+            'forms': self._get_boxes(fiscal_year),
+        }
+        return json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False)
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+
+import re
+from bisect import bisect_left
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+from odoo.tools.safe_eval import safe_eval
+
+# Nombre de colonnes calculees: exercice N et exercice N-1
+REPORT_COLUMNS = 2
+# Colonnes des soldes agreges par compte: mouvements de la periode N et N-1
+# (compte de resultat), soldes cumules a la date de fin N et N-1 (bilan),
+# debits et credits de la periode N hors a nouveaux (tableaux des
+# immobilisations, amortissements et provisions), part du solde cumule N
+# echue a plus d'un an et a plus de cinq ans (etat des echeances)
+PERIOD_COLUMNS = (0, 1)
+CUMULATIVE_COLUMNS = (2, 3)
+PERIOD_DEBIT_COLUMN = 4
+PERIOD_CREDIT_COLUMN = 5
+DUE_AFTER_ONE_YEAR_COLUMN = 6
+DUE_AFTER_FIVE_YEARS_COLUMN = 7
+BALANCE_COLUMNS = 8
+BALANCE_FILTERS = ('all', 'debit', 'credit')
+ACCOUNT_CODES_ITEM = re.compile(r'^([0-9A-Za-z]+)(?:-([0-9A-Za-z]+))?$')
+
+
+def new_totals():
+    return {balance_filter: [0.0] * BALANCE_COLUMNS for balance_filter in BALANCE_FILTERS}
+
+
+def parse_code_ranges(account_codes):
+    """Plages (prefixe debut, prefixe fin) d'une liste 20,280,290 ou 21-23"""
+    ranges = []
+    for item in (account_codes or '').split(','):
+        match = ACCOUNT_CODES_ITEM.match(item.strip())
+        if match:
+            ranges.append((match[1], match[2] or match[1]))
+    return ranges
+
+
+class FoldedBalances:
+    """
+    Soldes par compte replies sur chacun de leurs prefixes et de leurs tags
+    Totaux = {'all'|'debit'|'credit': [colonnes]}; un compte compte en 'debit'
+    ou 'credit' selon le sens de son propre solde. Une plage de prefixes se
+    resout par dichotomie sur les prefixes tries de meme longueur.
+    """
+
+    def __init__(self, balances, accounts):
+        self._by_length = {}
+        self._by_tag = {}
+        for account in accounts:
+            targets = [
+                self._by_length.setdefault(length, {}).setdefault(account.code[:length], new_totals())
+                for length in range(1, len(account.code) + 1)
+            ]
+            targets += [self._by_tag.setdefault(tag_id, new_totals()) for tag_id in account.tag_ids.ids]
+            for column, amount in enumerate(balances[account.id]):
+                if not amount:
+                    continue
+                side = 'debit' if amount > 0 else 'credit'
+                for totals in targets:
+                    totals['all'][column] += amount
+                    totals[side][column] += amount
+        self._sorted_prefixes = {length: sorted(prefixes) for length, prefixes in self._by_length.items()}
+
+    def _range_totals(self, start, end):
+        length = max(len(start), len(end))
+        prefixes = self._sorted_prefixes.get(length, [])
+        for prefix in prefixes[bisect_left(prefixes, start):]:
+            if prefix[:len(end)] > end:
+                break
+            yield self._by_length[length][prefix]
+
+    def sum(self, code_ranges, tag_ids=(), balance_filter='all'):
+        """Total par colonne des plages de prefixes et des tags"""
+        totals_list = [totals for start, end in code_ranges for totals in self._range_totals(start, end)]
+        totals_list += [self._by_tag[tag_id] for tag_id in tag_ids if tag_id in self._by_tag]
+        values = [0.0] * BALANCE_COLUMNS
+        for totals in totals_list:
+            for column in range(BALANCE_COLUMNS):
+                values[column] += totals[balance_filter][column]
+        return values
+
+
+class AccountReport(models.Model):
+    """
+    Etat Financier (bilan, compte de resultat)
+    Chaque ligne est definie par des prefixes ou plages de comptes, des tags
+    ou une formule sur les autres lignes. Les soldes sont agreges une seule
+    fois par compte (N et N-1), puis replies en memoire sur les prefixes.
+    """
+    _name = 'account.report.custom'
+    _description = 'Etat financier'
+    _order = 'sequence, id'
+
+    name = fields.Char(string='Nom', required=True, translate=True)
+    sequence = fields.Integer(string='Sequence', default=10)
+    report_type = fields.Selection([
+        ('balance_sheet', 'Bilan'),
+        ('profit_loss', 'Compte de resultat'),
+    ], string='Type', required=True, default='balance_sheet')
+    line_ids = fields.One2many(
+        'account.report.line.custom',
+        'report_id',
+        string='Lignes',
+        copy=True,
+    )
+    active = fields.Boolean(default=True)
+
+    @api.model
+    def _invalidate_balances_cache(self):
+        """Invalider le cache des soldes apres comptabilisation ou annulation d'ecritures"""
+        self.env.registry.clear_cache()
+
+    @api.model
+    def _get_account_balances(self, company, date_from, date_to):
+        """Soldes par compte {compte_id: colonnes}, mis en cache par (societe, periode)"""
+        return self._get_cached_account_balances(company.id, date_from, date_to)
+
+    @tools.ormcache('company_id', 'date_from', 'date_to')
+    def _get_cached_account_balances(self, company_id, date_from, date_to):
+        return self._query_account_balances(company_id, date_from, date_to)
+
+    @api.model
+    def _get_opening_date(self, company_id, day):
+        """
+        Debut de l'exercice contenant day si ses a nouveaux sont comptabilises
+        a cette date : le solde cumule a day se lit alors depuis ce debut.
+        Retourne False sinon.
+        """
+        fiscal_year = self.env['account.fiscal.year.custom'].search([
+            ('company_id', '=', company_id),
+            ('date_from', '<=', day),
+            ('date_to', '>=', day),
+        ], limit=1)
+        if fiscal_year and fiscal_year._has_opening_entry(day):
+            return fiscal_year.date_from
+        return False
+
+    @api.model
+    def _query_account_balances(self, company_id, date_from, date_to):
+        """
+        Une requete groupee par compte sur les lignes comptabilisees et les
+        lignes archivees: mouvements de la periode N et N-1, soldes cumules
+        a la date de fin N et N-1, debits et credits de la periode N hors a
+        nouveaux, puis part du solde cumule N dont l'echeance depasse d'un an
+        et de cinq ans la date de fin (les lignes sans echeance sont a un an
+        au plus).
+        Les soldes cumules partent des a nouveaux de l'exercice contenant la
+        date de fin : les lectures sont bornees a ces exercices et seules les
+        partitions d'archive correspondantes sont parcourues. Sans a nouveaux,
+        tout l'historique est lu; les ecritures d'a nouveaux n'y sont cumulees
+        que si elles precedent la premiere ligne ordinaire (reprise d'un
+        historique externe).
+        """
+        previous_date_from = date_from - relativedelta(years=1)
+        previous_date_to = date_to - relativedelta(years=1)
+        opening_date = self._get_opening_date(company_id, date_to)
+        previous_opening_date = self._get_opening_date(company_id, previous_date_to)
+        start_date = opening_date and previous_opening_date and min(
+            date_from, previous_date_from, opening_date, previous_opening_date,
+        )
+
+        def cumulative_filter(opening, day):
+            if opening:
+                return SQL("date BETWEEN %s AND %s", opening, day)
+            return SQL("cumulated AND date <= %s", day)
+
+        archived_years = self.env['account.fiscal.year.custom'].search([
+            ('company_id', '=', company_id),
+            ('lines_archived', '=', True),
+            ('date_from', '<=', date_to),
+        ] + ([('date_to', '>=', start_date)] if start_date else []))
+        self.env['account.move.line.custom'].flush_model([
+            'account_id', 'company_id', 'journal_id', 'date', 'date_maturity',
+            'debit', 'credit', 'balance', 'parent_state',
+        ])
+        self.env.cr.execute(SQL("""
+            WITH lines AS (
+                    SELECT l.account_id, l.date, l.date_maturity, l.debit, l.credit, l.balance,
+                           j.type = 'situation' AS is_opening
+                      FROM account_move_line_custom l
+                      JOIN account_journal_custom j ON j.id = l.journal_id
+                     WHERE l.company_id = %(company_id)s
+                       AND l.parent_state = 'posted'
+                       AND %(date_range)s
+                 UNION ALL
+                    SELECT l.account_id, l.date, l.date_maturity, l.debit, l.credit, l.balance,
+                           j.type = 'situation' AS is_opening
+                      FROM account_move_line_archive_custom l
+                      JOIN account_journal_custom j ON j.id = l.journal_id
+                     WHERE l.fiscal_year_id = ANY(%(archived_year_ids)s)
+                       AND l.company_id = %(company_id)s
+                       AND l.parent_state = 'posted'
+                       AND %(date_range)s
+            ),
+            history AS (
+                SELECT MIN(date) AS start_date FROM lines WHERE NOT is_opening
+            ),
+            cumulated_lines AS (
+                SELECT lines.*,
+                       NOT is_opening OR history.start_date IS NULL OR lines.date <= history.start_date AS cumulated
+                  FROM lines, history
+            )
+            SELECT account_id,
+                   COALESCE(SUM(balance) FILTER (WHERE date BETWEEN %(date_from)s AND %(date_to)s), 0),
+                   COALESCE(SUM(balance) FILTER (WHERE date BETWEEN %(previous_date_from)s AND %(previous_date_to)s), 0),
+                   COALESCE(SUM(balance) FILTER (WHERE %(cumulative)s), 0),
+                   COALESCE(SUM(balance) FILTER (WHERE %(previous_cumulative)s), 0),
+                   COALESCE(SUM(debit) FILTER (WHERE NOT is_opening AND date BETWEEN %(date_from)s AND %(date_to)s), 0),
+                   COALESCE(SUM(credit) FILTER (WHERE NOT is_opening AND date BETWEEN %(date_from)s AND %(date_to)s), 0),
+                   COALESCE(SUM(balance) FILTER (WHERE %(cumulative)s AND date_maturity > %(one_year_date)s), 0),
+                   COALESCE(SUM(balance) FILTER (WHERE %(cumulative)s AND date_maturity > %(five_years_date)s), 0)
+              FROM cumulated_lines
+          GROUP BY account_id
+        """,
+            company_id=company_id, date_from=date_from, date_to=date_to,
+            previous_date_from=previous_date_from, previous_date_to=previous_date_to,
+            one_year_date=date_to + relativedelta(years=1),
+            five_years_date=date_to + relativedelta(years=5),
+            date_range=(
+                SQL("l.date BETWEEN %s AND %s", start_date, date_to) if start_date
+                else SQL("l.date <= %s", date_to)
+            ),
+            archived_year_ids=archived_years.ids,
+            cumulative=cumulative_filter(opening_date, date_to),
+            previous_cumulative=cumulative_filter(previous_opening_date, previous_date_to),
+        ))
+        return {account_id: tuple(float(amount) for amount in amounts) for account_id, *amounts in self.env.cr.fetchall()}
+
+    @api.model
+    def _get_folded_balances(self, company, date_from, date_to):
+        """Mouvements et soldes cumules N et N-1 replies sur les prefixes et tags de comptes"""
+        balances = self._get_account_balances(company, date_from, date_to)
+        return FoldedBalances(balances, self.env['account.account.custom'].browse(list(balances)))
+
+    def _get_report_lines(self, company, date_from, date_to):
+        """
+        Calculer les lignes de l'etat pour la periode et la meme periode N-1:
+        soldes a la date de fin pour le bilan, mouvements de la periode pour
+        le compte de resultat.
+        Retourne une liste de dictionnaires (ligne, valeurs [N, N-1]).
+        """
+        self.ensure_one()
+        if date_from > date_to:
+            raise UserError(_("La date de debut doit etre anterieure a la date de fin."))
+        folded = self._get_folded_balances(company, date_from, date_to)
+        columns = CUMULATIVE_COLUMNS if self.report_type == 'balance_sheet' else PERIOD_COLUMNS
+
+        values_by_line = {}
+        for line in self.line_ids.filtered(lambda l: l.line_type == 'accounts'):
+            sign = -1 if line.reverse_sign else 1
+            values = folded.sum(line._get_code_ranges(), line.tag_ids.ids, line.balance_filter)
+            values_by_line[line] = [sign * values[column] for column in columns]
+
+        lines_by_code = {line.code: line for line in self.line_ids if line.code}
+
+        def formula_values(line, path=()):
+            if line in values_by_line:
+                return values_by_line[line]
+            if line in path:
+                raise UserError(_("La formule de la ligne %s est circulaire.") % line.name)
+            codes = set(re.findall(r'[A-Za-z_][A-Za-z0-9_]*', line.formula or ''))
+            unknown = codes - set(lines_by_code)
+            if unknown:
+                raise UserError(_("Codes inconnus dans la formule de la ligne %s: %s") % (line.name, ', '.join(sorted(unknown))))
+            operands = {code: formula_values(lines_by_code[code], path + (line,)) for code in codes}
+            values_by_line[line] = [
+                safe_eval(line.formula, {code: values[column] for code, values in operands.items()})
+                for column in range(REPORT_COLUMNS)
+            ]
+            return values_by_line[line]
+
+        currency = company.currency_id
+        report_lines = []
+        for line in self.line_ids:
+            if line.line_type == 'title':
+                values = [False] * REPORT_COLUMNS
+            elif line.line_type == 'formula':
+                values = [currency.round(value) for value in formula_values(line)]
+            else:
+                values = [currency.round(value) for value in values_by_line[line]]
+            report_lines.append({'line': line, 'values': values})
+        return report_lines
+
+
+class AccountReportLine(models.Model):
+    """
+    Ligne d'Etat Financier
+    Comptes: prefixes ou plages separes par des virgules (ex: 20,280,290 ou
+    21-23), avec la meme regle de prefixe que les groupes de comptes.
+    """
+    _name = 'account.report.line.custom'
+    _description = 'Ligne d etat financier'
+    _order = 'report_id, sequence, id'
+
+    report_id = fields.Many2one(
+        'account.report.custom',
+        string='Etat',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    sequence = fields.Integer(string='Sequence', default=10)
+    name = fields.Char(string='Libelle', required=True, translate=True)
+    code = fields.Char(string='Code', help="Identifiant utilisable dans les formules")
+    level = fields.Integer(string='Niveau', default=1)
+    line_type = fields.Selection([
+        ('title', 'Titre'),
+        ('accounts', 'Comptes'),
+        ('formula', 'Formule'),
+    ], string='Type', required=True, default='accounts')
+    account_codes = fields.Char(
+        string='Comptes',
+        help="Prefixes ou plages de prefixes separes par des virgules, ex: 20,280,290 ou 21-23",
+    )
+    tag_ids = fields.Many2many(
+        'account.account.tag.custom',
+        'account_report_line_tag_custom_rel',
+        'line_id',
+        'tag_id',
+        string='Tags',
+    )
+    balance_filter = fields.Selection([
+        ('all', 'Tous les soldes'),
+        ('debit', 'Soldes debiteurs'),
+        ('credit', 'Soldes crediteurs'),
+    ], string='Soldes', required=True, default='all')
+    reverse_sign = fields.Boolean(string='Inverser le signe', help="Afficher les soldes crediteurs en positif")
+    formula = fields.Char(string='Formule', help="Expression sur les codes des lignes, ex: AA + AB - AC")
+
+    _sql_constraints = [
+        ('code_report_uniq', 'unique(report_id, code)',
+         'Le code de ligne doit etre unique par etat!'),
+    ]
+
+    @api.constrains('account_codes')
+    def _check_account_codes(self):
+        for line in self:
+            for item in (line.account_codes or '').split(','):
+                if item.strip() and not ACCOUNT_CODES_ITEM.match(item.strip()):
+                    raise ValidationError(_("Plage de comptes invalide sur la ligne %s: %s") % (line.name, item))
+
+    @api.constrains('line_type', 'formula')
+    def _check_formula(self):
+        for line in self:
+            if line.line_type == 'formula' and not line.formula:
+                raise ValidationError(_("La ligne %s doit avoir une formule.") % line.name)
+
+    def _get_code_ranges(self):
+        """Liste des plages (prefixe debut, prefixe fin) de la ligne"""
+        self.ensure_one()
+        return parse_code_ranges(self.account_codes)
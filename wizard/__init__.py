@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+from . import account_move_reversal
+from . import account_currency_revaluation
+from . import account_budget_version_compare
+from . import account_financial_report
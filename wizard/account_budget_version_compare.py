@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+
+class AccountBudgetVersionCompare(models.TransientModel):
+    """
+    Assistant de Comparaison des Versions de Budget
+    Prevu des versions choisies, prevu actuel et realise par ligne
+    """
+    _name = 'account.budget.version.compare.custom'
+    _description = 'Comparaison des versions de budget'
+
+    budget_id = fields.Many2one(
+        'account.budget.custom',
+        string='Budget',
+        required=True,
+    )
+    version_ids = fields.Many2many(
+        'account.budget.version.custom',
+        'account_budget_version_compare_custom_rel',
+        'wizard_id',
+        'version_id',
+        string='Versions',
+        domain="[('budget_id', '=', budget_id)]",
+    )
+    line_ids = fields.One2many(
+        'account.budget.version.compare.line.custom',
+        'wizard_id',
+        string='Comparaison',
+    )
+
+    @api.onchange('budget_id')
+    def _onchange_budget_id(self):
+        self.version_ids = self.budget_id.version_ids[:3]
+
+    def action_compare(self):
+        """Calculer la comparaison et l'afficher en tableau croise"""
+        self.ensure_one()
+        if not self.version_ids:
+            raise UserError(_("Selectionnez au moins une version."))
+        budget_lines = self.budget_id.line_ids
+        comparison = self.version_ids._get_comparison(budget_lines)
+
+        self.line_ids.unlink()
+        vals_list = []
+        for budget_line, values in comparison.items():
+            common = {'wizard_id': self.id, 'budget_line_id': budget_line.id}
+            for version in self.version_ids:
+                vals_list.append(dict(common, column=version.name, planned_amount=values['planned'].get(version.id, 0.0)))
+            vals_list.append(dict(common, column=_('Actuel'), planned_amount=values['current']))
+            vals_list.append(dict(common, column=_('Realise'), planned_amount=values['practical']))
+        self.env['account.budget.version.compare.line.custom'].create(vals_list)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Comparaison des versions - %s') % self.budget_id.name,
+            'res_model': 'account.budget.version.compare.line.custom',
+            'view_mode': 'pivot,list',
+            'domain': [('wizard_id', '=', self.id)],
+        }
+
+
+class AccountBudgetVersionCompareLine(models.TransientModel):
+    """
+    Ligne de Comparaison des Versions (une par ligne de budget et colonne)
+    """
+    _name = 'account.budget.version.compare.line.custom'
+    _description = 'Ligne de comparaison des versions de budget'
+    _order = 'budget_line_id, id'
+
+    wizard_id = fields.Many2one(
+        'account.budget.version.compare.custom',
+        string='Comparaison',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    budget_line_id = fields.Many2one(
+        'account.budget.line.custom',
+        string='Ligne de budget',
+        ondelete='cascade',
+    )
+    column = fields.Char(string='Colonne')
+    planned_amount = fields.Monetary(string='Montant', currency_field='currency_id')
+    currency_id = fields.Many2one(related='budget_line_id.currency_id')
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+
+
+class AccountCurrencyRevaluation(models.TransientModel):
+    """
+    Assistant de Reevaluation des Devises
+    Ajuste au cours de cloture les creances, dettes et tresoreries en devise
+    """
+    _name = 'account.currency.revaluation.custom'
+    _description = 'Assistant de reevaluation des devises'
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Societe',
+        required=True,
+        default=lambda self: self.env.company,
+    )
+    date = fields.Date(
+        string='Date de reevaluation',
+        required=True,
+        default=fields.Date.context_today,
+        help="Les ecarts sont extournes automatiquement le lendemain",
+    )
+    journal_id = fields.Many2one(
+        'account.journal.custom',
+        string='Journal',
+        required=True,
+        domain="[('company_id', '=', company_id), ('type', '=', 'general')]",
+    )
+
+    def action_revalue(self):
+        """Creer l'ecriture de reevaluation et son extourne"""
+        self.ensure_one()
+        move = self.env['account.move.custom']._create_currency_revaluation(
+            self.company_id, self.date, self.journal_id,
+        )
+        if not move:
+            raise UserError(_("Aucun solde en devise a reevaluer au %s.") % self.date)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Reevaluation des devises'),
+            'res_model': 'account.move.custom',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', (move | move.reversal_move_ids).ids)],
+        }
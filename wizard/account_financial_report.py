@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from odoo import api, fields, models
+
+
+class AccountFinancialReport(models.TransientModel):
+    """
+    Assistant d'Edition des Etats Financiers
+    Bilan ou compte de resultat sur une periode, avec la colonne N-1
+    """
+    _name = 'account.financial.report.custom'
+    _description = 'Edition d un etat financier'
+
+    report_id = fields.Many2one(
+        'account.report.custom',
+        string='Etat',
+        required=True,
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Societe',
+        required=True,
+        default=lambda self: self.env.company,
+    )
+    currency_id = fields.Many2one(related='company_id.currency_id')
+    date_from = fields.Date(string='Date debut', required=True)
+    date_to = fields.Date(string='Date fin', required=True)
+    line_ids = fields.One2many(
+        'account.financial.report.line.custom',
+        'wizard_id',
+        string='Lignes',
+    )
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        today = fields.Date.context_today(self)
+        fiscal_year = self.env['account.fiscal.year.custom'].search([
+            ('company_id', '=', res.get('company_id') or self.env.company.id),
+            ('date_from', '<=', today),
+            ('date_to', '>=', today),
+        ], limit=1)
+        res.setdefault('date_from', fiscal_year.date_from or date(today.year, 1, 1))
+        res.setdefault('date_to', fiscal_year.date_to or date(today.year, 12, 31))
+        return res
+
+    def action_compute(self):
+        """Calculer l'etat et afficher ses lignes"""
+        self.ensure_one()
+        report_lines = self.report_id._get_report_lines(self.company_id, self.date_from, self.date_to)
+        self.line_ids.unlink()
+        self.env['account.financial.report.line.custom'].create([{
+            'wizard_id': self.id,
+            'sequence': index,
+            'name': report_line['line'].name,
+            'level': report_line['line'].level,
+            'line_type': report_line['line'].line_type,
+            'balance': report_line['values'][0],
+            'balance_previous': report_line['values'][1],
+        } for index, report_line in enumerate(report_lines)])
+        return {
+            'type': 'ir.actions.act_window',
+            'name': self.report_id.name,
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+
+class AccountFinancialReportLine(models.TransientModel):
+    """
+    Ligne Calculee d'Etat Financier
+    """
+    _name = 'account.financial.report.line.custom'
+    _description = 'Ligne calculee d etat financier'
+    _order = 'sequence'
+
+    wizard_id = fields.Many2one(
+        'account.financial.report.custom',
+        string='Edition',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    sequence = fields.Integer(string='Sequence')
+    name = fields.Char(string='Libelle')
+    level = fields.Integer(string='Niveau')
+    line_type = fields.Selection([
+        ('title', 'Titre'),
+        ('accounts', 'Comptes'),
+        ('formula', 'Formule'),
+    ], string='Type')
+    currency_id = fields.Many2one(related='wizard_id.currency_id')
+    balance = fields.Monetary(string='Exercice N', currency_field='currency_id')
+    balance_previous = fields.Monetary(string='Exercice N-1', currency_field='currency_id')
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+
+class AccountMoveReversal(models.TransientModel):
+    """
+    Assistant d'Extourne
+    Extourne en une fois les ecritures selectionnees
+    """
+    _name = 'account.move.reversal.custom'
+    _description = 'Assistant d extourne'
+
+    move_ids = fields.Many2many(
+        'account.move.custom',
+        'account_move_reversal_custom_move_rel',
+        'wizard_id',
+        'move_id',
+        string='Ecritures',
+        required=True,
+    )
+    date = fields.Date(
+        string='Date d extourne',
+        required=True,
+        default=fields.Date.context_today,
+    )
+    reason = fields.Char(string='Motif')
+    auto_post = fields.Boolean(
+        string='Comptabiliser les extournes',
+        default=True,
+    )
+    reconcile = fields.Boolean(
+        string='Lettrer avec les pieces d origine',
+        default=True,
+        help="Lettre chaque extourne avec sa piece d'origine sur les comptes lettrables",
+    )
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        if 'move_ids' in fields_list and self.env.context.get('active_model') == 'account.move.custom':
+            res['move_ids'] = [(6, 0, self.env.context.get('active_ids', []))]
+        return res
+
+    def action_reverse(self):
+        """Creer les extournes"""
+        self.ensure_one()
+        moves = self.move_ids
+        if any(move.state != 'posted' for move in moves):
+            raise UserError(_("Seules les ecritures comptabilisees peuvent etre extournees."))
+        already_reversed = moves.filtered('reversal_move_ids')
+        if already_reversed:
+            raise UserError(_(
+                "Les ecritures suivantes ont deja ete extournees: %s"
+            ) % ', '.join(already_reversed.mapped('name')))
+
+        reverse_moves = moves._reverse_moves(
+            date=self.date,
+            reason=self.reason,
+            auto_post=self.auto_post,
+            reconcile=self.auto_post and self.reconcile,
+        )
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Extournes'),
+            'res_model': 'account.move.custom',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', reverse_moves.ids)],
+        }